@@ -38,14 +38,24 @@ def empty_or_valid_keybind(keybind: str) -> bool:
 schema = Schema(
     {
         "FONT": {"default": str},
-        "CACHE": {"size": empty_or_valid_int},
+        "ANIMATION": {
+            "display_memory_mb": empty_or_valid_int,
+            "frame_memory_mb": empty_or_valid_int,
+        },
+        "CACHE": {
+            "animation_memory_mb": empty_or_valid_int,
+            "hash_size": empty_or_valid_int,
+            "size": empty_or_valid_int,
+        },
         "KEYBINDS": {
+            "change_sort_mode": empty_or_valid_keybind,
             "copy_to_clipboard_as_base64": empty_or_valid_keybind,
             "move_to_new_file": empty_or_valid_keybind,
             "refresh": empty_or_valid_keybind,
             "reload_image": empty_or_valid_keybind,
             "rename": empty_or_valid_keybind,
             "show_details": empty_or_valid_keybind,
+            "toggle_recursive": empty_or_valid_keybind,
             "undo_most_recent_action": empty_or_valid_keybind,
         },
         "UI": {"background_color": empty_or_valid_hex_color},
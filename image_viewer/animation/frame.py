@@ -1,6 +1,9 @@
 """Representations of frames of an animated image"""
 
 from PIL.Image import Image
+from PIL.ImageTk import PhotoImage
+
+from util.memory import MemoryBudget, get_photo_image_byte_size
 
 DEFAULT_ANIMATION_SPEED_MS: int = 100
 
@@ -8,11 +11,46 @@ DEFAULT_ANIMATION_SPEED_MS: int = 100
 class Frame:
     """A frame within an animated image"""
 
-    __slots__ = ("image", "ms_until_next_frame")
+    __slots__ = ("image", "index", "ms_until_next_frame", "photo_image")
 
-    def __init__(self, image: Image) -> None:
+    def __init__(self, image: Image, index: int = 0) -> None:
         self.image: Image = image
+        # Index in the animated image, identical frames after it are folded in
+        self.index: int = index
         self.ms_until_next_frame: int = self.get_ms_until_next_frame(image)
+        # Made on first display so converting happens once per frame, not per loop
+        self.photo_image: PhotoImage | None = None
+
+    @property
+    def byte_size(self) -> int:
+        """Estimated bytes Tk uses to store this frame"""
+        return get_photo_image_byte_size(self.image)
+
+    def get_photo_image(self, memory_budget: MemoryBudget) -> PhotoImage:
+        """Returns PhotoImage version of this frame. Keeps it for the next loop
+        if it fits in memory_budget, otherwise it will be converted again"""
+        if self.photo_image is not None:
+            return self.photo_image
+
+        photo_image = PhotoImage(self.image)
+        if memory_budget.try_reserve(self.byte_size):
+            self.photo_image = photo_image
+
+        return photo_image
+
+    def try_fold(self, other: "Frame") -> bool:
+        """Extends this frame's duration by other's if they look the same.
+        Returns True if other was folded into this frame"""
+        if (
+            self.image.size != other.image.size
+            or self.image.mode != other.image.mode
+            or self.image.getpalette() != other.image.getpalette()
+            or self.image.tobytes() != other.image.tobytes()
+        ):
+            return False
+
+        self.ms_until_next_frame += other.ms_until_next_frame
+        return True
 
     @staticmethod
     def get_ms_until_next_frame(image: Image) -> int:
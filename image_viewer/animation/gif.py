@@ -0,0 +1,340 @@
+"""Decoding of GIF frames that can resume from snapshots of earlier frames"""
+
+from io import BytesIO
+
+from PIL.Image import Image
+from PIL.Image import new as new_image
+from PIL.Image import open as open_image
+
+# PIL reads GIFs without a palette, or with one where each index is its own gray,
+# as grayscale. Drawing them with this palette gives the same colors
+_GRAYSCALE_PALETTE: bytes = bytes(value for value in range(256) for _ in range(3))
+
+
+class GifFrame:
+    """Where a GIF frame's pixel data is and how it's drawn over earlier frames"""
+
+    __slots__ = (
+        "box",
+        "data",
+        "disposal",
+        "duration",
+        "interlace",
+        "palette",
+        "transparency",
+    )
+
+    def __init__(
+        self,
+        box: tuple[int, int, int, int],
+        data: memoryview,
+        disposal: int,
+        duration: int | None,
+        interlace: bool,
+        palette: bytes | None,
+        transparency: int | None,
+    ) -> None:
+        self.box: tuple[int, int, int, int] = box
+        # LZW minimum code size through the block terminator
+        self.data: memoryview = data
+        # Like PIL, kept from earlier frames when a frame doesn't set one
+        self.disposal: int = disposal
+        self.duration: int | None = duration
+        self.interlace: bool = interlace
+        # None when PIL would read the frame as grayscale
+        self.palette: bytes | None = palette
+        self.transparency: int | None = transparency
+
+    def get_color(self, index: int) -> tuple[int, int, int]:
+        """Returns RGB of index in this frame's palette, like PIL does"""
+        if self.palette is None:
+            return (index, index, index)
+
+        if index * 3 + 3 > len(self.palette):
+            index = 0
+        red, green, blue = self.palette[index * 3 : index * 3 + 3]
+        return (red, green, blue)
+
+
+def _skip_sub_blocks(gif_bytes: memoryview, offset: int) -> int:
+    """Returns offset after the data sub-blocks starting at offset"""
+    while (length := gif_bytes[offset]) != 0:
+        offset += length + 1
+
+    return offset + 1
+
+
+def _read_palette(palette: memoryview) -> bytes | None:
+    """Returns palette as bytes or None if PIL would read it as grayscale"""
+    for index in range(0, len(palette), 3):
+        if not index // 3 == palette[index] == palette[index + 1] == palette[index + 2]:
+            return palette.tobytes()
+
+    return None
+
+
+def read_gif_frames(gif_bytes: memoryview) -> list[GifFrame] | None:
+    """Walks the blocks of a GIF without decoding any frames. Returns None if
+    its not a GIF, is cut off, or has frames outside of its canvas"""
+    if gif_bytes[:6] not in (b"GIF87a", b"GIF89a"):
+        return None
+
+    frames: list[GifFrame] = []
+    try:
+        width: int = int.from_bytes(gif_bytes[6:8], "little")
+        height: int = int.from_bytes(gif_bytes[8:10], "little")
+        flags: int = gif_bytes[10]
+        offset: int = 13
+
+        global_palette: bytes | None = None
+        if flags & 0x80:
+            palette_end: int = offset + (3 << ((flags & 7) + 1))
+            global_palette = _read_palette(gif_bytes[offset:palette_end])
+            offset = palette_end
+
+        disposal: int = 0
+        duration: int | None = None
+        transparency: int | None = None
+        while (block := gif_bytes[offset]) != 0x3B:
+            offset += 1
+            if block == 0x21:  # extension
+                if gif_bytes[offset] == 0xF9 and gif_bytes[offset + 1] >= 4:
+                    flags = gif_bytes[offset + 2]
+                    if flags & 0x1C:
+                        disposal = (flags & 0x1C) >> 2
+                    if flags & 1:
+                        transparency = gif_bytes[offset + 5]
+                    duration = (
+                        int.from_bytes(gif_bytes[offset + 3 : offset + 5], "little")
+                        * 10
+                    )
+                offset = _skip_sub_blocks(gif_bytes, offset + 1)
+            elif block == 0x2C:  # image descriptor
+                x0: int = int.from_bytes(gif_bytes[offset : offset + 2], "little")
+                y0: int = int.from_bytes(gif_bytes[offset + 2 : offset + 4], "little")
+                x1: int = x0 + int.from_bytes(
+                    gif_bytes[offset + 4 : offset + 6], "little"
+                )
+                y1: int = y0 + int.from_bytes(
+                    gif_bytes[offset + 6 : offset + 8], "little"
+                )
+                if x1 > width or y1 > height:
+                    return None
+                flags = gif_bytes[offset + 8]
+                offset += 9
+
+                palette: bytes | None = global_palette
+                if flags & 0x80:
+                    palette_end = offset + (3 << ((flags & 7) + 1))
+                    palette = _read_palette(gif_bytes[offset:palette_end])
+                    offset = palette_end
+
+                data_start: int = offset
+                offset = _skip_sub_blocks(gif_bytes, offset + 1)
+                frames.append(
+                    GifFrame(
+                        (x0, y0, x1, y1),
+                        gif_bytes[data_start:offset],
+                        disposal,
+                        duration,
+                        bool(flags & 0x40),
+                        palette,
+                        transparency,
+                    )
+                )
+                duration = transparency = None
+            else:
+                return None
+    except IndexError:
+        return None
+
+    return frames
+
+
+class GifDecoder:
+    """Decodes frames of a GIF in order with PIL, keeping a copy of every few
+    composited frames the first time they are decoded. Seeking to an earlier
+    frame draws from the closest copy rather than replaying from the first frame"""
+
+    # Copies are only kept for frames that are a multiple of this
+    SNAPSHOT_INTERVAL: int = 8
+
+    __slots__ = (
+        "_canvas",
+        "_decoder",
+        "_dispose",
+        "_frames",
+        "_gif_bytes",
+        "_index",
+        "background",
+        "max_snapshot_bytes",
+        "snapshot_interval",
+        "snapshots",
+    )
+
+    def __init__(
+        self, decoder: Image, gif_bytes: memoryview, max_snapshot_bytes: int
+    ) -> None:
+        self._decoder: Image = decoder
+        self._gif_bytes: memoryview = gif_bytes
+        # Read on first use, so walking the GIF happens on the thread decoding it
+        self._frames: list[GifFrame] | None = None
+        self._index: int = decoder.tell()
+        # Frame being drawn over when seeked from a snapshot, otherwise PIL decodes
+        self._canvas: Image | None = None
+        self._dispose: tuple[Image, tuple[int, int, int, int]] | None = None
+        self.background: int = decoder.info.get("background", 0)
+        self.max_snapshot_bytes: int = max_snapshot_bytes
+        self.snapshot_interval: int = self.SNAPSHOT_INTERVAL
+        self.snapshots: dict[int, Image] = {}
+
+    def __enter__(self) -> "GifDecoder":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self._decoder.close()
+
+    def tell(self) -> int:
+        return self._index
+
+    def seek(self, index: int) -> None:
+        """Moves to frame at index. Raises EOFError past the last frame"""
+        if index == self._index:
+            return
+
+        snapshot_index: int = max((i for i in self.snapshots if i <= index), default=-1)
+        if index > self._index and snapshot_index <= self._index:
+            pass  # closest to continue from the current frame
+        elif snapshot_index > 0:
+            self._resume_at(snapshot_index)
+        else:
+            self._canvas = None
+
+        if self._canvas is None:
+            self._decoder.seek(index)
+            self._index = index
+        else:
+            for next_index in range(self._index + 1, index + 1):
+                self._draw_frame(next_index)
+
+    def copy(self) -> Image:
+        """Returns a copy of the current frame"""
+        if self._canvas is not None:
+            frame: Image = self._canvas.copy()
+            duration: int | None = self._get_frames()[self._index].duration
+            frame.info.pop("duration", None)
+            if duration is not None:
+                frame.info["duration"] = duration
+            return frame
+
+        frame = self._decoder.copy()
+        self._try_add_snapshot(frame)
+        return frame
+
+    def _get_frames(self) -> list[GifFrame]:
+        if self._frames is None:
+            self._frames = read_gif_frames(self._gif_bytes) or []
+        return self._frames
+
+    def _can_resume_at(self, index: int) -> bool:
+        """Frames that restore what was under them can't be resumed from since
+        what they cover was not kept"""
+        return self._get_frames()[index].disposal != 3
+
+    def _try_add_snapshot(self, frame: Image) -> None:
+        """Keeps frame as a snapshot if its at the interval and fits in memory.
+        The first frame is never kept since PIL seeks there without replaying"""
+        index: int = self._index
+        # RGB and RGBA both use 4 bytes per pixel
+        byte_size: int = frame.width * frame.height * 4
+        if (
+            index == 0
+            or index % self.snapshot_interval != 0
+            or index in self.snapshots
+            or frame.mode not in ("RGB", "RGBA")
+            or byte_size > self.max_snapshot_bytes
+            or index >= len(self._get_frames())
+            or not self._can_resume_at(index)
+        ):
+            return
+
+        self.snapshots[index] = frame
+        # Drop every other snapshot till they fit, later ones are twice as far apart
+        while len(self.snapshots) * byte_size > self.max_snapshot_bytes:
+            self.snapshot_interval *= 2
+            self.snapshots = {
+                i: snapshot
+                for i, snapshot in self.snapshots.items()
+                if i % self.snapshot_interval == 0
+            }
+
+    def _resume_at(self, index: int) -> None:
+        """Starts drawing frames over the snapshot at index"""
+        frame: GifFrame = self._get_frames()[index]
+        self._canvas = self.snapshots[index].copy()
+        self._dispose = self._get_dispose(frame, self._canvas)
+        self._index = index
+
+    def _get_dispose(
+        self, frame: GifFrame, canvas: Image
+    ) -> tuple[Image, tuple[int, int, int, int]] | None:
+        """Returns what to draw over frame's area before drawing the next frame"""
+        x0, y0, x1, y1 = frame.box
+        if frame.disposal == 2:
+            if frame.transparency is not None:
+                color = frame.get_color(frame.transparency)
+                return new_image("RGBA", (x1 - x0, y1 - y0), (*color, 0)), frame.box
+            color = frame.get_color(self.background)
+            return new_image("RGB", (x1 - x0, y1 - y0), color), frame.box
+        if frame.disposal == 3:
+            return canvas.crop(frame.box), frame.box
+
+        return None
+
+    def _draw_frame(self, index: int) -> None:
+        """Draws frame at index over the canvas like PIL does"""
+        frames: list[GifFrame] = self._get_frames()
+        if index >= len(frames):
+            raise EOFError("no more images in GIF file")
+        assert self._canvas is not None
+
+        if self._dispose is not None:
+            self._canvas.paste(*self._dispose)
+
+        frame: GifFrame = frames[index]
+        self._dispose = self._get_dispose(frame, self._canvas)
+
+        frame_image: Image = self._decode_frame(frame)
+        self._canvas.paste(
+            frame_image,
+            frame.box[:2],
+            frame_image if frame_image.mode == "RGBA" else None,
+        )
+        self._index = index
+
+    @staticmethod
+    def _decode_frame(frame: GifFrame) -> Image:
+        """Decodes just frame's pixels by giving PIL a GIF of only that frame"""
+        x0, y0, x1, y1 = frame.box
+        palette: bytes = frame.palette or _GRAYSCALE_PALETTE
+        palette_bits: int = (len(palette) // 3).bit_length() - 1
+        size: bytes = (x1 - x0).to_bytes(2, "little") + (y1 - y0).to_bytes(2, "little")
+
+        gif_bytes = BytesIO()
+        gif_bytes.write(b"GIF89a" + size + bytes((0x80 | (palette_bits - 1), 0, 0)))
+        gif_bytes.write(palette)
+        gif_bytes.write(b",\0\0\0\0" + size + (b"\x40" if frame.interlace else b"\0"))
+        gif_bytes.write(frame.data)
+        gif_bytes.write(b";")
+        gif_bytes.seek(0)
+
+        with open_image(gif_bytes) as decoded_frame:
+            frame_image: Image = decoded_frame.copy()
+
+        # Identity palettes are read as grayscale, this makes both palette mode
+        frame_image.putpalette(palette)
+        if frame.transparency is None:
+            return frame_image.convert("RGB")
+
+        frame_image.info["transparency"] = frame.transparency
+        return frame_image.convert("RGBA")
@@ -0,0 +1,77 @@
+"""Timing of animation playback"""
+
+from collections import deque
+from time import perf_counter
+
+
+class FrameScheduler:
+    """Keeps animation frames on an absolute timeline so time spent showing
+    one frame doesn't push back every frame after it"""
+
+    # How often to check for a frame that isn't loaded yet
+    WAIT_FOR_FRAME_MS: int = 10
+    # Number of recently shown frames that playback stats are based on
+    STATS_FRAME_COUNT: int = 120
+
+    __slots__ = ("_frame_deadline", "_holding", "_lateness", "_shown_times")
+
+    def __init__(self) -> None:
+        self._frame_deadline: float = 0.0
+        self._holding: bool = False
+        self._lateness: deque[float] = deque(maxlen=self.STATS_FRAME_COUNT)
+        self._shown_times: deque[float] = deque(maxlen=self.STATS_FRAME_COUNT)
+
+    def start(self, ms_until_next_frame: int) -> None:
+        """Starts a new timeline with the next frame due after ms_until_next_frame"""
+        self._frame_deadline = perf_counter() + ms_until_next_frame / 1000
+        self._holding = False
+        self._lateness.clear()
+        self._shown_times.clear()
+
+    def hold(self) -> None:
+        """Keeps showing the current frame since the next isn't loaded yet.
+        The timeline restarts once it is, rather than rushing to catch up"""
+        self._holding = True
+
+    def is_over(self, ms_until_next_frame: int) -> bool:
+        """Returns True if the frame due now, lasting ms_until_next_frame,
+        should already be over"""
+        return (
+            not self._holding
+            and perf_counter() >= self._frame_deadline + ms_until_next_frame / 1000
+        )
+
+    def skip(self, ms_until_next_frame: int) -> None:
+        """Moves past the frame due now without showing it to keep on schedule"""
+        self._frame_deadline += ms_until_next_frame / 1000
+
+    def frame_shown(self, ms_until_next_frame: int) -> int:
+        """Records that the frame due was shown and returns ms until the next"""
+        now: float = perf_counter()
+        if self._holding:
+            self._frame_deadline = now
+            self._holding = False
+
+        self._lateness.append(now - self._frame_deadline)
+        self._shown_times.append(now)
+        self._frame_deadline += ms_until_next_frame / 1000
+
+        return max(round((self._frame_deadline - now) * 1000), 0)
+
+    @property
+    def fps(self) -> float:
+        """Frames per second shown recently"""
+        if len(self._shown_times) < 2:
+            return 0.0
+
+        seconds: float = self._shown_times[-1] - self._shown_times[0]
+        return (len(self._shown_times) - 1) / seconds if seconds > 0 else 0.0
+
+    @property
+    def jitter_ms(self) -> float:
+        """Average ms that recent frames were shown off their target time"""
+        if not self._lateness:
+            return 0.0
+
+        total_seconds: float = sum(abs(lateness) for lateness in self._lateness)
+        return total_seconds * 1000 / len(self._lateness)
@@ -1,14 +1,30 @@
 #define PY_SSIZE_T_CLEAN
 
 #include <Python.h>
+#include <pthread.h>
 #include <stddef.h>
+#include <string.h>
+#include <sys/stat.h>
 #include <turbojpeg.h>
+#include <webp/decode.h>
+
+#ifdef _WIN32
+#include <io.h>
+#include <windows.h>
+#else
+#include <unistd.h>
+#endif
 
 #include "read.h"
 
 // CMemoryViewBuffer Start
 static PyMemberDef CMemoryViewBuffer_members[] = {
     {"view", Py_T_OBJECT_EX, offsetof(CMemoryViewBuffer, view), Py_READONLY, 0},
+    {"st_size", Py_T_LONGLONG, offsetof(CMemoryViewBuffer, stats.size), Py_READONLY, 0},
+    {"st_mtime_ns", Py_T_LONGLONG, offsetof(CMemoryViewBuffer, stats.modifiedTimeNs), Py_READONLY, 0},
+    {"st_ctime_ns", Py_T_LONGLONG, offsetof(CMemoryViewBuffer, stats.changedTimeNs), Py_READONLY, 0},
+    {"st_ino", Py_T_ULONGLONG, offsetof(CMemoryViewBuffer, stats.inode), Py_READONLY, 0},
+    {"st_dev", Py_T_ULONGLONG, offsetof(CMemoryViewBuffer, stats.device), Py_READONLY, 0},
     {NULL}};
 
 static void CMemoryViewBuffer_dealloc(CMemoryViewBuffer *self)
@@ -18,6 +34,16 @@ static void CMemoryViewBuffer_dealloc(CMemoryViewBuffer *self)
     Py_TYPE(self)->tp_free((PyObject *)self);
 }
 
+// Exposes the buffer directly so consumers hold a reference to its owner
+static int CMemoryViewBuffer_getbuffer(CMemoryViewBuffer *self, Py_buffer *view, int flags)
+{
+    return PyBuffer_FillInfo(view, (PyObject *)self, self->buffer, (Py_ssize_t)self->bufferSize, 1, flags);
+}
+
+static PyBufferProcs CMemoryViewBuffer_as_buffer = {
+    .bf_getbuffer = (getbufferproc)CMemoryViewBuffer_getbuffer,
+};
+
 static PyTypeObject CMemoryViewBuffer_Type = {
     .ob_base = PyVarObject_HEAD_INIT(NULL, 0).tp_name = "_read.CMemoryViewBuffer",
     .tp_basicsize = sizeof(CMemoryViewBuffer),
@@ -25,51 +51,143 @@ static PyTypeObject CMemoryViewBuffer_Type = {
     .tp_flags = Py_TPFLAGS_HAVE_STACKLESS_EXTENSION | Py_TPFLAGS_IMMUTABLETYPE | Py_TPFLAGS_DISALLOW_INSTANTIATION,
     .tp_dealloc = (destructor)CMemoryViewBuffer_dealloc,
     .tp_members = CMemoryViewBuffer_members,
+    .tp_as_buffer = &CMemoryViewBuffer_as_buffer,
 };
 
-static inline CMemoryViewBuffer *CMemoryViewBuffer_New(PyObject *pyMemoryView, char *buffer, unsigned long bufferSize)
+static inline CMemoryViewBuffer *CMemoryViewBuffer_New(PyObject *pyMemoryView, char *buffer, size_t bufferSize, const FileStatInfo *stats)
 {
     CMemoryViewBuffer *cMemoryBuffer = (CMemoryViewBuffer *)PyObject_New(CMemoryViewBuffer, &CMemoryViewBuffer_Type);
     cMemoryBuffer->view = pyMemoryView;
     cMemoryBuffer->buffer = buffer;
     cMemoryBuffer->bufferSize = bufferSize;
+    cMemoryBuffer->stats = *stats;
 
     return cMemoryBuffer;
 }
 // CMemoryViewBuffer End
 
-// CMemoryViewBufferJpeg End
-static PyMemberDef CMemoryViewBufferJpeg_members[] = {
-    {"dimensions", Py_T_OBJECT_EX, offsetof(CMemoryViewBufferJpeg, dimensions), Py_READONLY, 0},
+// CMemoryViewBufferDecoded Start
+static PyMemberDef CMemoryViewBufferDecoded_members[] = {
+    {"dimensions", Py_T_OBJECT_EX, offsetof(CMemoryViewBufferDecoded, dimensions), Py_READONLY, 0},
+    {"mode", Py_T_STRING, offsetof(CMemoryViewBufferDecoded, mode), Py_READONLY, 0},
     {NULL}};
 
-static void CMemoryViewBufferJpeg_dealloc(CMemoryViewBufferJpeg *self)
+static void CMemoryViewBufferDecoded_dealloc(CMemoryViewBufferDecoded *self)
 {
     Py_XDECREF(self->dimensions);
-    Py_TYPE(self)->tp_free((PyObject *)self);
+    CMemoryViewBuffer_dealloc(&self->base);
 }
 
-static PyTypeObject CMemoryViewBufferJpeg_Type = {
-    .ob_base = PyVarObject_HEAD_INIT(NULL, 0).tp_name = "_read.CMemoryViewBufferJpeg",
-    .tp_basicsize = sizeof(CMemoryViewBufferJpeg),
+static PyTypeObject CMemoryViewBufferDecoded_Type = {
+    .ob_base = PyVarObject_HEAD_INIT(NULL, 0).tp_name = "_read.CMemoryViewBufferDecoded",
+    .tp_basicsize = sizeof(CMemoryViewBufferDecoded),
     .tp_itemsize = 0,
     .tp_base = &CMemoryViewBuffer_Type,
     .tp_flags = Py_TPFLAGS_HAVE_STACKLESS_EXTENSION | Py_TPFLAGS_IMMUTABLETYPE | Py_TPFLAGS_DISALLOW_INSTANTIATION,
-    .tp_dealloc = (destructor)CMemoryViewBufferJpeg_dealloc,
-    .tp_members = CMemoryViewBufferJpeg_members,
+    .tp_dealloc = (destructor)CMemoryViewBufferDecoded_dealloc,
+    .tp_members = CMemoryViewBufferDecoded_members,
+    .tp_as_buffer = &CMemoryViewBuffer_as_buffer,
 };
 
-static inline CMemoryViewBufferJpeg *CMemoryViewBufferJpeg_New(PyObject *pyMemoryView, char *buffer, unsigned long bufferSize, int width, int height)
+static inline CMemoryViewBufferDecoded *CMemoryViewBufferDecoded_New(PyObject *pyMemoryView, char *buffer, size_t bufferSize, const FileStatInfo *stats, int width, int height, const char *mode)
 {
-    CMemoryViewBufferJpeg *cMemoryBuffer = (CMemoryViewBufferJpeg *)PyObject_New(CMemoryViewBufferJpeg, &CMemoryViewBufferJpeg_Type);
+    CMemoryViewBufferDecoded *cMemoryBuffer = (CMemoryViewBufferDecoded *)PyObject_New(CMemoryViewBufferDecoded, &CMemoryViewBufferDecoded_Type);
     cMemoryBuffer->base.view = pyMemoryView;
     cMemoryBuffer->base.buffer = buffer;
     cMemoryBuffer->base.bufferSize = bufferSize;
+    cMemoryBuffer->base.stats = *stats;
     cMemoryBuffer->dimensions = Py_BuildValue("(ii)", width, height);
+    cMemoryBuffer->mode = mode;
 
     return cMemoryBuffer;
 }
-// CMemoryViewBufferJpeg End
+// CMemoryViewBufferDecoded End
+
+// CImageHeader Start
+static PyMemberDef CImageHeader_members[] = {
+    {"width", Py_T_INT, offsetof(CImageHeader, info.width), Py_READONLY, 0},
+    {"height", Py_T_INT, offsetof(CImageHeader, info.height), Py_READONLY, 0},
+    {"bit_depth", Py_T_INT, offsetof(CImageHeader, info.bitDepth), Py_READONLY, 0},
+    {"mode", Py_T_STRING, offsetof(CImageHeader, info.mode), Py_READONLY, 0},
+    {"format", Py_T_STRING, offsetof(CImageHeader, info.format), Py_READONLY, 0},
+    {NULL}};
+
+static PyTypeObject CImageHeader_Type = {
+    .ob_base = PyVarObject_HEAD_INIT(NULL, 0).tp_name = "_read.CImageHeader",
+    .tp_basicsize = sizeof(CImageHeader),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_HAVE_STACKLESS_EXTENSION | Py_TPFLAGS_IMMUTABLETYPE | Py_TPFLAGS_DISALLOW_INSTANTIATION,
+    .tp_members = CImageHeader_members,
+};
+// CImageHeader End
+
+#define NS_PER_SECOND 1000000000LL
+
+#ifdef _WIN32
+// 100ns intervals between 1601 and 1970
+#define FILETIME_UNIX_EPOCH 116444736000000000LL
+
+static inline long long filetime_to_ns(const FILETIME *fileTime)
+{
+    const long long intervals = ((long long)fileTime->dwHighDateTime << 32) | fileTime->dwLowDateTime;
+    return (intervals - FILETIME_UNIX_EPOCH) * 100;
+}
+#endif
+
+/*
+ * Fills stats using the already open file so the path does not need to be looked up again.
+ * Values match what os.stat would return so they can be compared with each other.
+ * Returns 0 on success.
+ */
+static int get_file_stats(FILE *file, FileStatInfo *stats)
+{
+#ifdef _WIN32
+    BY_HANDLE_FILE_INFORMATION info;
+    FILE_ID_INFO idInfo;
+    HANDLE handle = (HANDLE)_get_osfhandle(_fileno(file));
+    if (handle == INVALID_HANDLE_VALUE || !GetFileInformationByHandle(handle, &info))
+    {
+        return -1;
+    }
+
+    stats->size = ((long long)info.nFileSizeHigh << 32) | info.nFileSizeLow;
+    stats->modifiedTimeNs = filetime_to_ns(&info.ftLastWriteTime);
+    stats->changedTimeNs = filetime_to_ns(&info.ftCreationTime);
+
+    // Match os.stat which uses 64 bit volume serials and 128 bit file IDs when available
+    if (GetFileInformationByHandleEx(handle, FileIdInfo, &idInfo, sizeof(idInfo)))
+    {
+        memcpy(&stats->inode, idInfo.FileId.Identifier, sizeof(stats->inode));
+        stats->device = idInfo.VolumeSerialNumber;
+    }
+    else
+    {
+        stats->inode = ((unsigned long long)info.nFileIndexHigh << 32) | info.nFileIndexLow;
+        stats->device = info.dwVolumeSerialNumber;
+    }
+#else
+    struct stat result;
+    if (fstat(fileno(file), &result) != 0)
+    {
+        return -1;
+    }
+
+#ifdef __APPLE__
+    stats->modifiedTimeNs = (long long)result.st_mtimespec.tv_sec * NS_PER_SECOND + result.st_mtimespec.tv_nsec;
+    // Like Windows, use when the file was created rather than last changed
+    stats->changedTimeNs = (long long)result.st_birthtimespec.tv_sec * NS_PER_SECOND + result.st_birthtimespec.tv_nsec;
+#else
+    stats->modifiedTimeNs = (long long)result.st_mtim.tv_sec * NS_PER_SECOND + result.st_mtim.tv_nsec;
+    stats->changedTimeNs = (long long)result.st_ctim.tv_sec * NS_PER_SECOND + result.st_ctim.tv_nsec;
+#endif
+
+    stats->size = (long long)result.st_size;
+    stats->inode = (unsigned long long)result.st_ino;
+    stats->device = (unsigned long long)result.st_dev;
+#endif
+
+    return 0;
+}
 
 static PyObject *read_image_into_buffer(PyObject *self, PyObject *arg)
 {
@@ -85,15 +203,13 @@ static PyObject *read_image_into_buffer(PyObject *self, PyObject *arg)
         return Py_None;
     }
 
-    fseek(file, 0, SEEK_END);
-    const long size = ftell(file);
-    fseek(file, 0, SEEK_SET);
-
-    if (size < 0)
+    FileStatInfo stats;
+    if (get_file_stats(file, &stats) != 0 || stats.size < 0)
     {
         fclose(file);
         goto error;
     }
+    const long size = (long)stats.size;
 
     char *buffer = (char *)malloc(size * sizeof(char));
     if (buffer == NULL)
@@ -115,86 +231,1155 @@ static PyObject *read_image_into_buffer(PyObject *self, PyObject *arg)
         goto error;
     }
 
-    return (PyObject *)CMemoryViewBuffer_New(pyMemoryView, buffer, size);
+    return (PyObject *)CMemoryViewBuffer_New(pyMemoryView, buffer, size, &stats);
 error:
     return Py_None;
 }
 
-static inline int get_scaled_dimension(int dimension, int numerator, int denominator)
+// Decoded pixel buffers Start
+/*
+ * Sets bufferSize to the bytes of a width x height image with pixelSize bytes
+ * per pixel. Returns -1 if that is too large to fit in a memoryview.
+ */
+static inline int get_pixel_buffer_size(int width, int height, int pixelSize, size_t *bufferSize)
+{
+    if (width <= 0 || height <= 0 || pixelSize <= 0 ||
+        (size_t)width > (size_t)PY_SSIZE_T_MAX / (size_t)height / (size_t)pixelSize)
+    {
+        return -1;
+    }
+
+    *bufferSize = (size_t)width * (size_t)height * (size_t)pixelSize;
+    return 0;
+}
+// Decoded pixel buffers End
+
+// Scaled JPEG decoding Start
+static int get_cpu_count(void)
+{
+#ifdef _WIN32
+    SYSTEM_INFO systemInfo;
+    GetSystemInfo(&systemInfo);
+    return (int)systemInfo.dwNumberOfProcessors;
+#else
+    const long cpuCount = sysconf(_SC_NPROCESSORS_ONLN);
+    return cpuCount > 0 ? (int)cpuCount : 1;
+#endif
+}
+
+static int decode_jpeg_band(tjhandle decompressHandle, const JpegBand *band)
+{
+    if (tj3SetCroppingRegion(decompressHandle, band->region) < 0 ||
+        tj3Decompress8(decompressHandle, band->jpegBuffer, band->jpegSize, band->outputBuffer, band->pitch, band->pixelFormat) < 0)
+    {
+        return -1;
+    }
+
+    return 0;
+}
+
+static void *decode_jpeg_band_on_thread(void *arg)
+{
+    JpegBand *band = (JpegBand *)arg;
+    tjhandle decompressHandle = tj3Init(TJINIT_DECOMPRESS);
+    if (decompressHandle == NULL)
+    {
+        band->failed = 1;
+        return NULL;
+    }
+
+    band->failed = tj3DecompressHeader(decompressHandle, band->jpegBuffer, band->jpegSize) < 0 ||
+                   tj3SetScalingFactor(decompressHandle, band->scalingFactor) < 0 ||
+                   decode_jpeg_band(decompressHandle, band) < 0;
+    tj3Destroy(decompressHandle);
+
+    return NULL;
+}
+
+/*
+ * Decodes a JPEG as horizontal bands, each on its own thread with its own
+ * decompressor writing to its rows of the output. Bands start on MCU rows, but
+ * each still has to entropy decode every row above it, so only the rest of
+ * decoding (IDCT, upsampling, color conversion) is divided between threads.
+ * The first band is decoded on the calling thread with decompressHandle.
+ */
+static int decode_jpeg_in_bands(tjhandle decompressHandle, const JpegBand *image, int height, int mcuHeight, int bandCount)
 {
-    return (dimension * numerator + denominator - 1) / denominator;
+    const int mcuRows = (height + mcuHeight - 1) / mcuHeight;
+    const int bandHeight = (mcuRows + bandCount - 1) / bandCount * mcuHeight;
+
+    JpegBand bands[MAX_DECODE_THREADS] = {0};
+    pthread_t threads[MAX_DECODE_THREADS];
+    int threadStarted[MAX_DECODE_THREADS] = {0};
+
+    int bandIndex = 0;
+    for (int top = 0; top < height; top += bandHeight, bandIndex++)
+    {
+        JpegBand *band = &bands[bandIndex];
+        *band = *image;
+        band->region.y = top;
+        band->region.h = top + bandHeight < height ? bandHeight : height - top;
+        band->outputBuffer = image->outputBuffer + (size_t)top * image->pitch;
+        band->failed = 0;
+
+        if (bandIndex > 0)
+        {
+            threadStarted[bandIndex] = pthread_create(&threads[bandIndex], NULL, decode_jpeg_band_on_thread, band) == 0;
+        }
+    }
+
+    int failed = decode_jpeg_band(decompressHandle, &bands[0]) < 0;
+    for (int i = 1; i < bandIndex; i++)
+    {
+        if (threadStarted[i])
+        {
+            pthread_join(threads[i], NULL);
+        }
+        else
+        {
+            decode_jpeg_band_on_thread(&bands[i]);
+        }
+
+        failed |= bands[i].failed;
+    }
+
+    return failed ? -1 : 0;
 }
 
 static PyObject *decode_scaled_jpeg(PyObject *self, PyObject *const *args, Py_ssize_t argLen)
 {
-    if (argLen != 2)
+    if (argLen != 2 && argLen != 3)
     {
-        PyErr_SetString(PyExc_TypeError, "decode_scaled_jpeg takes exactly two arguments");
+        PyErr_SetString(PyExc_TypeError, "decode_scaled_jpeg takes two or three arguments");
         return NULL;
     }
 
     CMemoryViewBuffer *memoryViewBuffer = (CMemoryViewBuffer *)args[0];
 
-    int scaledNumerator, scaledDenominator;
-    if (!PyArg_ParseTuple(args[1], "ii", &scaledNumerator, &scaledDenominator))
+    tjscalingfactor scalingFactor;
+    if (!PyArg_ParseTuple(args[1], "ii", &scalingFactor.num, &scalingFactor.denom))
     {
         return NULL;
     }
 
-    tjhandle decompressHandle = tjInitDecompress();
+    // 0 picks the band count from the image's size and the CPU count
+    int requestedBandCount = 0;
+    if (argLen == 3)
+    {
+        if (!PyArg_Parse(args[2], "i", &requestedBandCount))
+        {
+            return NULL;
+        }
+        if (requestedBandCount < 0)
+        {
+            PyErr_SetString(PyExc_ValueError, "band_count can't be negative");
+            return NULL;
+        }
+    }
+
+    tjhandle decompressHandle = tj3Init(TJINIT_DECOMPRESS);
     if (decompressHandle == NULL)
     {
+        PyErr_SetString(PyExc_MemoryError, "Failed to create JPEG decompressor");
         return NULL;
     }
 
-    int width, height;
-    if (tjDecompressHeader(decompressHandle, (unsigned char *)memoryViewBuffer->buffer, memoryViewBuffer->bufferSize, &width, &height) < 0)
+    const unsigned char *jpegBuffer = (unsigned char *)memoryViewBuffer->buffer;
+    const size_t jpegSize = memoryViewBuffer->bufferSize;
+    if (tj3DecompressHeader(decompressHandle, jpegBuffer, jpegSize) < 0 ||
+        tj3SetScalingFactor(decompressHandle, scalingFactor) < 0)
     {
-        return NULL;
+        goto error;
+    }
+
+    // Decode in the JPEG's own colorspace so grayscale isn't tripled in memory.
+    // Pixels are laid out as PIL stores them so the buffer can be used without a copy
+    int pixelFormat;
+    const char *mode;
+    switch (tj3Get(decompressHandle, TJPARAM_COLORSPACE))
+    {
+    case TJCS_GRAY:
+        pixelFormat = TJPF_GRAY;
+        mode = "L";
+        break;
+    case TJCS_CMYK:
+    case TJCS_YCCK:
+        pixelFormat = TJPF_CMYK;
+        mode = "CMYK";
+        break;
+    default:
+        pixelFormat = TJPF_RGBX;
+        mode = "RGBX";
+        break;
     }
 
-    const int pixelFormat = TJPF_RGB;
     const int pixelSize = tjPixelSize[pixelFormat];
-    const int scaledWidth = get_scaled_dimension(width, scaledNumerator, scaledDenominator);
-    const int scaledHeight = get_scaled_dimension(height, scaledNumerator, scaledDenominator);
+    const int scaledWidth = TJSCALED(tj3Get(decompressHandle, TJPARAM_JPEGWIDTH), scalingFactor);
+    const int scaledHeight = TJSCALED(tj3Get(decompressHandle, TJPARAM_JPEGHEIGHT), scalingFactor);
 
-    unsigned long resizedJpegBufferSize = scaledWidth * scaledHeight * pixelSize * sizeof(char);
-    char *resizedJpegBuffer = (char *)malloc(resizedJpegBufferSize);
+    size_t resizedJpegBufferSize;
+    char *resizedJpegBuffer = NULL;
+    if (get_pixel_buffer_size(scaledWidth, scaledHeight, pixelSize, &resizedJpegBufferSize) == 0)
+    {
+        resizedJpegBuffer = (char *)malloc(resizedJpegBufferSize);
+    }
     if (resizedJpegBuffer == NULL)
     {
-        return NULL;
+        tj3Destroy(decompressHandle);
+        return PyErr_NoMemory();
+    }
+
+    // Progressive and lossless JPEGs can't be split since every band would
+    // need the whole image decoded first
+    const int subsampling = tj3Get(decompressHandle, TJPARAM_SUBSAMP);
+    int bandCount = 1;
+    if (subsampling != TJSAMP_UNKNOWN &&
+        tj3Get(decompressHandle, TJPARAM_PROGRESSIVE) == 0 &&
+        tj3Get(decompressHandle, TJPARAM_LOSSLESS) == 0)
+    {
+        if (requestedBandCount > 0)
+        {
+            bandCount = requestedBandCount;
+        }
+        else if ((long long)scaledWidth * scaledHeight >= PARALLEL_DECODE_MIN_PIXELS)
+        {
+            bandCount = get_cpu_count();
+        }
+        bandCount = bandCount < MAX_DECODE_THREADS ? bandCount : MAX_DECODE_THREADS;
+    }
+
+    const JpegBand image = {
+        .jpegBuffer = jpegBuffer,
+        .jpegSize = jpegSize,
+        .outputBuffer = (unsigned char *)resizedJpegBuffer,
+        .pitch = scaledWidth * pixelSize,
+        .pixelFormat = pixelFormat,
+        .scalingFactor = scalingFactor,
+        .region = {0, 0, 0, 0},
+    };
+    const int mcuHeight = bandCount > 1 ? TJSCALED(tjMCUHeight[subsampling], scalingFactor) : scaledHeight;
+
+    int decodeResult;
+    Py_BEGIN_ALLOW_THREADS;
+    decodeResult = decode_jpeg_in_bands(decompressHandle, &image, scaledHeight, mcuHeight, bandCount);
+    Py_END_ALLOW_THREADS;
+
+    if (decodeResult < 0)
+    {
+        free(resizedJpegBuffer);
+        goto error;
     }
+    tj3Destroy(decompressHandle);
 
-    if (tjDecompress2(
-            decompressHandle,
-            (unsigned char *)memoryViewBuffer->buffer,
-            memoryViewBuffer->bufferSize,
-            (unsigned char *)resizedJpegBuffer,
-            scaledWidth,
-            0,
-            scaledHeight,
-            pixelFormat,
-            0) < 0)
+    // CMYK JPEGs are stored inverted, like PIL assumes for Adobe files
+    if (pixelFormat == TJPF_CMYK)
     {
-        goto destroy;
+        unsigned char *pixel = (unsigned char *)resizedJpegBuffer;
+        for (size_t i = 0; i < resizedJpegBufferSize; i++)
+        {
+            pixel[i] = ~pixel[i];
+        }
     }
 
     PyObject *pyJpegMemoryView = PyMemoryView_FromMemory(resizedJpegBuffer, resizedJpegBufferSize, PyBUF_READ);
     if (pyJpegMemoryView == NULL)
     {
-        goto destroy;
+        free(resizedJpegBuffer);
+        return NULL;
+    }
+
+    return (PyObject *)CMemoryViewBufferDecoded_New(pyJpegMemoryView, resizedJpegBuffer, resizedJpegBufferSize, &memoryViewBuffer->stats, scaledWidth, scaledHeight, mode);
+
+error:
+    tj3Destroy(decompressHandle);
+    PyErr_SetString(PyExc_OSError, "Failed to decode JPEG");
+    return NULL;
+}
+// Scaled JPEG decoding End
+
+// Scaled WebP decoding Start
+static PyObject *decode_scaled_webp(PyObject *self, PyObject *const *args, Py_ssize_t argLen)
+{
+    if (argLen != 2 || !PyObject_TypeCheck(args[0], &CMemoryViewBuffer_Type))
+    {
+        PyErr_SetString(PyExc_TypeError, "decode_scaled_webp takes a CMemoryViewBuffer and dimensions");
+        return NULL;
+    }
+
+    CMemoryViewBuffer *memoryViewBuffer = (CMemoryViewBuffer *)args[0];
+
+    int scaledWidth, scaledHeight;
+    if (!PyArg_ParseTuple(args[1], "ii", &scaledWidth, &scaledHeight))
+    {
+        return NULL;
+    }
+
+    const uint8_t *webpBuffer = (const uint8_t *)memoryViewBuffer->buffer;
+    const size_t webpSize = memoryViewBuffer->bufferSize;
+
+    WebPDecoderConfig config;
+    if (!WebPInitDecoderConfig(&config) ||
+        WebPGetFeatures(webpBuffer, webpSize, &config.input) != VP8_STATUS_OK ||
+        config.input.has_animation || scaledWidth <= 0 || scaledHeight <= 0)
+    {
+        PyErr_SetString(PyExc_OSError, "Failed to decode WebP");
+        return NULL;
+    }
+
+    // Always decoded with 4 channels since that's how PIL stores RGB in memory
+    const char *mode = config.input.has_alpha ? "RGBA" : "RGBX";
+    const int stride = scaledWidth <= INT_MAX / 4 ? scaledWidth * 4 : 0;
+    size_t scaledWebpBufferSize;
+    char *scaledWebpBuffer = NULL;
+    if (stride > 0 && get_pixel_buffer_size(scaledWidth, scaledHeight, 4, &scaledWebpBufferSize) == 0)
+    {
+        scaledWebpBuffer = (char *)malloc(scaledWebpBufferSize);
+    }
+    if (scaledWebpBuffer == NULL)
+    {
+        return PyErr_NoMemory();
+    }
+
+    config.options.use_scaling = 1;
+    config.options.scaled_width = scaledWidth;
+    config.options.scaled_height = scaledHeight;
+    config.options.use_threads = 1;
+    config.output.colorspace = MODE_RGBA;
+    config.output.is_external_memory = 1;
+    config.output.u.RGBA.rgba = (uint8_t *)scaledWebpBuffer;
+    config.output.u.RGBA.stride = stride;
+    config.output.u.RGBA.size = scaledWebpBufferSize;
+
+    VP8StatusCode status;
+    Py_BEGIN_ALLOW_THREADS;
+    status = WebPDecode(webpBuffer, webpSize, &config);
+    Py_END_ALLOW_THREADS;
+
+    WebPFreeDecBuffer(&config.output);
+    if (status != VP8_STATUS_OK)
+    {
+        free(scaledWebpBuffer);
+        if (status == VP8_STATUS_OUT_OF_MEMORY)
+        {
+            return PyErr_NoMemory();
+        }
+        PyErr_SetString(PyExc_OSError, "Failed to decode WebP");
+        return NULL;
+    }
+
+    PyObject *pyWebpMemoryView = PyMemoryView_FromMemory(scaledWebpBuffer, scaledWebpBufferSize, PyBUF_READ);
+    if (pyWebpMemoryView == NULL)
+    {
+        free(scaledWebpBuffer);
+        return NULL;
+    }
+
+    return (PyObject *)CMemoryViewBufferDecoded_New(pyWebpMemoryView, scaledWebpBuffer, scaledWebpBufferSize, &memoryViewBuffer->stats, scaledWidth, scaledHeight, mode);
+}
+// Scaled WebP decoding End
+
+// Header probing Start
+#define PROBE_BUFFER_SIZE 4096
+
+static inline unsigned int read_uint16_be(const unsigned char *bytes)
+{
+    return (bytes[0] << 8) | bytes[1];
+}
+
+static inline unsigned int read_uint16_le(const unsigned char *bytes)
+{
+    return bytes[0] | (bytes[1] << 8);
+}
+
+static inline unsigned int read_uint24_le(const unsigned char *bytes)
+{
+    return bytes[0] | (bytes[1] << 8) | (bytes[2] << 16);
+}
+
+static inline unsigned int read_uint32_be(const unsigned char *bytes)
+{
+    return ((unsigned int)bytes[0] << 24) | (bytes[1] << 16) | (bytes[2] << 8) | bytes[3];
+}
+
+static inline unsigned int read_uint32_le(const unsigned char *bytes)
+{
+    return bytes[0] | (bytes[1] << 8) | (bytes[2] << 16) | ((unsigned int)bytes[3] << 24);
+}
+
+static int probe_png(const unsigned char *header, size_t headerSize, ImageHeaderInfo *result)
+{
+    if (headerSize < 26 || memcmp(header + 12, "IHDR", 4) != 0)
+    {
+        return 0;
+    }
+
+    result->width = read_uint32_be(header + 16);
+    result->height = read_uint32_be(header + 20);
+    result->bitDepth = header[24];
+
+    switch (header[25])
+    {
+    case 0:
+        result->mode = result->bitDepth == 1 ? "1" : "L";
+        break;
+    case 2:
+        result->mode = "RGB";
+        break;
+    case 3:
+        result->mode = "P";
+        break;
+    case 4:
+        result->mode = "LA";
+        break;
+    case 6:
+        result->mode = "RGBA";
+        break;
+    default:
+        return 0;
+    }
+
+    result->format = "PNG";
+    return 1;
+}
+
+static int probe_gif(const unsigned char *header, size_t headerSize, ImageHeaderInfo *result)
+{
+    if (headerSize < 11)
+    {
+        return 0;
+    }
+
+    const unsigned char packedFields = header[10];
+    const int hasGlobalColorTable = packedFields & 0x80;
+
+    result->width = read_uint16_le(header + 6);
+    result->height = read_uint16_le(header + 8);
+    result->bitDepth = hasGlobalColorTable ? (packedFields & 0x07) + 1 : 8;
+    result->mode = "P";
+    result->format = "GIF";
+    return 1;
+}
+
+static int probe_webp(const unsigned char *header, size_t headerSize, ImageHeaderInfo *result)
+{
+    if (headerSize < 30 || memcmp(header + 8, "WEBP", 4) != 0)
+    {
+        return 0;
+    }
+
+    const unsigned char *chunkData = header + 20;
+
+    if (memcmp(header + 12, "VP8 ", 4) == 0)
+    {
+        // 3 byte frame tag followed by 3 byte start code
+        if (chunkData[3] != 0x9d || chunkData[4] != 0x01 || chunkData[5] != 0x2a)
+        {
+            return 0;
+        }
+        result->width = read_uint16_le(chunkData + 6) & 0x3fff;
+        result->height = read_uint16_le(chunkData + 8) & 0x3fff;
+        result->mode = "RGB";
+    }
+    else if (memcmp(header + 12, "VP8L", 4) == 0)
+    {
+        if (chunkData[0] != 0x2f)
+        {
+            return 0;
+        }
+        // 14 bits width - 1, 14 bits height - 1, 1 bit alpha used
+        const unsigned int bits = read_uint32_le(chunkData + 1);
+        result->width = (bits & 0x3fff) + 1;
+        result->height = ((bits >> 14) & 0x3fff) + 1;
+        result->mode = (bits >> 28) & 1 ? "RGBA" : "RGB";
+    }
+    else if (memcmp(header + 12, "VP8X", 4) == 0)
+    {
+        const int hasAlpha = chunkData[0] & 0x10;
+        result->width = read_uint24_le(chunkData + 4) + 1;
+        result->height = read_uint24_le(chunkData + 7) + 1;
+        result->mode = hasAlpha ? "RGBA" : "RGB";
+    }
+    else
+    {
+        return 0;
+    }
+
+    result->bitDepth = 8;
+    result->format = "WebP";
+    return 1;
+}
+
+#define DDPF_ALPHAPIXELS 0x1
+#define DDPF_FOURCC 0x4
+#define DDPF_RGB 0x40
+#define DDPF_LUMINANCE 0x20000
+
+static int probe_dds(const unsigned char *header, size_t headerSize, ImageHeaderInfo *result)
+{
+    if (headerSize < 128 || read_uint32_le(header + 4) != 124)
+    {
+        return 0;
+    }
+
+    result->height = read_uint32_le(header + 12);
+    result->width = read_uint32_le(header + 16);
+    result->bitDepth = 8;
+
+    const unsigned int pixelFlags = read_uint32_le(header + 80);
+    const unsigned char *fourCC = header + 84;
+    const int hasAlpha = pixelFlags & DDPF_ALPHAPIXELS;
+
+    if (pixelFlags & DDPF_FOURCC)
+    {
+        if (memcmp(fourCC, "ATI1", 4) == 0 || memcmp(fourCC, "BC4U", 4) == 0)
+        {
+            result->mode = "L";
+        }
+        else if (memcmp(fourCC, "ATI2", 4) == 0 || memcmp(fourCC, "BC5U", 4) == 0)
+        {
+            result->mode = "RGB";
+        }
+        else
+        {
+            result->mode = "RGBA";
+        }
+    }
+    else if (pixelFlags & DDPF_LUMINANCE)
+    {
+        result->mode = hasAlpha ? "LA" : "L";
+    }
+    else
+    {
+        result->mode = hasAlpha ? "RGBA" : "RGB";
+    }
+
+    result->format = "DDS";
+    return 1;
+}
+
+// Searches ISOBMFF boxes for ispe (dimensions), pixi (bit depth) and auxC (alpha)
+static void probe_avif_boxes(const unsigned char *boxes, size_t size, ImageHeaderInfo *result)
+{
+    size_t offset = 0;
+    while (offset + 8 <= size)
+    {
+        size_t boxSize = read_uint32_be(boxes + offset);
+        const unsigned char *boxType = boxes + offset + 4;
+        size_t headerSize = 8;
+
+        if (boxSize == 1)
+        {
+            if (offset + 16 > size || read_uint32_be(boxes + offset + 8) != 0)
+            {
+                return; // Boxes over 4GB can't be within the probed bytes
+            }
+            boxSize = read_uint32_be(boxes + offset + 12);
+            headerSize = 16;
+        }
+        else if (boxSize == 0)
+        {
+            boxSize = size - offset;
+        }
+
+        if (boxSize < headerSize)
+        {
+            return;
+        }
+
+        // Only parse what was read, boxes may continue past the probed bytes
+        const unsigned char *content = boxes + offset + headerSize;
+        const size_t available = (boxSize > size - offset ? size - offset : boxSize) - headerSize;
+
+        if (memcmp(boxType, "meta", 4) == 0 && available >= 4)
+        {
+            // meta is a full box with 4 bytes of version and flags
+            probe_avif_boxes(content + 4, available - 4, result);
+        }
+        else if (memcmp(boxType, "iprp", 4) == 0 || memcmp(boxType, "ipco", 4) == 0)
+        {
+            probe_avif_boxes(content, available, result);
+        }
+        else if (memcmp(boxType, "ispe", 4) == 0 && available >= 12 && result->width == 0)
+        {
+            result->width = read_uint32_be(content + 4);
+            result->height = read_uint32_be(content + 8);
+        }
+        else if (memcmp(boxType, "pixi", 4) == 0 && available >= 6 && result->bitDepth == 0)
+        {
+            result->bitDepth = content[5];
+        }
+        else if (memcmp(boxType, "auxC", 4) == 0 && available > 4)
+        {
+            const char alphaUrn[] = "urn:mpeg:mpegB:cicp:systems:auxiliary:alpha";
+            if (available - 4 >= sizeof(alphaUrn) && memcmp(content + 4, alphaUrn, sizeof(alphaUrn) - 1) == 0)
+            {
+                result->mode = "RGBA";
+            }
+        }
+
+        offset += boxSize;
+    }
+}
+
+static int probe_avif(const unsigned char *header, size_t headerSize, ImageHeaderInfo *result)
+{
+    if (headerSize < 12 || memcmp(header + 4, "ftyp", 4) != 0)
+    {
+        return 0;
+    }
+
+    result->mode = "RGB";
+    probe_avif_boxes(header, headerSize, result);
+    if (result->width == 0)
+    {
+        return 0;
+    }
+
+    if (result->bitDepth == 0)
+    {
+        result->bitDepth = 8;
+    }
+    result->format = "AVIF";
+    return 1;
+}
+
+// JPEG segments can be large, so seek past them instead of reading everything
+static int probe_jpeg(FILE *file, ImageHeaderInfo *result)
+{
+    unsigned char segment[8];
+
+    if (fseek(file, 2, SEEK_SET) != 0)
+    {
+        return 0;
+    }
+
+    while (fread(segment, 1, 2, file) == 2)
+    {
+        if (segment[0] != 0xff)
+        {
+            return 0;
+        }
+
+        unsigned char marker = segment[1];
+        while (marker == 0xff) // Markers may be padded with 0xff
+        {
+            if (fread(&marker, 1, 1, file) != 1)
+            {
+                return 0;
+            }
+        }
+
+        // Standalone markers have no length
+        if (marker == 0x01 || (marker >= 0xd0 && marker <= 0xd7))
+        {
+            continue;
+        }
+
+        if (marker == 0xd9 || marker == 0xda) // End of image or start of scan
+        {
+            return 0;
+        }
+
+        if (fread(segment, 1, 2, file) != 2)
+        {
+            return 0;
+        }
+        const unsigned int segmentLength = read_uint16_be(segment);
+        if (segmentLength < 2)
+        {
+            return 0;
+        }
+
+        // SOF0 through SOF15 excluding DHT, JPG, and DAC
+        if (marker >= 0xc0 && marker <= 0xcf && marker != 0xc4 && marker != 0xc8 && marker != 0xcc)
+        {
+            if (fread(segment, 1, 6, file) != 6)
+            {
+                return 0;
+            }
+            result->bitDepth = segment[0];
+            result->height = read_uint16_be(segment + 1);
+            result->width = read_uint16_be(segment + 3);
+
+            switch (segment[5])
+            {
+            case 1:
+                result->mode = "L";
+                break;
+            case 4:
+                result->mode = "CMYK";
+                break;
+            default:
+                result->mode = "RGB";
+                break;
+            }
+
+            result->format = "JPEG";
+            return 1;
+        }
+
+        if (fseek(file, segmentLength - 2, SEEK_CUR) != 0)
+        {
+            return 0;
+        }
+    }
+
+    return 0;
+}
+
+static int probe_file(const char *path, ImageHeaderInfo *result)
+{
+    FILE *file = fopen(path, "rb");
+    if (file == NULL)
+    {
+        return 0;
+    }
+
+    unsigned char header[PROBE_BUFFER_SIZE];
+    const size_t headerSize = fread(header, sizeof(unsigned char), PROBE_BUFFER_SIZE, file);
+
+    int found = 0;
+    if (headerSize >= 4)
+    {
+        if (memcmp(header, "\x89PNG", 4) == 0)
+        {
+            found = probe_png(header, headerSize, result);
+        }
+        else if (memcmp(header, "GIF8", 4) == 0)
+        {
+            found = probe_gif(header, headerSize, result);
+        }
+        else if (memcmp(header, "RIFF", 4) == 0)
+        {
+            found = probe_webp(header, headerSize, result);
+        }
+        else if (memcmp(header, "DDS ", 4) == 0)
+        {
+            found = probe_dds(header, headerSize, result);
+        }
+        else if (memcmp(header, "\xff\xd8\xff", 3) == 0)
+        {
+            found = probe_jpeg(file, result);
+        }
+        else
+        {
+            found = probe_avif(header, headerSize, result);
+        }
+    }
+
+    fclose(file);
+    return found;
+}
+
+static PyObject *probe_image(PyObject *self, PyObject *arg)
+{
+    const char *path = PyUnicode_AsUTF8(arg);
+    if (path == NULL)
+    {
+        return NULL;
+    }
+
+    ImageHeaderInfo result = {0};
+    int found;
+
+    // Release GIL so many images can be probed at once from a thread pool
+    Py_BEGIN_ALLOW_THREADS;
+    found = probe_file(path, &result);
+    Py_END_ALLOW_THREADS;
+
+    if (!found)
+    {
+        Py_RETURN_NONE;
+    }
+
+    CImageHeader *imageHeader = (CImageHeader *)PyObject_New(CImageHeader, &CImageHeader_Type);
+    if (imageHeader == NULL)
+    {
+        return NULL;
+    }
+    imageHeader->info = result;
+
+    return (PyObject *)imageHeader;
+}
+// Header probing End
+
+// Embedded thumbnail scanning Start
+#define TIFF_TAG_JPEG_OFFSET 0x0201
+#define TIFF_TAG_JPEG_LENGTH 0x0202
+#define MPF_TAG_MP_ENTRY 0xb002
+#define MPF_TYPE_LARGE_THUMBNAIL 0x01
+
+static inline unsigned int read_tiff_uint16(const unsigned char *bytes, int littleEndian)
+{
+    return littleEndian ? read_uint16_le(bytes) : read_uint16_be(bytes);
+}
+
+static inline unsigned int read_tiff_uint32(const unsigned char *bytes, int littleEndian)
+{
+    return littleEndian ? read_uint32_le(bytes) : read_uint32_be(bytes);
+}
+
+// Returns offset of the first IFD in a TIFF header or 0 if the header is not valid
+static size_t read_tiff_header(const unsigned char *tiff, size_t tiffSize, int *littleEndian)
+{
+    if (tiffSize < 8)
+    {
+        return 0;
     }
 
-    return (PyObject *)CMemoryViewBufferJpeg_New(pyJpegMemoryView, resizedJpegBuffer, resizedJpegBufferSize, scaledWidth, scaledHeight);
+    if (memcmp(tiff, "II*\0", 4) == 0)
+    {
+        *littleEndian = 1;
+    }
+    else if (memcmp(tiff, "MM\0*", 4) == 0)
+    {
+        *littleEndian = 0;
+    }
+    else
+    {
+        return 0;
+    }
+
+    return read_tiff_uint32(tiff + 4, *littleEndian);
+}
+
+// Returns the 12 byte IFD entry for tag or NULL if its not in the IFD
+static const unsigned char *find_tiff_entry(const unsigned char *tiff, size_t tiffSize, int littleEndian, size_t ifdOffset, unsigned int tag)
+{
+    if (ifdOffset == 0 || ifdOffset + 2 > tiffSize)
+    {
+        return NULL;
+    }
+
+    const unsigned int entryCount = read_tiff_uint16(tiff + ifdOffset, littleEndian);
+    size_t entryOffset = ifdOffset + 2;
+    for (unsigned int i = 0; i < entryCount && entryOffset + 12 <= tiffSize; i++, entryOffset += 12)
+    {
+        if (read_tiff_uint16(tiff + entryOffset, littleEndian) == tag)
+        {
+            return tiff + entryOffset;
+        }
+    }
 
-destroy:
-    tjDestroy(decompressHandle);
     return NULL;
 }
 
+static inline void keep_largest_jpeg(const unsigned char *buffer, size_t bufferSize, size_t offset, size_t length, EmbeddedJpeg *result)
+{
+    if (length > result->length && offset < bufferSize && length >= 2 && length <= bufferSize - offset &&
+        buffer[offset] == 0xff && buffer[offset + 1] == 0xd8)
+    {
+        result->offset = offset;
+        result->length = length;
+    }
+}
+
+// EXIF stores a small thumbnail in IFD1, the IFD after the one describing the image
+static void find_exif_thumbnail(const unsigned char *buffer, size_t bufferSize, const unsigned char *tiff, size_t tiffSize, EmbeddedJpeg *result)
+{
+    int littleEndian;
+    const size_t ifd0Offset = read_tiff_header(tiff, tiffSize, &littleEndian);
+    if (ifd0Offset == 0 || ifd0Offset + 2 > tiffSize)
+    {
+        return;
+    }
+
+    const size_t nextIfdOffset = ifd0Offset + 2 + 12 * (size_t)read_tiff_uint16(tiff + ifd0Offset, littleEndian);
+    if (nextIfdOffset + 4 > tiffSize)
+    {
+        return;
+    }
+
+    const size_t ifd1Offset = read_tiff_uint32(tiff + nextIfdOffset, littleEndian);
+    const unsigned char *jpegOffset = find_tiff_entry(tiff, tiffSize, littleEndian, ifd1Offset, TIFF_TAG_JPEG_OFFSET);
+    const unsigned char *jpegLength = find_tiff_entry(tiff, tiffSize, littleEndian, ifd1Offset, TIFF_TAG_JPEG_LENGTH);
+    if (jpegOffset == NULL || jpegLength == NULL)
+    {
+        return;
+    }
+
+    // Offsets are from the start of the TIFF header
+    keep_largest_jpeg(
+        buffer,
+        bufferSize,
+        (size_t)(tiff - buffer) + read_tiff_uint32(jpegOffset + 8, littleEndian),
+        read_tiff_uint32(jpegLength + 8, littleEndian),
+        result);
+}
+
+// Multi-Picture Format lists larger previews that are stored after the main image
+static void find_mpf_preview(const unsigned char *buffer, size_t bufferSize, const unsigned char *tiff, size_t tiffSize, EmbeddedJpeg *result)
+{
+    int littleEndian;
+    const size_t indexIfdOffset = read_tiff_header(tiff, tiffSize, &littleEndian);
+    const unsigned char *entries = find_tiff_entry(tiff, tiffSize, littleEndian, indexIfdOffset, MPF_TAG_MP_ENTRY);
+    if (entries == NULL)
+    {
+        return;
+    }
+
+    const size_t entriesSize = read_tiff_uint32(entries + 4, littleEndian);
+    const size_t entriesOffset = read_tiff_uint32(entries + 8, littleEndian);
+    if (entriesOffset > tiffSize || entriesSize > tiffSize - entriesOffset)
+    {
+        return;
+    }
+
+    // 16 bytes per image: attributes, size, offset, and two dependent image numbers
+    for (size_t entryOffset = entriesOffset; entryOffset + 16 <= entriesOffset + entriesSize; entryOffset += 16)
+    {
+        const unsigned char *entry = tiff + entryOffset;
+        const unsigned int imageType = read_tiff_uint32(entry, littleEndian) & 0xffffff;
+
+        // Skip the main image and other full size images like stereo pairs
+        if (imageType >> 16 == MPF_TYPE_LARGE_THUMBNAIL)
+        {
+            keep_largest_jpeg(
+                buffer,
+                bufferSize,
+                (size_t)(tiff - buffer) + read_tiff_uint32(entry + 8, littleEndian),
+                read_tiff_uint32(entry + 4, littleEndian),
+                result);
+        }
+    }
+}
+
+// Only walks APPn segments before the image data, so the cost does not grow with the image
+static int find_embedded_jpeg(const unsigned char *buffer, size_t bufferSize, EmbeddedJpeg *result)
+{
+    if (bufferSize < 4 || buffer[0] != 0xff || buffer[1] != 0xd8)
+    {
+        return 0;
+    }
+
+    size_t offset = 2;
+    while (offset + 4 <= bufferSize && buffer[offset] == 0xff)
+    {
+        const unsigned char marker = buffer[offset + 1];
+        if (marker == 0xff) // Markers may be padded with 0xff
+        {
+            offset++;
+            continue;
+        }
+
+        if (marker == 0xd9 || marker == 0xda) // End of image or start of scan
+        {
+            break;
+        }
+
+        // Standalone markers have no length
+        if (marker == 0x01 || (marker >= 0xd0 && marker <= 0xd7))
+        {
+            offset += 2;
+            continue;
+        }
+
+        const size_t segmentLength = read_uint16_be(buffer + offset + 2);
+        if (segmentLength < 2 || segmentLength > bufferSize - offset - 2)
+        {
+            break;
+        }
+
+        const unsigned char *data = buffer + offset + 4;
+        const size_t dataSize = segmentLength - 2;
+        if (marker == 0xe1 && dataSize > 6 && memcmp(data, "Exif\0\0", 6) == 0)
+        {
+            find_exif_thumbnail(buffer, bufferSize, data + 6, dataSize - 6, result);
+        }
+        else if (marker == 0xe2 && dataSize > 4 && memcmp(data, "MPF\0", 4) == 0)
+        {
+            find_mpf_preview(buffer, bufferSize, data + 4, dataSize - 4, result);
+        }
+
+        offset += 2 + segmentLength;
+    }
+
+    return result->length > 0;
+}
+
+static PyObject *find_jpeg_thumbnail(PyObject *self, PyObject *arg)
+{
+    if (!PyObject_TypeCheck(arg, &CMemoryViewBuffer_Type))
+    {
+        PyErr_SetString(PyExc_TypeError, "find_jpeg_thumbnail takes a CMemoryViewBuffer");
+        return NULL;
+    }
+
+    const CMemoryViewBuffer *memoryViewBuffer = (CMemoryViewBuffer *)arg;
+    EmbeddedJpeg result = {0};
+
+    if (!find_embedded_jpeg((const unsigned char *)memoryViewBuffer->buffer, memoryViewBuffer->bufferSize, &result))
+    {
+        Py_RETURN_NONE;
+    }
+
+    return Py_BuildValue("(nn)", (Py_ssize_t)result.offset, (Py_ssize_t)result.length);
+}
+// Embedded thumbnail scanning End
+
+// DDS mip levels Start
+#define DDS_HEADER_SIZE 128
+#define DDS_DX10_HEADER_SIZE 20
+#define DDS_PALETTE_SIZE 1024
+#define DDPF_PALETTEINDEXED8 0x20
+#define DDSCAPS2_VOLUME 0x200000
+
+/*
+ * Returns bytes per 4x4 block of a block compressed DDS, or 0 if it isn't one.
+ * Sets bytesPerPixel instead for uncompressed formats this can size.
+ */
+static int get_dds_block_size(const unsigned char *header, size_t size, int *bytesPerPixel)
+{
+    const unsigned int pixelFlags = read_uint32_le(header + 80);
+    const unsigned char *fourCC = header + 84;
+    *bytesPerPixel = 0;
+
+    if (!(pixelFlags & DDPF_FOURCC))
+    {
+        const unsigned int bitCount = read_uint32_le(header + 88);
+        if (bitCount % 8 == 0)
+        {
+            *bytesPerPixel = bitCount / 8;
+        }
+        return 0;
+    }
+
+    if (memcmp(fourCC, "DXT1", 4) == 0 || memcmp(fourCC, "ATI1", 4) == 0 ||
+        memcmp(fourCC, "BC4U", 4) == 0 || memcmp(fourCC, "BC4S", 4) == 0)
+    {
+        return 8;
+    }
+    if (memcmp(fourCC, "DXT3", 4) == 0 || memcmp(fourCC, "DXT5", 4) == 0 ||
+        memcmp(fourCC, "ATI2", 4) == 0 || memcmp(fourCC, "BC5U", 4) == 0 ||
+        memcmp(fourCC, "BC5S", 4) == 0)
+    {
+        return 16;
+    }
+    if (memcmp(fourCC, "DX10", 4) != 0 || size < DDS_HEADER_SIZE + DDS_DX10_HEADER_SIZE)
+    {
+        return 0;
+    }
+
+    // Ranges of DXGI_FORMAT values that PIL can decode
+    const unsigned int dxgiFormat = read_uint32_le(header + DDS_HEADER_SIZE);
+    if ((dxgiFormat >= 70 && dxgiFormat <= 72) || (dxgiFormat >= 79 && dxgiFormat <= 81))
+    {
+        return 8; // BC1, BC4
+    }
+    if ((dxgiFormat >= 73 && dxgiFormat <= 78) || (dxgiFormat >= 82 && dxgiFormat <= 84) ||
+        (dxgiFormat >= 94 && dxgiFormat <= 99))
+    {
+        return 16; // BC2, BC3, BC5, BC6H, BC7
+    }
+    if (dxgiFormat >= 27 && dxgiFormat <= 29)
+    {
+        *bytesPerPixel = 4; // R8G8B8A8
+    }
+
+    return 0;
+}
+
+static inline size_t get_dds_level_size(unsigned int width, unsigned int height, int blockSize, int bytesPerPixel)
+{
+    if (blockSize)
+    {
+        return (size_t)((width + 3) / 4) * ((height + 3) / 4) * blockSize;
+    }
+
+    return (size_t)width * height * bytesPerPixel;
+}
+
+/*
+ * Finds the smallest mip level of a DDS that is at least minWidth x minHeight.
+ * Returns 1 and fills in result if it's smaller than the full size level.
+ */
+static int find_mip_level(const unsigned char *buffer, size_t size, unsigned int minWidth, unsigned int minHeight, DdsMipLevel *result)
+{
+    if (size < DDS_HEADER_SIZE || memcmp(buffer, "DDS ", 4) != 0 || read_uint32_le(buffer + 4) != 124 ||
+        read_uint32_le(buffer + 112) & DDSCAPS2_VOLUME)
+    {
+        return 0;
+    }
+
+    const unsigned int mipCount = read_uint32_le(buffer + 28);
+    unsigned int width = read_uint32_le(buffer + 16);
+    unsigned int height = read_uint32_le(buffer + 12);
+    int bytesPerPixel;
+    const int blockSize = get_dds_block_size(buffer, size, &bytesPerPixel);
+    if (mipCount < 2 || width == 0 || height == 0 || (blockSize == 0 && bytesPerPixel == 0))
+    {
+        return 0;
+    }
+
+    size_t offset = DDS_HEADER_SIZE;
+    if (memcmp(buffer + 84, "DX10", 4) == 0)
+    {
+        offset += DDS_DX10_HEADER_SIZE;
+    }
+    else if (read_uint32_le(buffer + 80) & DDPF_PALETTEINDEXED8)
+    {
+        offset += DDS_PALETTE_SIZE;
+    }
+
+    unsigned int level = 0;
+    for (; level + 1 < mipCount; level++)
+    {
+        const unsigned int nextWidth = width > 1 ? width / 2 : 1;
+        const unsigned int nextHeight = height > 1 ? height / 2 : 1;
+        if (nextWidth < minWidth || nextHeight < minHeight || (nextWidth == width && nextHeight == height))
+        {
+            break;
+        }
+
+        offset += get_dds_level_size(width, height, blockSize, bytesPerPixel);
+        width = nextWidth;
+        height = nextHeight;
+    }
+
+    if (level == 0 || offset + get_dds_level_size(width, height, blockSize, bytesPerPixel) > size)
+    {
+        return 0;
+    }
+
+    result->offset = offset;
+    result->width = width;
+    result->height = height;
+    return 1;
+}
+
+static PyObject *find_dds_mip_level(PyObject *self, PyObject *const *args, Py_ssize_t argLen)
+{
+    if (argLen != 3 || !PyObject_TypeCheck(args[0], &CMemoryViewBuffer_Type))
+    {
+        PyErr_SetString(PyExc_TypeError, "find_dds_mip_level takes a CMemoryViewBuffer, width, and height");
+        return NULL;
+    }
+
+    const CMemoryViewBuffer *memoryViewBuffer = (CMemoryViewBuffer *)args[0];
+    const unsigned long minWidth = PyLong_AsUnsignedLong(args[1]);
+    const unsigned long minHeight = PyLong_AsUnsignedLong(args[2]);
+    if (PyErr_Occurred())
+    {
+        return NULL;
+    }
+
+    DdsMipLevel result = {0};
+    if (!find_mip_level((const unsigned char *)memoryViewBuffer->buffer, memoryViewBuffer->bufferSize, minWidth, minHeight, &result))
+    {
+        Py_RETURN_NONE;
+    }
+
+    return Py_BuildValue("(nII)", (Py_ssize_t)result.offset, result.width, result.height);
+}
+// DDS mip levels End
+
 static PyMethodDef jpeg_methods[] = {
     {"read_image_into_buffer", read_image_into_buffer, METH_O, NULL},
     {"decode_scaled_jpeg", (PyCFunction)decode_scaled_jpeg, METH_FASTCALL, NULL},
+    {"decode_scaled_webp", (PyCFunction)decode_scaled_webp, METH_FASTCALL, NULL},
+    {"probe_image", probe_image, METH_O, NULL},
+    {"find_jpeg_thumbnail", find_jpeg_thumbnail, METH_O, NULL},
+    {"find_dds_mip_level", (PyCFunction)find_dds_mip_level, METH_FASTCALL, NULL},
     {NULL, NULL, 0, NULL}};
 
 static struct PyModuleDef jpeg_module = {
@@ -207,7 +1392,8 @@ static struct PyModuleDef jpeg_module = {
 PyMODINIT_FUNC PyInit__read(void)
 {
     if (PyType_Ready(&CMemoryViewBuffer_Type) < 0 ||
-        PyType_Ready(&CMemoryViewBufferJpeg_Type) < 0)
+        PyType_Ready(&CMemoryViewBufferDecoded_Type) < 0 ||
+        PyType_Ready(&CImageHeader_Type) < 0)
     {
         return NULL;
     }
@@ -215,7 +1401,8 @@ PyMODINIT_FUNC PyInit__read(void)
     PyObject *module = PyModule_Create(&jpeg_module);
 
     if (PyModule_AddObjectRef(module, "CMemoryViewBuffer", (PyObject *)&CMemoryViewBuffer_Type) < 0 ||
-        PyModule_AddObjectRef(module, "CMemoryViewBufferJpeg", (PyObject *)&CMemoryViewBufferJpeg_Type) < 0)
+        PyModule_AddObjectRef(module, "CMemoryViewBufferDecoded", (PyObject *)&CMemoryViewBufferDecoded_Type) < 0 ||
+        PyModule_AddObjectRef(module, "CImageHeader", (PyObject *)&CImageHeader_Type) < 0)
     {
         Py_DECREF(module);
         return NULL;
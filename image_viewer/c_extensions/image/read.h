@@ -1,18 +1,73 @@
 #ifndef PIV_IMAGE_READ
 #define PIV_IMAGE_READ
 
+typedef struct
+{
+    long long size;
+    long long modifiedTimeNs;
+    long long changedTimeNs;
+    unsigned long long inode;
+    unsigned long long device;
+} FileStatInfo;
+
 typedef struct
 {
     PyObject_HEAD;
     char *buffer;
-    unsigned long bufferSize;
+    size_t bufferSize;
     PyObject *view;
+    FileStatInfo stats;
 } CMemoryViewBuffer;
 
 typedef struct
 {
     CMemoryViewBuffer base;
     PyObject *dimensions;
-} CMemoryViewBufferJpeg;
+    const char *mode;
+} CMemoryViewBufferDecoded;
+
+typedef struct
+{
+    int width;
+    int height;
+    int bitDepth;
+    const char *mode;
+    const char *format;
+} ImageHeaderInfo;
+
+typedef struct
+{
+    PyObject_HEAD;
+    ImageHeaderInfo info;
+} CImageHeader;
+
+// Decoded JPEGs with at least this many pixels are split across threads
+#define PARALLEL_DECODE_MIN_PIXELS 16000000
+#define MAX_DECODE_THREADS 16
+
+typedef struct
+{
+    const unsigned char *jpegBuffer;
+    size_t jpegSize;
+    unsigned char *outputBuffer;
+    int pitch;
+    int pixelFormat;
+    tjscalingfactor scalingFactor;
+    tjregion region;
+    int failed;
+} JpegBand;
+
+typedef struct
+{
+    size_t offset;
+    size_t length;
+} EmbeddedJpeg;
+
+typedef struct
+{
+    size_t offset;
+    unsigned int width;
+    unsigned int height;
+} DdsMipLevel;
 
 #endif /* PIV_IMAGE_READ */
@@ -10,6 +10,10 @@ from util._generic import is_valid_hex_color, is_valid_keybind
 
 DEFAULT_FONT: str = "arial.ttf" if os.name == "nt" else "LiberationSans-Regular.ttf"
 DEFAULT_MAX_ITEMS_IN_CACHE: int = 20
+DEFAULT_CACHE_HASH_SIZE: int = 0
+DEFAULT_CACHE_ANIMATION_MEMORY_MB: int = 512
+DEFAULT_ANIMATION_DISPLAY_MEMORY_MB: int = 1024
+DEFAULT_ANIMATION_FRAME_MEMORY_MB: int = 1024
 DEFAULT_BACKGROUND_COLOR: str = "#000000"
 
 
@@ -32,19 +36,30 @@ def _validate_keybind_or_default(keybind: str, default: str) -> str:
 class DefaultKeybinds(StrEnum):
     """Defaults for keybinds that config.ini can override"""
 
+    CHANGE_SORT_MODE = "<Control-s>"
     COPY_TO_CLIPBOARD_AS_BASE64 = "<Control-E>"
     MOVE_TO_NEW_FILE = "<Control-m>"
     REFRESH = "<Control-r>"
     RELOAD_IMAGE = "<F5>"
     RENAME = "<F2>"
     SHOW_DETAILS = "<Control-d>"
+    TOGGLE_RECURSIVE = "<Control-R>"
     UNDO_MOST_RECENT_ACTION = "<Control-z>"
 
 
 class Config:
     """Reads configs from config.ini"""
 
-    __slots__ = ("background_color", "font_file", "keybinds", "max_items_in_cache")
+    __slots__ = (
+        "animation_display_memory_mb",
+        "animation_frame_memory_mb",
+        "background_color",
+        "cache_animation_memory_mb",
+        "cache_hash_size",
+        "font_file",
+        "keybinds",
+        "max_items_in_cache",
+    )
 
     def __init__(
         self, working_directory: str, config_file_name: str = "config.ini"
@@ -58,14 +73,28 @@ class Config:
         self.max_items_in_cache: int = config_parser.get_int_safe(
             "CACHE", "SIZE", DEFAULT_MAX_ITEMS_IN_CACHE
         )
+        self.cache_hash_size: int = config_parser.get_int_safe(
+            "CACHE", "HASH_SIZE", DEFAULT_CACHE_HASH_SIZE
+        )
+        self.cache_animation_memory_mb: int = config_parser.get_int_safe(
+            "CACHE", "ANIMATION_MEMORY_MB", DEFAULT_CACHE_ANIMATION_MEMORY_MB
+        )
+        self.animation_display_memory_mb: int = config_parser.get_int_safe(
+            "ANIMATION", "DISPLAY_MEMORY_MB", DEFAULT_ANIMATION_DISPLAY_MEMORY_MB
+        )
+        self.animation_frame_memory_mb: int = config_parser.get_int_safe(
+            "ANIMATION", "FRAME_MEMORY_MB", DEFAULT_ANIMATION_FRAME_MEMORY_MB
+        )
 
         self.keybinds = KeybindConfig(
+            config_parser.get_string_safe("KEYBINDS", "CHANGE_SORT_MODE"),
             config_parser.get_string_safe("KEYBINDS", "COPY_TO_CLIPBOARD_AS_BASE64"),
             config_parser.get_string_safe("KEYBINDS", "MOVE_TO_NEW_FILE"),
             config_parser.get_string_safe("KEYBINDS", "REFRESH"),
             config_parser.get_string_safe("KEYBINDS", "RELOAD_IMAGE"),
             config_parser.get_string_safe("KEYBINDS", "RENAME"),
             config_parser.get_string_safe("KEYBINDS", "SHOW_DETAILS"),
+            config_parser.get_string_safe("KEYBINDS", "TOGGLE_RECURSIVE"),
             config_parser.get_string_safe("KEYBINDS", "UNDO_MOST_RECENT_ACTION"),
         )
 
@@ -81,25 +110,32 @@ class KeybindConfig:
     """Contains configurable tkinter keybinds"""
 
     __slots__ = (
+        "change_sort_mode",
         "copy_to_clipboard_as_base64",
         "move_to_new_file",
         "refresh",
         "reload_image",
         "rename",
         "show_details",
+        "toggle_recursive",
         "undo_most_recent_action",
     )
 
     def __init__(
         self,
+        change_sort_mode: str,
         copy_to_clipboard_as_base64: str,
         move_to_new_file: str,
         refresh: str,
         reload_image: str,
         rename: str,
         show_details: str,
+        toggle_recursive: str,
         undo_most_recent_action: str,
     ) -> None:
+        self.change_sort_mode: str = _validate_keybind_or_default(
+            change_sort_mode, DefaultKeybinds.CHANGE_SORT_MODE
+        )
         self.copy_to_clipboard_as_base64: str = _validate_keybind_or_default(
             copy_to_clipboard_as_base64, DefaultKeybinds.COPY_TO_CLIPBOARD_AS_BASE64
         )
@@ -116,6 +152,9 @@ class KeybindConfig:
         self.show_details: str = _validate_keybind_or_default(
             show_details, DefaultKeybinds.SHOW_DETAILS
         )
+        self.toggle_recursive: str = _validate_keybind_or_default(
+            toggle_recursive, DefaultKeybinds.TOGGLE_RECURSIVE
+        )
         self.undo_most_recent_action: str = _validate_keybind_or_default(
             undo_most_recent_action, DefaultKeybinds.UNDO_MOST_RECENT_ACTION
         )
@@ -47,6 +47,15 @@ class TkTags(StrEnum):
     BACKGROUND = "back"
 
 
+class SortMode(StrEnum):
+    """Orders that the list of images can be sorted in"""
+
+    NAME = "name"
+    NEWEST = "newest"
+    LARGEST_FILE = "largest file"
+    MOST_PIXELS = "most pixels"
+
+
 class ButtonName(StrEnum):
     """Names of buttons on the UI"""
 
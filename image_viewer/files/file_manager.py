@@ -1,6 +1,10 @@
 import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from enum import Enum
 from os import stat_result
+from queue import Empty, SimpleQueue
+from threading import Thread
 from time import ctime
 from tkinter.messagebox import askyesno
 
@@ -8,12 +12,20 @@ from PIL.Image import Image
 
 from actions.types import Convert, Delete, Rename
 from actions.undoer import ActionUndoer, UndoResponse
-from constants import VALID_FILE_TYPES
+from constants import VALID_FILE_TYPES, SortMode
 from files.file_dialog_asker import FileDialogAsker
-from image.cache import ImageCache, ImageCacheEntry
+from image._read import CImageHeader, probe_image
+from image.cache import FileStats, ImageCache, ImageCacheEntry
 from image.file import ImageName, ImageNameList
+from image.metadata import ImageMetadataIndex
 from util.io import try_convert_file_and_save_new
-from util.os import get_files_in_folder, get_normalized_dir_name, trash_file
+from util.os import (
+    get_byte_display,
+    get_files_and_folders_in_folder,
+    get_files_in_folder,
+    get_normalized_dir_name,
+    trash_file,
+)
 
 
 class _ShouldPreserveIndex(Enum):
@@ -22,23 +34,50 @@ class _ShouldPreserveIndex(Enum):
     YES = 3
 
 
+def _filter_images(file_names: Iterable[str]) -> list[ImageName]:
+    """Returns ImageName of each file name that is a supported image"""
+    return [
+        image_name
+        for file_name in file_names
+        if (image_name := ImageName(file_name)).suffix in VALID_FILE_TYPES
+    ]
+
+
 class ImageFileManager:
     """Manages internal list of images"""
 
     __slots__ = (
         "_files",
+        "_metadata_id",
+        "_metadata_ready_id",
+        "_scan_id",
+        "_scanned_images",
         "action_undoer",
         "current_image",
         "file_dialog_asker",
         "image_cache",
         "image_directory",
+        "metadata_index",
         "path_to_image",
+        "recursive",
+        "scanning",
+        "sort_mode",
     )
 
     def __init__(self, first_image_path: str, image_cache: ImageCache) -> None:
         """Load single file for display before we load the rest"""
         self.image_directory: str = get_normalized_dir_name(first_image_path)
         self.image_cache: ImageCache = image_cache
+        self.metadata_index: ImageMetadataIndex = ImageMetadataIndex()
+        self.sort_mode: SortMode = SortMode.NAME
+        self._metadata_id: int = 0
+        self._metadata_ready_id: int = 0
+
+        # When recursive, image names are paths relative to image_directory
+        self.recursive: bool = False
+        self.scanning: bool = False
+        self._scan_id: int = 0
+        self._scanned_images: SimpleQueue[tuple[int, list[ImageName]]] = SimpleQueue()
 
         self.action_undoer: ActionUndoer = ActionUndoer()
         self.file_dialog_asker: FileDialogAsker = FileDialogAsker(VALID_FILE_TYPES)
@@ -66,11 +105,11 @@ class ImageFileManager:
         if new_file_path == "":
             return False
 
-        chosen_file: str = os.path.basename(new_file_path)
-        new_dir: str = get_normalized_dir_name(new_file_path)
+        chosen_file: str | None = self._get_image_name_in_directory(new_file_path)
 
-        if new_dir != self.image_directory:
-            self.image_directory = new_dir
+        if chosen_file is None:
+            chosen_file = os.path.basename(new_file_path)
+            self.image_directory = get_normalized_dir_name(new_file_path)
             self.refresh_image_list()
 
         index: int
@@ -96,40 +135,245 @@ class ImageFileManager:
         self.current_image = self._files.get_current_image()
         self.path_to_image = self.get_path_to_image()
 
+    def _get_image_name_in_directory(self, path: str) -> str | None:
+        """Returns name a path would have in the image list
+        or None if its outside of the directory being viewed"""
+        dir_name: str = get_normalized_dir_name(path)
+        if dir_name == self.image_directory:
+            return os.path.basename(path)
+
+        directory_prefix: str = os.path.join(self.image_directory, "")
+        if self.recursive and dir_name.startswith(directory_prefix):
+            return os.path.normpath(path)[len(directory_prefix) :]
+
+        return None
+
+    def _get_image_name(self, path: str) -> str:
+        """Returns name a path has in the image list
+        falling back to its base name if outside of the directory being viewed"""
+        image_name: str | None = self._get_image_name_in_directory(path)
+        return image_name if image_name is not None else os.path.basename(path)
+
     def find_all_images(self) -> None:
-        """Finds all supported image in directory"""
+        """Finds all supported image in directory.
+        When recursive, subfolders are scanned in the background and
+        found images are added by calling merge_scanned_images"""
         image_to_start_at: str = self._files.get_current_image_name()
+        self._scan_id += 1
 
-        self._files = ImageNameList(
-            [
-                image_path
-                for path in get_files_in_folder(self.image_directory)
-                if (image_path := ImageName(path)).suffix in VALID_FILE_TYPES
-            ]
+        files: list[ImageName] = _filter_images(
+            get_files_in_folder(self.image_directory)
         )
 
-        self._files.sort_and_preserve_index(image_to_start_at)
-        self._update_after_move_or_edit()
+        if self.recursive:
+            # Keep current image until scan finds it again since it may be nested
+            if os.path.isfile(self.get_path_to_image(image_to_start_at)) and all(
+                image.name != image_to_start_at for image in files
+            ):
+                files.append(ImageName(image_to_start_at))
+            self._start_scanning_subfolders()
+        else:
+            self.scanning = False
+
+        self._files = ImageNameList(files)
+        self._sort_files(image_to_start_at)
+
+    def _start_scanning_subfolders(self) -> None:
+        """Starts scanning subfolders of image_directory on a new thread"""
+        self.scanning = True
+        self._scanned_images = SimpleQueue()
+
+        Thread(
+            target=self._scan_subfolders,
+            args=(self.image_directory, self._scan_id),
+            daemon=True,
+        ).start()
+
+    def _scan_subfolders(self, root: str, scan_id: int) -> None:
+        """Scans all folders under root in parallel and queues images found.
+        Stops early if a new scan was started"""
+        executor = ThreadPoolExecutor()
+        try:
+            pending_scans: dict[Future[tuple[list[str], list[str]]], str] = {
+                executor.submit(get_files_and_folders_in_folder, root): ""
+            }
+
+            while pending_scans and scan_id == self._scan_id:
+                done, _ = wait(pending_scans, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    relative_dir: str = pending_scans.pop(future)
+                    files, folders = future.result()
+
+                    if relative_dir != "":  # root files were already found
+                        images: list[ImageName] = _filter_images(
+                            os.path.join(relative_dir, file) for file in files
+                        )
+                        if images:
+                            self._scanned_images.put((scan_id, images))
+
+                    for folder in folders:
+                        relative_folder: str = os.path.join(relative_dir, folder)
+                        future = executor.submit(
+                            get_files_and_folders_in_folder,
+                            os.path.join(root, relative_folder),
+                        )
+                        pending_scans[future] = relative_folder
+        finally:
+            # Don't wait on folders still being listed if a new scan started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if scan_id == self._scan_id:
+            self.scanning = False
+
+    def merge_scanned_images(self) -> bool:
+        """Adds images found by the background scan to the image list.
+        Returns True if scan is still running and this should be called again"""
+        still_scanning: bool = self.scanning
+        new_images: list[ImageName] = []
+
+        while True:
+            try:
+                scan_id, images = self._scanned_images.get_nowait()
+            except Empty:
+                break
+            if scan_id == self._scan_id:
+                new_images += images
+
+        if new_images:
+            image_names: set[str] = {image.name for image in self._files}
+            self._files.extend(
+                image for image in new_images if image.name not in image_names
+            )
+            self._sort_files(self._files.get_current_image_name())
+
+        return still_scanning
+
+    def toggle_recursive(self) -> None:
+        """Switches between finding images only in image_directory
+        and finding images in all of its subfolders"""
+        self.recursive = not self.recursive
+
+        if not self.recursive:
+            # Current image may be nested, so view its folder instead
+            self.image_directory = get_normalized_dir_name(self.path_to_image)
+            self._files = ImageNameList(
+                [ImageName(os.path.basename(self.path_to_image))]
+            )
+
+        self.find_all_images()
 
     def refresh_image_list(self) -> None:
         """Clears cache and finds all images in directory"""
         self.image_cache.clear()
+        self.metadata_index.clear()
         self.find_all_images()
 
+    def set_sort_mode(self, sort_mode: SortMode) -> None:
+        """Sorts images by a new mode and keeps index at the same image"""
+        if sort_mode == self.sort_mode:
+            return
+
+        self.sort_mode = sort_mode
+        self._sort_files(self._files.get_current_image_name())
+
+    def _get_sort_key(self) -> Callable[[str], int] | None:
+        """Returns function giving sort key of an image name for current sort mode
+        or None when sorting by name"""
+        if self.sort_mode == SortMode.NAME:
+            return None
+
+        sort_mode: SortMode = self.sort_mode
+        return lambda image_name: self.metadata_index.get_sort_key(
+            self.get_path_to_image(image_name), sort_mode
+        )
+
+    def _sort_files(self, image_to_start_at: str) -> None:
+        """Sorts images by current sort mode. If metadata needed by the sort mode
+        is missing, sorts by name until it is collected in the background and
+        images are sorted again by calling sort_by_collected_metadata"""
+        self._files.sort_key = None
+
+        if self.sort_mode != SortMode.NAME:
+            paths: list[str] = [
+                self.get_path_to_image(image.name) for image in self._files
+            ]
+            if self.metadata_index.is_collected(paths, self.sort_mode):
+                self._files.sort_key = self._get_sort_key()
+            else:
+                self._start_collecting_metadata(paths)
+
+        self._files.sort_and_preserve_index(image_to_start_at)
+        self._update_after_move_or_edit()
+
+    def _start_collecting_metadata(self, paths: list[str]) -> None:
+        """Starts collecting metadata needed by sort mode on a new thread"""
+        self._metadata_id += 1
+
+        Thread(
+            target=self._collect_metadata,
+            args=(paths, self.sort_mode, self._metadata_id),
+            daemon=True,
+        ).start()
+
+    def _collect_metadata(
+        self, paths: list[str], sort_mode: SortMode, metadata_id: int
+    ) -> None:
+        """Collects metadata and marks it ready if no newer collection was started"""
+        self.metadata_index.collect(paths, sort_mode)
+
+        if metadata_id == self._metadata_id:
+            self._metadata_ready_id = metadata_id
+
+    @property
+    def collecting_metadata(self) -> bool:
+        return self._metadata_ready_id != self._metadata_id
+
+    def sort_by_collected_metadata(self) -> bool:
+        """Sorts images by current sort mode once its metadata is collected.
+        Returns True if still collecting and this should be called again"""
+        if self.collecting_metadata:
+            return True
+
+        if self.sort_mode != SortMode.NAME and self._files.sort_key is None:
+            self._sort_files(self._files.get_current_image_name())
+
+        return self.collecting_metadata
+
     def get_cached_metadata(self, get_all_details: bool = True) -> str:
         """Returns formatted string of cached metadata on current image.
+        Reads only the image's header if its not in the cache.
         Can raise KeyError on failure to get data."""
-        image_info: ImageCacheEntry = self.image_cache[self.path_to_image]
+        cache_entry: ImageCacheEntry | None = self.image_cache.get(self.path_to_image)
+
+        image_info: ImageCacheEntry | CImageHeader | None
+        size_display: str
+        bit_depth: int
+        if cache_entry is not None:
+            image_info = cache_entry
+            size_display = cache_entry.size_display
+            bit_depth = 1 if cache_entry.mode == "1" else 8
+        else:
+            image_info = probe_image(self.path_to_image)
+            if image_info is None:
+                raise KeyError(self.path_to_image)
+
+            try:
+                size_display = get_byte_display(os.stat(self.path_to_image).st_size)
+            except OSError:
+                size_display = "Unknown"
+            bit_depth = image_info.bit_depth
+
         short_details: str = (
-            f"Pixels: {image_info.width}x{image_info.height}\n"
-            f"Size: {image_info.size_display}"
+            f"Pixels: {image_info.width}x{image_info.height}\nSize: {size_display}"
         )
 
         if not get_all_details:
             return short_details
 
         mode: str = image_info.mode
-        bpp: int = len(mode) * 8 if mode != "1" else 1
+        # Bit depth is per channel, but palette modes have a single index per pixel
+        bpp: int = bit_depth if mode in ("1", "P") else len(mode) * bit_depth
         readable_mode: str
         match mode:
             case "P":
@@ -152,18 +396,29 @@ class ImageFileManager:
         self, PIL_image: Image  # pylint: disable=invalid-name
     ) -> str | None:
         """Returns a formatted string of data from cache/OS call/PIL object
-        or None if failed to read from cache."""
+        or None if failed to read from cache or image header."""
         try:
             details: str = self.get_cached_metadata()
         except KeyError:
             return None  # don't fail trying to read, if not in cache just exit
 
         try:
-            image_metadata: stat_result = os.stat(self.path_to_image)
-            created_time_epoch: float = getattr(
-                image_metadata, "st_birthtime", image_metadata.st_ctime
+            created_time_epoch: float
+            modified_time_epoch: float
+            cache_entry: ImageCacheEntry | None = self.image_cache.get(
+                self.path_to_image
             )
-            modified_time_epoch: float = image_metadata.st_mtime
+            if cache_entry is not None:
+                # Stats were captured when the image was read, no need to ask the OS
+                file_stats: FileStats = cache_entry.file_stats
+                created_time_epoch = file_stats.created_time_ns / 1e9
+                modified_time_epoch = file_stats.modified_time_ns / 1e9
+            else:
+                image_metadata: stat_result = os.stat(self.path_to_image)
+                created_time_epoch = getattr(
+                    image_metadata, "st_birthtime", image_metadata.st_ctime
+                )
+                modified_time_epoch = image_metadata.st_mtime
 
             # [4:] chops of 3 character day like Mon/Tue/etc.
             created_time: str = ctime(created_time_epoch)[4:]
@@ -199,6 +454,7 @@ class ImageFileManager:
         """Removes image from files array and cache"""
         self._files.remove_current_image()
         self.image_cache.pop_safe(self.path_to_image)
+        self.metadata_index.pop_safe(self.path_to_image)
         self._update_after_move_or_edit()
 
     def remove_image(self, index: int) -> None:
@@ -206,6 +462,7 @@ class ImageFileManager:
         deleted_name: str = self._files.pop(index).name
         key: str = self.get_path_to_image(deleted_name)
         self.image_cache.pop_safe(key)
+        self.metadata_index.pop_safe(key)
 
     def rename_or_convert_current_image(self, new_name_or_path: str) -> None:
         """Try to either rename or convert based on input"""
@@ -240,11 +497,13 @@ class ImageFileManager:
             result = self._rename(original_path, new_path)
             self._files.remove_current_image()
             self.image_cache.update_key(self.path_to_image, new_path)
+            self.metadata_index.pop_safe(self.path_to_image)
 
         self.action_undoer.append(result)
 
         # Only add image if its still in the directory we are currently in
-        if get_normalized_dir_name(new_path) == get_normalized_dir_name(original_path):
+        image_name_after_edit: str | None = self._get_image_name_in_directory(new_path)
+        if image_name_after_edit is not None:
             preserve_index: _ShouldPreserveIndex = (
                 _ShouldPreserveIndex.YES
                 if was_at_last_index
@@ -255,35 +514,38 @@ class ImageFileManager:
                 )
             )
 
-            self.add_new_image(new_name, preserve_index)
+            self.add_new_image(image_name_after_edit, preserve_index)
         else:
             self._update_after_move_or_edit()
 
     def _split_dir_and_name(self, new_name_or_path: str) -> tuple[str, str]:
         """Returns tuple with path and file name split up"""
-        new_name: str = os.path.basename(new_name_or_path) or self.current_image.name
+        current_name: str = os.path.basename(self.path_to_image)
+        new_name: str = os.path.basename(new_name_or_path) or current_name
         new_dir: str = get_normalized_dir_name(new_name_or_path)
 
         if new_name in (".", ".."):
             # name is actually path specifier
             new_dir = os.path.normpath(os.path.join(new_dir, new_name))
-            new_name = self.current_image.name
+            new_name = current_name
 
         return new_dir, new_name
 
     def _construct_path_for_rename(self, new_dir: str, new_name: str) -> str:
         """Makes new path with validations when moving between directories"""
         will_move_dirs: bool = new_dir != ""
+        # Differs from image_directory when current image is in a subfolder
+        current_dir: str = os.path.dirname(self.path_to_image)
 
         new_full_path: str
         if will_move_dirs:
             if not os.path.isabs(new_dir):
-                new_dir = os.path.normpath(os.path.join(self.image_directory, new_dir))
+                new_dir = os.path.normpath(os.path.join(current_dir, new_dir))
             if not os.path.exists(new_dir):
                 raise OSError
             new_full_path = os.path.join(new_dir, new_name)
         else:
-            new_full_path = self.get_path_to_image(new_name)
+            new_full_path = os.path.join(current_dir, new_name)
 
         if os.path.exists(new_full_path):
             raise FileExistsError
@@ -361,8 +623,8 @@ class ImageFileManager:
         except OSError:
             return False  # TODO: error popup?
 
-        image_to_add: str = os.path.basename(undo_response.path_to_restore)
-        image_to_remove: str = os.path.basename(undo_response.path_to_remove)
+        image_to_add: str = self._get_image_name(undo_response.path_to_restore)
+        image_to_remove: str = self._get_image_name(undo_response.path_to_remove)
 
         if image_to_remove != "":
             index: int
@@ -5,30 +5,75 @@ from typing import Callable
 from PIL.Image import Image
 
 class CMemoryViewBuffer:
-    """Contains a memoryview object to malloc'ed C data.
+    """Contains a memoryview object to malloc'ed C data along with stats of the
+    file it was read from, taken from the open file descriptor. Also supports the
+    buffer protocol, where consumers keep it alive while using its data.
     Only intended to be created within C code and consumed by Python code"""
 
-    __slots__ = ("view",)
+    __slots__ = ("st_ctime_ns", "st_dev", "st_ino", "st_mtime_ns", "st_size", "view")
 
     view: memoryview
+    st_size: int
+    st_mtime_ns: int
+    st_ctime_ns: int
+    st_ino: int
+    st_dev: int
 
-class CMemoryViewBufferJpeg(CMemoryViewBuffer):
-    """Contains a memoryview object to malloc'ed C data containing a JPEG.
+    def __buffer__(self, flags: int, /) -> memoryview: ...
+
+class CMemoryViewBufferDecoded(CMemoryViewBuffer):
+    """Contains a memoryview object to malloc'ed C data containing a decoded
+    JPEG or WebP.
     Only intended to be created within C code and consumed by Python code"""
 
-    __slots__ = ("dimensions",)
+    __slots__ = ("dimensions", "mode")
 
     dimensions: tuple[int, int]
+    mode: str
+
+class CImageHeader:
+    """Information read from only the header of an image.
+    Only intended to be created within C code and consumed by Python code"""
+
+    __slots__ = ("bit_depth", "format", "height", "mode", "width")
+
+    width: int
+    height: int
+    bit_depth: int
+    mode: str
+    format: str
 
 def read_image_into_buffer(image_path: str) -> CMemoryViewBuffer | None:
     """Returns am image's bytes as a CMemoryViewBuffer or None if an error occurred
     while reading the file"""
 
 def decode_scaled_jpeg(
-    image_bytes: CMemoryViewBuffer, scale_factor: tuple[int, int]
-) -> CMemoryViewBufferJpeg:
+    image_bytes: CMemoryViewBuffer, scale_factor: tuple[int, int], band_count: int = 0
+) -> CMemoryViewBufferDecoded:
     """Given an image's bytes, decode them as a scaled jpeg and return its bytes as a CMemoryViewBuffer
-    or None if reading the image failed"""
+    or None if reading the image failed. Large baseline JPEGs are decoded in bands
+    across threads, band_count overrides how many when not 0"""
+
+def decode_scaled_webp(
+    image_bytes: CMemoryViewBuffer, dimensions: tuple[int, int]
+) -> CMemoryViewBufferDecoded:
+    """Given a still WebP's bytes, decode them scaled to dimensions.
+    Raises OSError if decoding failed"""
+
+def probe_image(image_path: str) -> CImageHeader | None:
+    """Reads only the first few KB of an image to get its dimensions, bit depth,
+    mode, and format. Returns None if the file could not be read or parsed"""
+
+def find_jpeg_thumbnail(image_bytes: CMemoryViewBuffer) -> tuple[int, int] | None:
+    """Scans a JPEG's APP segments for embedded EXIF thumbnails and MPF previews.
+    Returns offset and length in image_bytes of the largest or None if there are none"""
+
+def find_dds_mip_level(
+    image_bytes: CMemoryViewBuffer, width: int, height: int
+) -> tuple[int, int, int] | None:
+    """Reads a DDS's mip table for its smallest level at least width x height.
+    Returns offset in image_bytes, width, and height of that level or None if
+    the full size level is the smallest or its format can't be sized"""
 
 del Callable
 del Image
@@ -1,21 +1,68 @@
 """Classes for caching image data"""
 
+from binascii import crc32
 from collections import OrderedDict
-from os import stat
+from os import stat, stat_result
 
 from PIL.Image import Image
+from PIL.ImageTk import PhotoImage
+
+from animation.frame import Frame
+from util.memory import MemoryBudget, get_photo_image_byte_size
+
+
+class FileStats:
+    """Snapshot of a file's stats taken when it was read"""
+
+    __slots__ = (
+        "byte_size",
+        "content_hash",
+        "created_time_ns",
+        "device",
+        "inode",
+        "modified_time_ns",
+    )
+
+    def __init__(
+        self,
+        byte_size: int,
+        modified_time_ns: int,
+        created_time_ns: int,
+        inode: int,
+        device: int,
+        content_hash: int = 0,
+    ) -> None:
+        self.byte_size: int = byte_size
+        self.modified_time_ns: int = modified_time_ns
+        # ctime is creation time on Windows, closest available elsewhere
+        self.created_time_ns: int = created_time_ns
+        self.inode: int = inode
+        self.device: int = device
+        # Hash of the start of the file, 0 when not configured
+        self.content_hash: int = content_hash
+
+    def is_same_file(self, other: "FileStats") -> bool:
+        """Returns True when both stats look like the same unedited file"""
+        return (
+            self.byte_size == other.byte_size
+            and self.modified_time_ns == other.modified_time_ns
+            and self.inode == other.inode
+            and self.device == other.device
+            and self.content_hash == other.content_hash
+        )
 
 
 class ImageCacheEntry:
     """Information stored to skip resizing/system calls on repeated opening"""
 
     __slots__ = (
+        "animation_frames",
+        "file_stats",
         "format",
         "height",
         "image",
         "mode",
         "size_display",
-        "byte_size",
         "width",
     )
 
@@ -24,7 +71,7 @@ class ImageCacheEntry:
         image: Image,
         dimensions: tuple[int, int],
         size_display: str,
-        byte_size: int,
+        file_stats: FileStats,
         mode: str,
         format: str,
     ) -> None:
@@ -33,49 +80,201 @@ class ImageCacheEntry:
         self.width, self.height = dimensions
         self.image: Image = image
         self.size_display: str = size_display
-        self.byte_size: int = byte_size
+        self.file_stats: FileStats = file_stats
         # Store original mode since resizing some images converts to RGB
         self.mode: str = mode
         self.format: str = format
+        # Every frame of a fully loaded animation, kept while memory allows
+        self.animation_frames: list[Frame] | None = None
+
+    @property
+    def animation_byte_size(self) -> int:
+        """Estimated bytes used by kept animation frames"""
+        if self.animation_frames is None:
+            return 0
+
+        return sum(frame.byte_size for frame in self.animation_frames)
 
 
 class ImageCache(OrderedDict[str, ImageCacheEntry]):
     """Dictionary for caching image data using paths as keys"""
 
-    __slots__ = ("max_items_in_cache",)
+    __slots__ = ("animation_budget", "hash_size", "max_items_in_cache")
 
-    def __init__(self, max_items_in_cache: int) -> None:
+    def __init__(
+        self, max_items_in_cache: int, hash_size: int = 0, animation_memory: int = 0
+    ) -> None:
         super().__init__()
         self.max_items_in_cache: int = max_items_in_cache
+        # Bytes from the start of a file to hash when checking if its been edited
+        self.hash_size: int = hash_size
+        # Limits bytes of animation frames kept across entries
+        self.animation_budget = MemoryBudget(animation_memory)
 
     def pop_safe(self, image_path: str) -> ImageCacheEntry | None:
         """Pops and returns image_path or None if it doesn't exist"""
-        return self.pop(image_path, None)
+        cache_entry: ImageCacheEntry | None = self.pop(image_path, None)
+        if cache_entry is not None:
+            self._drop_animation_frames(cache_entry)
+
+        return cache_entry
+
+    def set_animation_frames(self, image_path: str, frames: list[Frame]) -> bool:
+        """Keeps every frame of image_path's animation so it can play again
+        without loading. Drops frames of least recently used entries to make room.
+        Returns True if the frames were kept"""
+        cache_entry: ImageCacheEntry | None = self.get(image_path)
+        if cache_entry is None:
+            return False
+
+        self._drop_animation_frames(cache_entry)
+        byte_size: int = sum(frame.byte_size for frame in frames)
+        if byte_size > self.animation_budget.max_bytes:
+            return False
+
+        while not self.animation_budget.try_reserve(byte_size):
+            oldest_entry: ImageCacheEntry = next(
+                entry for entry in self.values() if entry.animation_frames is not None
+            )
+            self._drop_animation_frames(oldest_entry)
+
+        cache_entry.animation_frames = frames
+        return True
+
+    def _drop_animation_frames(self, cache_entry: ImageCacheEntry) -> None:
+        """Frees animation frames kept by cache_entry"""
+        self.animation_budget.release(cache_entry.animation_byte_size)
+        cache_entry.animation_frames = None
+
+    def get_content_hash(self, image_bytes: bytes | memoryview) -> int:
+        """Returns hash of the start of image_bytes or 0 if hashing is disabled"""
+        if self.hash_size <= 0:
+            return 0
+
+        return crc32(image_bytes[: self.hash_size])
+
+    def is_fresh(self, image_path: str, file_stats: FileStats) -> bool:
+        """Returns True when image_path is cached and has the same fingerprint"""
+        cache_entry: ImageCacheEntry | None = self.get(image_path)
+
+        return cache_entry is not None and cache_entry.file_stats.is_same_file(
+            file_stats
+        )
 
     def image_cache_still_fresh(self, image_path: str) -> bool:
-        """Returns True when cached image is the same size of the image on disk.
-        Not guaranteed to be correct, but that's not important for this case"""
+        """Returns True when cached image has the same size, modified time, and id
+        as the image on disk. When configured, the start of the file is also hashed"""
         if image_path not in self:
             return False
 
         try:
-            return stat(image_path).st_size == self[image_path].byte_size
+            image_stats: stat_result = stat(image_path)
+
+            content_hash: int = 0
+            if self.hash_size > 0:
+                with open(image_path, "rb") as fp:
+                    content_hash = self.get_content_hash(fp.read(self.hash_size))
         except (FileNotFoundError, OSError):
             return False
 
+        file_stats = FileStats(
+            image_stats.st_size,
+            image_stats.st_mtime_ns,
+            image_stats.st_ctime_ns,
+            image_stats.st_ino,
+            image_stats.st_dev,
+            content_hash,
+        )
+
+        return self.is_fresh(image_path, file_stats)
+
     def update_key(self, old_key: str, new_key: str) -> None:
         """Moves value from old_key to new_key deleting old_key
         If new_key does not exist, nothing happens"""
-        target: ImageCacheEntry | None = self.pop_safe(old_key)
+        # Plain pop since the entry, and any frames it keeps, stays cached
+        target: ImageCacheEntry | None = self.pop(old_key, None)
 
         if target is not None:
             self[new_key] = target
 
+    def clear(self) -> None:
+        """Clears all entries and frees their animation frames"""
+        super().clear()
+        self.animation_budget.reset()
+
     def __setitem__(self, key: str, value: ImageCacheEntry) -> None:
         """Adds check for items in the cache and purges LRU if over limit"""
         if self.max_items_in_cache <= 0:
             return
 
+        replaced_entry: ImageCacheEntry | None = self.get(key)
+        if replaced_entry is not None and replaced_entry is not value:
+            self._drop_animation_frames(replaced_entry)
+
         if self.__len__() >= self.max_items_in_cache:
-            self.popitem(last=False)
+            _, evicted_entry = self.popitem(last=False)
+            if evicted_entry is not value:
+                self._drop_animation_frames(evicted_entry)
         super().__setitem__(key, value)
+
+
+class PhotoImageCacheEntry:
+    """PhotoImage ready to be displayed and the Image it was made from"""
+
+    __slots__ = ("byte_size", "image", "photo_image")
+
+    def __init__(self, image: Image, photo_image: PhotoImage) -> None:
+        self.image: Image = image
+        self.photo_image: PhotoImage = photo_image
+        self.byte_size: int = get_photo_image_byte_size(image)
+
+
+class PhotoImageCache(OrderedDict[str, PhotoImageCacheEntry]):
+    """Dictionary for caching PhotoImages using paths as keys.
+    Purges LRU once the total estimated bytes exceeds the limit"""
+
+    __slots__ = ("memory_budget",)
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__()
+        self.memory_budget: MemoryBudget = MemoryBudget(max_bytes)
+
+    def get_photo_image(self, image_path: str, image: Image) -> PhotoImage:
+        """Returns PhotoImage version of image, reusing a previous one
+        if it was made from this exact Image"""
+        cache_entry: PhotoImageCacheEntry | None = self.get(image_path)
+        if cache_entry is not None and cache_entry.image is image:
+            self.move_to_end(image_path)
+            return cache_entry.photo_image
+
+        self.pop_safe(image_path)
+        cache_entry = PhotoImageCacheEntry(image, PhotoImage(image))
+        self[image_path] = cache_entry
+        self.memory_budget.reserve(cache_entry.byte_size)
+
+        # Always keep the newest since its about to be displayed
+        while self.memory_budget.is_exceeded and self.__len__() > 1:
+            _, evicted_entry = self.popitem(last=False)
+            self.memory_budget.release(evicted_entry.byte_size)
+
+        return cache_entry.photo_image
+
+    def pop_safe(self, image_path: str) -> PhotoImageCacheEntry | None:
+        """Pops and returns image_path or None if it doesn't exist"""
+        cache_entry: PhotoImageCacheEntry | None = self.pop(image_path, None)
+        if cache_entry is not None:
+            self.memory_budget.release(cache_entry.byte_size)
+
+        return cache_entry
+
+    def remove_evicted(self, image_cache: ImageCache) -> None:
+        """Removes PhotoImages whose Image was evicted or replaced in image_cache"""
+        evicted_paths: list[str] = [
+            image_path
+            for image_path, cache_entry in self.items()
+            if (image_cache_entry := image_cache.get(image_path)) is None
+            or image_cache_entry.image is not cache_entry.image
+        ]
+
+        for image_path in evicted_paths:
+            self.pop_safe(image_path)
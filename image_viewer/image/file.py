@@ -1,6 +1,7 @@
 """Classes representing metadata of image files and functions for reading them"""
 
 from collections import namedtuple
+from collections.abc import Callable
 from typing import Iterable
 
 from constants import ImageFormats
@@ -30,13 +31,19 @@ class ImageSearchResult(namedtuple("ImageSearchResult", ["index", "found"])):
 
 
 class ImageNameList(list[ImageName]):
-    """Represents list of ImageName objects with extension methods"""
+    """Represents list of ImageName objects with extension methods.
+    sort_key, when provided, orders images before their names are compared"""
 
-    __slots__ = ("_display_index",)
+    __slots__ = ("_display_index", "sort_key")
 
-    def __init__(self, iterable: Iterable[ImageName]) -> None:
+    def __init__(
+        self,
+        iterable: Iterable[ImageName],
+        sort_key: Callable[[str], int] | None = None,
+    ) -> None:
         super().__init__(iterable)
         self._display_index: int = 0
+        self.sort_key: Callable[[str], int] | None = sort_key
 
     @property
     def display_index(self) -> int:
@@ -57,6 +64,10 @@ class ImageNameList(list[ImageName]):
     def sort_and_preserve_index(self, image_to_start_at: str) -> None:
         """Sorts and keeps index at the same image"""
         super().sort()
+        if self.sort_key is not None:
+            # Sort is stable so images with equal keys stay in name order
+            sort_key: Callable[[str], int] = self.sort_key
+            super().sort(key=lambda image_name: sort_key(image_name.name))
         self._display_index, _ = self.get_index_of_image(image_to_start_at)
 
     def remove_current_image(self) -> None:
@@ -81,12 +92,22 @@ class ImageNameList(list[ImageName]):
             current_image = self[mid].name
             if target_image == current_image:
                 return ImageSearchResult(index=mid, found=True)
-            if os_name_cmp(target_image, current_image):
+            if self._sorts_before(target_image, current_image):
                 high = mid - 1
             else:
                 low = mid + 1
         return ImageSearchResult(index=low, found=False)
 
+    def _sorts_before(self, a: str, b: str) -> bool:
+        """Returns True when image name a belongs before b in this list"""
+        if self.sort_key is not None:
+            a_key: int = self.sort_key(a)
+            b_key: int = self.sort_key(b)
+            if a_key != b_key:
+                return a_key < b_key
+
+        return os_name_cmp(a, b)
+
     def move_index_to_image(self, target_image: str) -> ImageSearchResult:
         search_response: ImageSearchResult = self.get_index_of_image(target_image)
         self._display_index = search_response.index
@@ -1,22 +1,25 @@
 """Classes for loading PIL images from disk"""
 
+from collections import deque
 from collections.abc import Callable
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
 from io import BytesIO
-from os import stat
-from threading import Thread
+from threading import Semaphore, Thread
 
 from PIL import UnidentifiedImageError
 from PIL.Image import Image
 from PIL.Image import open as open_image
 
 from animation.frame import Frame
+from animation.gif import GifDecoder
 from constants import Rotation, ZoomDirection
 from image._read import CMemoryViewBuffer, read_image_into_buffer
-from image.cache import ImageCache, ImageCacheEntry
+from image.cache import FileStats, ImageCache, ImageCacheEntry
 from image.file import magic_number_guess
 from image.resizer import ImageResizer, ZoomedImageResult
 from state.rotation_state import RotationState
 from state.zoom_state import ZoomState
+from util.memory import MemoryBudget
 from util.os import get_byte_display
 from util.PIL import get_placeholder_for_errored_image, rotate_image
 
@@ -34,22 +37,51 @@ class ReadImageResponse:
         self.format: str = format
 
 
+class PendingRefine:
+    """Full quality resize running in the background to replace a preview"""
+
+    __slots__ = ("cache_entry", "image_path", "refined_image")
+
+    def __init__(
+        self,
+        image_path: str,
+        cache_entry: ImageCacheEntry,
+        refined_image: "Future[Image | None]",
+    ) -> None:
+        self.image_path: str = image_path
+        # Cached once refined so a preview is never reused as the final image
+        self.cache_entry: ImageCacheEntry = cache_entry
+        self.refined_image: Future[Image | None] = refined_image
+
+
 class ImageLoader:
     """Handles loading images from disk"""
 
     DEFAULT_ANIMATION_SPEED: int = 100  # in milliseconds
+    FRAME_RESIZE_WORKERS: int = 4
 
     __slots__ = (
         "_rotation_state",
         "_zoom_state",
-        "animation_frames",
+        "all_frames_found",
         "animation_callback",
+        "animation_frames",
+        "animation_path",
         "current_load_id",
+        "frame_display_budget",
         "frame_index",
+        "frame_memory_limit",
+        "frame_source_indexes",
+        "frame_to_zoom",
+        "frames_shown",
         "image_buffer",
         "image_cache",
         "image_resizer",
+        "image_to_zoom",
+        "pending_refine",
         "PIL_image",
+        "refine_executor",
+        "requested_position",
         "zoomed_image_cache",
     )
 
@@ -58,54 +90,150 @@ class ImageLoader:
         screen_width: int,
         screen_height: int,
         image_cache: ImageCache,
-        animation_callback: Callable[[int, int], None],
+        animation_callback: Callable[[int], None],
+        frame_display_memory: int,
+        frame_memory: int,
+        background_color: str | None = None,
     ) -> None:
         self.image_cache: ImageCache = image_cache
-        self.image_resizer: ImageResizer = ImageResizer(screen_width, screen_height)
+        self.image_resizer: ImageResizer = ImageResizer(
+            screen_width, screen_height, background_color
+        )
 
-        self.animation_callback: Callable[[int, int], None] = animation_callback
+        self.animation_callback: Callable[[int], None] = animation_callback
 
         self.PIL_image = Image()  # pylint: disable=invalid-name
         self.image_buffer: CMemoryViewBuffer
         self.current_load_id: int = 0
 
         self.animation_frames: list[Frame | None] = []
+        # Path of the animation being played, its frames are cached once all load
+        self.animation_path: str = ""
+        self.all_frames_found: bool = False
         self.frame_index: int = 0
+        # Index in the animated image of each frame, built as frames are first found
+        self.frame_source_indexes: list[int] = []
+        # Position of a streamed frame that was seeked to and needs loading, or -1
+        self.requested_position: int = -1
+        # Limits bytes of PhotoImages frames keep between loops
+        self.frame_display_budget = MemoryBudget(frame_display_memory)
+        # Animations with more frames than fit in this many bytes are streamed
+        self.frame_memory_limit: int = frame_memory
+        # Released each time a frame is shown, lets streaming load one more frame
+        self.frames_shown = Semaphore(0)
         self._rotation_state = RotationState()
         self._zoom_state = ZoomState()
         self.zoomed_image_cache: list[Image] = []
+        # Image zoom levels are resized from, set on first zoom
+        self.image_to_zoom: Image | None = None
+        # Held animation frame being decoded in the background to zoom from
+        self.frame_to_zoom: Future[Image] | None = None
+        # One worker so refines for images already moved past are cancelled
+        # before they start instead of competing with the current one
+        self.refine_executor = ThreadPoolExecutor(1)
+        self.pending_refine: PendingRefine | None = None
 
     def get_next_frame(self) -> Frame | None:
-        """Gets next frame of animated image or empty frame while its being loaded"""
-        try:
-            self.frame_index = (self.frame_index + 1) % len(self.animation_frames)
-            current_frame = self.animation_frames[self.frame_index]
-        except (ZeroDivisionError, IndexError):
+        """Gets next frame of animated image or None while its being loaded"""
+        frame_count: int = len(self.animation_frames)
+        if frame_count == 0:
             return None
 
+        next_index: int = self.frame_index + 1
+        if next_index >= frame_count:
+            if not self.all_frames_found:
+                return None  # more frames may still be found
+            next_index = 0
+
+        current_frame: Frame | None = self.animation_frames[next_index]
         if current_frame is None:
-            self.frame_index -= 1
+            return None
+
+        self.frame_index = next_index
+        self.frames_shown.release()
 
         return current_frame
 
-    def begin_animation(
-        self, original_image: Image, resized_image: Image, frame_count: int
-    ) -> None:
+    @property
+    def seek_step(self) -> int:
+        """Number of frames to skip when seeking, a tenth of those found so far"""
+        return max(len(self.animation_frames) // 10, 1)
+
+    def seek_frame(self, position: int) -> Frame | None:
+        """Moves to the frame at position, wrapping around frames found so far.
+        Returns None if its not loaded, then it will be the next frame once it is"""
+        frame_count: int = len(self.animation_frames)
+        if frame_count == 0:
+            return None
+
+        position %= frame_count
+        frame: Frame | None = self.animation_frames[position]
+        if frame is None:
+            # Only streamed frames are dropped, ask the frame thread to load it
+            self.frame_index = position - 1
+            self.requested_position = position
+            return None
+
+        self.frame_index = position
+        return frame
+
+    def _drop_frame(self, index: int) -> None:
+        """Drops an already displayed frame so a streamed frame can take its place"""
+        dropped_frame: Frame | None = self.animation_frames[index]
+        self.animation_frames[index] = None
+
+        if dropped_frame is not None and dropped_frame.photo_image is not None:
+            self.frame_display_budget.release(dropped_frame.byte_size)
+
+    def begin_animation(self, resized_image: Image) -> None:
         """Begins new thread to load frames of an animated image"""
-        self.animation_frames = [None] * frame_count
+        try:
+            # Separate decoder so loading frames never moves PIL_image,
+            # which stays free to be zoomed or rotated
+            decoder: Image = open_image(BytesIO(self.image_buffer.view))
+        except (UnidentifiedImageError, OSError):
+            return
 
         first_frame: Frame = Frame(resized_image)
-        self.animation_frames[0] = first_frame
+        self.animation_frames = [first_frame]
+        self.frame_source_indexes = [0]
+        self.requested_position = -1
+        self.all_frames_found = False
+        self.frames_shown = Semaphore(0)
+
+        # Need at least the displayed frame and one being loaded
+        max_frames_loaded: int = max(
+            self.frame_memory_limit // max(first_frame.byte_size, 1), 2
+        )
+
+        # Snapshots let streamed GIFs seek without replaying from the first frame
+        frame_decoder: Image | GifDecoder = (
+            GifDecoder(decoder, self.image_buffer.view, self.frame_memory_limit // 4)
+            if decoder.format == "GIF"
+            else decoder
+        )
 
         Thread(
             target=self.load_remaining_frames,
-            args=(original_image, frame_count, self.current_load_id),
+            args=(
+                frame_decoder,
+                max_frames_loaded,
+                self.frames_shown,
+                self.current_load_id,
+            ),
             daemon=True,
         ).start()
 
-        ms_until_next_frame: int = first_frame.ms_until_next_frame
-        backoff: int = ms_until_next_frame + 50
-        self.animation_callback(ms_until_next_frame, backoff)
+        self.animation_callback(first_frame.ms_until_next_frame)
+
+    def begin_cached_animation(self, frames: list[Frame]) -> None:
+        """Plays frames kept in the cache from a previous load of this animation"""
+        self.animation_frames = list(frames)
+        self.frame_source_indexes = [frame.index for frame in frames]
+        self.requested_position = -1
+        self.all_frames_found = True
+
+        self.animation_callback(frames[0].ms_until_next_frame)
 
     def read_image(self, path_to_image: str) -> ReadImageResponse | None:
         """Tries to open file on disk as PIL Image
@@ -133,53 +261,144 @@ class ImageLoader:
             return None
 
         original_image: Image = read_image_response.image
-        byte_size: int = stat(path_to_image).st_size
+        image_buffer: CMemoryViewBuffer = read_image_response.image_buffer
+        # Stats come from the descriptor the image was read with, no extra lookup
+        file_stats = FileStats(
+            image_buffer.st_size,
+            image_buffer.st_mtime_ns,
+            image_buffer.st_ctime_ns,
+            image_buffer.st_ino,
+            image_buffer.st_dev,
+            self.image_cache.get_content_hash(image_buffer.view),
+        )
 
         self.PIL_image = original_image
-        self.image_buffer = read_image_response.image_buffer
+        self.image_buffer = image_buffer
         self.current_load_id += 1
 
         # check if cached and not changed outside of program
         resized_image: Image
-        cached_image_data = self.image_cache.get(path_to_image)
-        if cached_image_data is not None and byte_size == cached_image_data.byte_size:
-            resized_image = cached_image_data.image
+        cached_frames: list[Frame] | None = None
+        if self.image_cache.is_fresh(path_to_image, file_stats):
+            cache_entry: ImageCacheEntry = self.image_cache[path_to_image]
+            resized_image = cache_entry.image
+            cached_frames = cache_entry.animation_frames
         else:
             original_mode: str = original_image.mode
-            resized_image = self._resize_or_get_placeholder()
-
-            size_display: str = get_byte_display(byte_size)
+            preview: Image | None = self._try_get_preview()
+            resized_image = (
+                self._resize_or_get_placeholder(original_image, image_buffer)
+                if preview is None
+                else preview
+            )
 
-            self.image_cache[path_to_image] = ImageCacheEntry(
+            cache_entry = ImageCacheEntry(
                 resized_image,
                 original_image.size,
-                size_display,
-                byte_size,
+                get_byte_display(file_stats.byte_size),
+                file_stats,
                 original_mode,
                 read_image_response.format,
             )
 
-        frame_count: int = getattr(original_image, "n_frames", 1)
-        if frame_count > 1:
-            self.begin_animation(original_image, resized_image, frame_count)
+            if preview is None:
+                self.image_cache[path_to_image] = cache_entry
+            else:
+                self.pending_refine = PendingRefine(
+                    path_to_image,
+                    cache_entry,
+                    self.refine_executor.submit(
+                        self._get_refined_image, image_buffer, self.current_load_id
+                    ),
+                )
+
+        # is_animated only checks for a second frame, n_frames reads all of them
+        if getattr(original_image, "is_animated", False):
+            self.animation_path = path_to_image
+            if cached_frames:
+                self.begin_cached_animation(cached_frames)
+            else:
+                self.begin_animation(resized_image)
 
         # first zoom level is just the image as is
         self.zoomed_image_cache = [resized_image]
 
         return resized_image
 
-    def _resize_or_get_placeholder(self) -> Image:
-        """Resizes PIL image or returns placeholder if corrupted in some way"""
+    def _try_get_preview(self) -> Image | None:
+        """Returns a low quality version of PIL image that is fast to make,
+        or None if its small enough to resize at full quality right away"""
+        # Still WebPs are decoded at screen size, as fast as a preview would be
+        if (
+            getattr(self.PIL_image, "is_animated", False)
+            or self.PIL_image.format == "WEBP"
+            or not self.image_resizer.should_preview(*self.PIL_image.size)
+        ):
+            return None
+
+        try:
+            return self.image_resizer.get_preview_fit_to_screen(
+                self.PIL_image, self.image_buffer
+            )
+        except OSError:
+            return None  # full resize will show a placeholder
+
+    def _get_refined_image(
+        self, image_buffer: CMemoryViewBuffer, load_id: int
+    ) -> Image | None:
+        """Resizes image at full quality to replace its preview. Uses a separate
+        decoder since PIL_image may be zoomed or closed on the main thread meanwhile.
+        Returns None if a different image was loaded first or refining failed"""
+        if load_id != self.current_load_id:
+            return None
+
+        try:
+            image: Image = open_image(BytesIO(image_buffer.view))
+            return self._resize_or_get_placeholder(image, image_buffer)
+        except Exception:
+            return None  # keep showing the preview
+
+    def finish_refine(self) -> Image | None:
+        """Caches and returns the full quality image once its resized.
+        Returns None while still resizing or when there is nothing to refine"""
+        pending_refine: PendingRefine | None = self.pending_refine
+        if pending_refine is None or not pending_refine.refined_image.done():
+            return None
+
+        self.pending_refine = None
+        try:
+            refined_image: Image | None = pending_refine.refined_image.result()
+        except Exception:
+            return None  # cancelled or failed, keep showing the preview
+        if refined_image is None:
+            return None
+
+        pending_refine.cache_entry.image = refined_image
+        self.image_cache[pending_refine.image_path] = pending_refine.cache_entry
+        self.zoomed_image_cache[0] = refined_image
+
+        return refined_image
+
+    def _resize_or_get_placeholder(
+        self, image: Image, image_buffer: CMemoryViewBuffer
+    ) -> Image:
+        """Resizes image or returns placeholder if corrupted in some way"""
         current_image: Image
         try:
-            if self.PIL_image.format == "JPEG":
+            if image.format == "JPEG":
                 current_image = self.image_resizer.get_jpeg_fit_to_screen(
-                    self.PIL_image, self.image_buffer
+                    image, image_buffer
                 )
-            else:
-                current_image = self.image_resizer.get_image_fit_to_screen(
-                    self.PIL_image
+            elif image.format == "WEBP":
+                current_image = self.image_resizer.get_webp_fit_to_screen(
+                    image, image_buffer
+                )
+            elif image.format == "DDS":
+                current_image = self.image_resizer.get_dds_fit_to_screen(
+                    image, image_buffer
                 )
+            else:
+                current_image = self.image_resizer.get_image_fit_to_screen(image)
         except OSError as e:
             current_image = get_placeholder_for_errored_image(
                 e,
@@ -189,6 +408,44 @@ class ImageLoader:
 
         return current_image
 
+    @property
+    def is_zoomed_or_rotated(self) -> bool:
+        return (
+            self._zoom_state.level != 0
+            or self._rotation_state.orientation != Rotation.UP
+        )
+
+    def hold_current_frame(self) -> None:
+        """Starts decoding the displayed animation frame so zooming
+        and rotating apply to it rather than the first frame"""
+        if not self.animation_frames or self.is_zoomed_or_rotated:
+            return
+
+        current_frame: Frame | None = self.animation_frames[self.frame_index]
+        if current_frame is None:
+            return
+
+        self.zoomed_image_cache = [current_frame.image]
+        self.image_to_zoom = None
+        if self.frame_to_zoom is not None:
+            self.frame_to_zoom.cancel()
+        # Animations are never previewed, so the refine worker is free
+        self.frame_to_zoom = (
+            self.refine_executor.submit(
+                self._decode_frame, self.image_buffer, current_frame.index
+            )
+            if current_frame.index != 0
+            else None
+        )
+
+    @staticmethod
+    def _decode_frame(image_buffer: CMemoryViewBuffer, index: int) -> Image:
+        """Returns frame at index of an animated image. Uses a separate decoder
+        so PIL_image and the decoder loading frames are never moved"""
+        with open_image(BytesIO(image_buffer.view)) as decoder:
+            decoder.seek(index)
+            return decoder.copy()
+
     def get_zoomed_or_rotated_image(
         self, direction: ZoomDirection | None, rotation: Rotation | None = None
     ) -> Image | None:
@@ -207,7 +464,9 @@ class ImageLoader:
         # Not in cache, resize to new zoom
         try:
             zoomed_image_result: ZoomedImageResult = (
-                self.image_resizer.get_zoomed_image(self.PIL_image, zoom_level)
+                self.image_resizer.get_zoomed_image(
+                    self._get_image_to_zoom(), zoom_level
+                )
             )
         except (FileNotFoundError, UnidentifiedImageError, ValueError) as e:
             if isinstance(e, ValueError):
@@ -221,31 +480,216 @@ class ImageLoader:
         self.zoomed_image_cache.append(zoomed_image_result.image)
         return rotate_image(zoomed_image_result.image, rotation_angle)
 
+    def _get_image_to_zoom(self) -> Image:
+        """Returns image zoom levels are resized from. Large JPEGs are decoded
+        once by turbojpeg since PIL would decode them on a single thread.
+        Waits on the held animation frame if it's still being decoded"""
+        if self.image_to_zoom is not None:
+            return self.image_to_zoom
+
+        if self.frame_to_zoom is not None:
+            try:
+                self.image_to_zoom = self.frame_to_zoom.result()
+            except (CancelledError, EOFError, OSError, ValueError):
+                self.image_to_zoom = self.PIL_image
+        else:
+            self.image_to_zoom = (
+                self.image_resizer.get_full_jpeg(self.PIL_image, self.image_buffer)
+                or self.PIL_image
+            )
+
+        return self.image_to_zoom
+
     def load_remaining_frames(
-        self, original_image: Image, last_frame: int, load_id: int
+        self,
+        decoder: Image | GifDecoder,
+        max_frames_loaded: int,
+        frames_shown: Semaphore,
+        load_id: int,
     ) -> None:
-        """Loads all frames starting from the second"""
-        for i in range(1, last_frame):
-            if load_id != self.current_load_id:
+        """Loads frames starting from the second, adding them as they are found.
+        Frames are decoded in order here and resized in parallel on a thread pool.
+        If there are more than max_frames_loaded, switches to streaming them by only
+        keeping frames ahead of the displayed one and rewinding after the last"""
+        loaded_indexes: deque[int] = deque([0])
+        resizing_frames: deque[tuple[int, Future[Image]]] = deque()
+        streaming: bool = False
+        has_streamed: bool = False
+        index: int = 1
+
+        with decoder, ThreadPoolExecutor(self.FRAME_RESIZE_WORKERS) as executor:
+            while load_id == self.current_load_id:
+                try:
+                    if self.requested_position >= 0:
+                        # Refill from the requested frame before streaming again
+                        index = self._restart_at_requested_frame(
+                            resizing_frames, loaded_indexes
+                        )
+                        streaming = False
+
+                    # Each frame shown makes room for one more while streaming
+                    if streaming:
+                        self._add_resized_frames(
+                            resizing_frames, loaded_indexes, frames_shown, load_id
+                        )
+                        if not frames_shown.acquire(timeout=0.1):
+                            continue
+
+                    try:
+                        decoder.seek(index)
+                    except EOFError:
+                        self._add_resized_frames(
+                            resizing_frames,
+                            loaded_indexes,
+                            frames_shown if streaming else None,
+                            load_id,
+                        )
+                        if load_id == self.current_load_id:
+                            self.all_frames_found = True
+                        if not has_streamed:
+                            break
+                        index = 0
+                        decoder.seek(index)
+
+                    if (
+                        not streaming
+                        and len(loaded_indexes) + len(resizing_frames)
+                        >= max_frames_loaded
+                    ):
+                        self._add_resized_frames(
+                            resizing_frames, loaded_indexes, None, load_id
+                        )
+                        streaming = has_streamed = True
+                        continue
+
+                    # Copy since the decoder moves on while the frame is resized
+                    resizing_frames.append(
+                        (
+                            index,
+                            executor.submit(
+                                self.image_resizer.get_frame_fit_to_screen,
+                                decoder.copy(),
+                            ),
+                        )
+                    )
+                    self._add_resized_frames(
+                        resizing_frames,
+                        loaded_indexes,
+                        frames_shown if streaming else None,
+                        load_id,
+                        self.FRAME_RESIZE_WORKERS,
+                    )
+                except Exception:
+                    # Corrupted frame, play what was found if all of it was kept
+                    if not has_streamed and load_id == self.current_load_id:
+                        self.all_frames_found = True
+                    break
+
+                index += 1
+
+    def _add_resized_frames(
+        self,
+        resizing_frames: deque[tuple[int, Future[Image]]],
+        loaded_indexes: deque[int],
+        frames_shown: Semaphore | None,
+        load_id: int,
+        max_still_resizing: int = 0,
+    ) -> None:
+        """Adds frames in order as they finish resizing. Waits on the oldest
+        until at most max_still_resizing are left, then adds any others done.
+        Frames identical to the one before are folded into it. When streaming,
+        frames_shown is given and the oldest loaded frame is dropped for each added"""
+        while resizing_frames and load_id == self.current_load_id:
+            index, resized_image = resizing_frames[0]
+            if len(resizing_frames) <= max_still_resizing and not resized_image.done():
                 break
-            try:
-                original_image.seek(i)
-                frame_image: Image = self.image_resizer.get_image_fit_to_screen(
-                    original_image
-                )
 
-                self.animation_frames[i] = Frame(frame_image)
-            except Exception:
-                # moving to new image during this function causes a variety of errors
-                # just break to kill thread
+            resizing_frames.popleft()
+            frame = Frame(resized_image.result(), index)
+            if load_id != self.current_load_id:
                 break
 
+            # Folding is the same each loop, so streamed frames keep their position
+            previous_position: int = loaded_indexes[-1]
+            previous_frame: Frame | None = self.animation_frames[previous_position]
+            if index != 0 and previous_frame is not None:
+                if previous_frame.try_fold(frame):
+                    if frames_shown is not None:
+                        frames_shown.release()  # loaded nothing new, so no room used
+                    continue
+
+            position: int = 0 if index == 0 else previous_position + 1
+            if position == len(self.frame_source_indexes):
+                self.frame_source_indexes.append(index)
+            if frames_shown is not None:
+                self._drop_frame(loaded_indexes.popleft())
+            if position < len(self.animation_frames):
+                self.animation_frames[position] = frame
+            else:
+                self.animation_frames.append(frame)
+            loaded_indexes.append(position)
+
+    def _restart_at_requested_frame(
+        self,
+        resizing_frames: deque[tuple[int, Future[Image]]],
+        loaded_indexes: deque[int],
+    ) -> int:
+        """Drops all loaded frames so loading restarts at the requested position.
+        Returns index in the animated image to continue decoding from"""
+        position: int = self.requested_position
+        self.requested_position = -1
+
+        for _, resized_image in resizing_frames:
+            resized_image.cancel()
+        resizing_frames.clear()
+
+        for loaded_position in loaded_indexes:
+            self._drop_frame(loaded_position)
+        loaded_indexes.clear()
+        # Dropped, so the requested frame is added after it without being folded
+        loaded_indexes.append(position - 1)
+
+        return self.frame_source_indexes[position]
+
     def reset_and_setup(self) -> None:
         """Resets zoom, animation frames, and closes previous image
         to setup for next image load"""
+        self._cache_animation_frames()
+        if self.pending_refine is not None:
+            self.pending_refine.refined_image.cancel()
+            self.pending_refine = None
         self.animation_frames = []
+        self.all_frames_found = False
         self.frame_index = 0
+        self.frame_source_indexes = []
+        self.requested_position = -1
+        self.frame_display_budget.reset()
         self.PIL_image.close()
         self._rotation_state.reset()
         self._zoom_state.reset()
         self.zoomed_image_cache = []
+        self.image_to_zoom = None
+        if self.frame_to_zoom is not None:
+            self.frame_to_zoom.cancel()
+            self.frame_to_zoom = None
+
+    def close(self) -> None:
+        """Closes the current image and stops background work on it"""
+        self.reset_and_setup()
+        self.refine_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cache_animation_frames(self) -> None:
+        """Keeps frames of the current animation in the cache if all are loaded.
+        Streamed animations had frames dropped, so they are not kept"""
+        if not self.all_frames_found or not self.animation_frames:
+            return
+
+        frames: list[Frame] = []
+        for frame in self.animation_frames:
+            if frame is None:
+                return
+            # PhotoImages only fit within the display budget while playing
+            frame.photo_image = None
+            frames.append(frame)
+
+        self.image_cache.set_animation_frames(self.animation_path, frames)
@@ -0,0 +1,122 @@
+"""Classes for collecting and storing metadata of image files in bulk"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import stat, stat_result
+
+from constants import SortMode
+from image._read import CImageHeader, probe_image
+
+
+class ImageFileMetadata:
+    """Metadata on an image file used for sorting"""
+
+    __slots__ = ("byte_size", "height", "modified_time_ns", "width")
+
+    def __init__(self, byte_size: int, modified_time_ns: int) -> None:
+        self.byte_size: int = byte_size
+        self.modified_time_ns: int = modified_time_ns
+        # Dimensions are only read when needed, -1 means not read yet
+        self.width: int = -1
+        self.height: int = -1
+
+    @property
+    def has_dimensions(self) -> bool:
+        return self.width >= 0
+
+    def get_sort_key(self, sort_mode: SortMode) -> int:
+        """Returns key where smaller values are sorted first for provided sort mode"""
+        match sort_mode:
+            case SortMode.NEWEST:
+                return -self.modified_time_ns
+            case SortMode.LARGEST_FILE:
+                return -self.byte_size
+            case SortMode.MOST_PIXELS:
+                return -self.width * self.height
+            case _:
+                return 0
+
+
+def _read_dimensions(path: str) -> tuple[int, int]:
+    """Reads only the header of an image to get its dimensions.
+    Returns (0, 0) if the image could not be read"""
+    image_header: CImageHeader | None = probe_image(path)
+    if image_header is None:
+        return (0, 0)
+
+    return (image_header.width, image_header.height)
+
+
+class ImageMetadataIndex(dict[str, ImageFileMetadata]):
+    """Dictionary of image file metadata using paths as keys.
+    Entries are kept so changing the sort mode never needs to read from disk again"""
+
+    __slots__ = ()
+
+    def collect(self, paths: list[str], sort_mode: SortMode) -> None:
+        """Collects metadata needed for sort_mode on all paths using a thread pool"""
+        if sort_mode == SortMode.NAME:
+            return
+
+        include_dimensions: bool = sort_mode == SortMode.MOST_PIXELS
+        paths_to_collect: list[str] = self._get_paths_to_collect(paths, sort_mode)
+
+        if not paths_to_collect:
+            return
+
+        with ThreadPoolExecutor() as executor:
+            for path, metadata in zip(
+                paths_to_collect,
+                executor.map(
+                    lambda path: self._collect_one(path, include_dimensions),
+                    paths_to_collect,
+                ),
+            ):
+                self[path] = metadata
+
+    def is_collected(self, paths: list[str], sort_mode: SortMode) -> bool:
+        """Returns True if metadata needed for sort_mode is known for all paths"""
+        return sort_mode == SortMode.NAME or not self._get_paths_to_collect(
+            paths, sort_mode
+        )
+
+    def _get_paths_to_collect(self, paths: list[str], sort_mode: SortMode) -> list[str]:
+        """Returns paths missing metadata needed for sort_mode"""
+        include_dimensions: bool = sort_mode == SortMode.MOST_PIXELS
+        return [
+            path
+            for path in paths
+            if (metadata := self.get(path)) is None
+            or (include_dimensions and not metadata.has_dimensions)
+        ]
+
+    def get_sort_key(self, path: str, sort_mode: SortMode) -> int:
+        """Returns sort key for path, reading from disk if not already collected"""
+        metadata: ImageFileMetadata | None = self.get(path)
+        if metadata is None or (
+            sort_mode == SortMode.MOST_PIXELS and not metadata.has_dimensions
+        ):
+            metadata = self[path] = self._collect_one(
+                path, sort_mode == SortMode.MOST_PIXELS
+            )
+
+        return metadata.get_sort_key(sort_mode)
+
+    def pop_safe(self, path: str) -> ImageFileMetadata | None:
+        """Pops and returns path or None if it doesn't exist"""
+        return self.pop(path, None)
+
+    def _collect_one(self, path: str, include_dimensions: bool) -> ImageFileMetadata:
+        """Returns metadata on path, reusing what was already collected"""
+        metadata: ImageFileMetadata | None = self.get(path)
+
+        if metadata is None:
+            try:
+                file_stats: stat_result = stat(path)
+                metadata = ImageFileMetadata(file_stats.st_size, file_stats.st_mtime_ns)
+            except OSError:
+                metadata = ImageFileMetadata(0, 0)
+
+        if include_dimensions and not metadata.has_dimensions:
+            metadata.width, metadata.height = _read_dimensions(path)
+
+        return metadata
@@ -1,14 +1,36 @@
 """Classes for resizing PIL images"""
 
+from io import BytesIO
 from typing import Final
 
-from PIL.Image import Image, Resampling, frombytes
-
-from image._read import CMemoryViewBuffer, CMemoryViewBufferJpeg, decode_scaled_jpeg
-from util.PIL import resize
+from PIL import UnidentifiedImageError
+from PIL.Image import Image, Resampling, frombuffer
+from PIL.Image import open as open_image
+
+from image._read import (
+    CMemoryViewBuffer,
+    CMemoryViewBufferDecoded,
+    decode_scaled_jpeg,
+    decode_scaled_webp,
+    find_dds_mip_level,
+    find_jpeg_thumbnail,
+)
+from util.PIL import (
+    flatten_alpha,
+    image_is_animated,
+    resize,
+    try_convert_to_palette,
+)
 
 JPEG_MAX_DIMENSION: Final[int] = 65_535
 MIN_ZOOM_RATIO_TO_SCREEN: int = 2
+# Images this many times larger than the screen show a preview while resizing
+PREVIEW_RATIO_TO_SCREEN: int = 2
+# JPEGs with more pixels than this are zoomed from a turbojpeg decode,
+# which splits them across threads unlike PIL
+FULL_JPEG_DECODE_MIN_PIXELS: int = 16_000_000
+# Magic, header, and DX10 header
+DDS_MAX_HEADER_SIZE: Final[int] = 4 + 124 + 20
 
 
 class ZoomedImageResult:
@@ -25,11 +47,16 @@ class ZoomedImageResult:
 class ImageResizer:
     """Handles resizing images to fit to the screen"""
 
-    __slots__ = ("jpeg_helper", "screen_height", "screen_width")
+    __slots__ = ("background_color", "jpeg_helper", "screen_height", "screen_width")
 
-    def __init__(self, screen_width: int, screen_height: int) -> None:
+    def __init__(
+        self, screen_width: int, screen_height: int, background_color: str | None = None
+    ) -> None:
         self.screen_width: Final[int] = screen_width
         self.screen_height: Final[int] = screen_height
+        # Transparent images are blended onto this since they're shown over it,
+        # None keeps transparency
+        self.background_color: Final[str | None] = background_color
 
     def get_zoomed_image(self, image: Image, zoom_level: int) -> ZoomedImageResult:
         """Resizes image using the provided zoom_level.
@@ -64,7 +91,12 @@ class ImageResizer:
                     image_width, image_height
                 )
 
-        return ZoomedImageResult(resize(image, dimensions, interpolation), hit_max_zoom)
+        return ZoomedImageResult(
+            self._convert_for_display(
+                resize(image, dimensions, interpolation, self.background_color)
+            ),
+            hit_max_zoom,
+        )
 
     def _calculate_zoom_factor(self, width: int, height: int, zoom_level: int) -> float:
         """Calculates zoom factor based on zoom level and w/h ratio"""
@@ -84,13 +116,15 @@ class ImageResizer:
         first, second = t
         return (int(first * scale), int(second * scale))
 
+    def _get_ratio_to_screen(self, image_width: int, image_height: int) -> float:
+        """Returns how many times larger than the screen an image is"""
+        return max(image_width / self.screen_width, image_height / self.screen_height)
+
     def _get_jpeg_scale_factor(
         self, image_width: int, image_height: int
     ) -> tuple[int, int] | None:
         """Gets Turbo JPEG scaling factor for images larger than screen"""
-        ratio_to_screen: float = max(
-            image_width / self.screen_width, image_height / self.screen_height
-        )
+        ratio_to_screen: float = self._get_ratio_to_screen(image_width, image_height)
 
         if ratio_to_screen >= 4:
             return (1, 4)
@@ -110,13 +144,191 @@ class ImageResizer:
         if scale_factor is None:
             return self.get_image_fit_to_screen(image)
 
-        jpeg_result: CMemoryViewBufferJpeg = decode_scaled_jpeg(
+        jpeg_result: CMemoryViewBufferDecoded = decode_scaled_jpeg(
             image_bytes, scale_factor
         )
         return self.get_image_fit_to_screen(
-            frombytes("RGB", jpeg_result.dimensions, jpeg_result.view)
+            self._get_image_from_decode_result(jpeg_result)
+        )
+
+    @staticmethod
+    def get_full_jpeg(image: Image, image_bytes: CMemoryViewBuffer) -> Image | None:
+        """Returns a large JPEG decoded at full size by turbojpeg
+        or None if image is too small or not a JPEG"""
+        if (
+            image.format != "JPEG"
+            or image.width * image.height < FULL_JPEG_DECODE_MIN_PIXELS
+        ):
+            return None
+
+        try:
+            jpeg_result: CMemoryViewBufferDecoded = decode_scaled_jpeg(
+                image_bytes, (1, 1)
+            )
+        except OSError:
+            return None  # PIL may still be able to decode it
+
+        return ImageResizer._get_image_from_decode_result(jpeg_result)
+
+    @staticmethod
+    def _get_image_from_decode_result(decode_result: CMemoryViewBufferDecoded) -> Image:
+        """Returns Image of a decoded JPEG or WebP that uses its buffer without
+        copying. The Image keeps the buffer alive for as long as it exists"""
+        return frombuffer(
+            decode_result.mode,
+            decode_result.dimensions,
+            memoryview(decode_result),
+            "raw",
+            decode_result.mode,
+            0,
+            1,
+        )
+
+    @staticmethod
+    def _convert_for_display(image: Image) -> Image:
+        """Converts CMYK and padded RGBX to RGB since Tk would convert them on
+        every display. Done after resizing so only the smaller image is converted"""
+        return image.convert("RGB") if image.mode in ("CMYK", "RGBX") else image
+
+    def should_preview(self, image_width: int, image_height: int) -> bool:
+        """Returns True if resizing to screen is slow enough that
+        a preview should be shown while it runs"""
+        return (
+            self._get_ratio_to_screen(image_width, image_height)
+            >= PREVIEW_RATIO_TO_SCREEN
+        )
+
+    def get_preview_fit_to_screen(
+        self, image: Image, image_bytes: CMemoryViewBuffer
+    ) -> Image:
+        """Quickly resizes image to screen at low quality. JPEGs use a preview
+        embedded in their metadata or are decoded at an eighth of their size,
+        other images are sampled without filtering"""
+        dimensions: tuple[int, int] = self.fit_dimensions_to_screen(*image.size)
+        if image.format == "JPEG":
+            image = self._get_jpeg_preview(image_bytes, dimensions)
+        elif image.format == "DDS":
+            image = self._get_dds_mip_level(image_bytes, dimensions) or image
+
+        return self._convert_for_display(
+            resize(image, dimensions, Resampling.NEAREST, self.background_color)
         )
 
+    @staticmethod
+    def _get_jpeg_preview(
+        image_bytes: CMemoryViewBuffer, dimensions: tuple[int, int]
+    ) -> Image:
+        """Returns the largest preview embedded in a JPEG, or the JPEG decoded
+        at an eighth of its size if it has none"""
+        embedded_jpeg: tuple[int, int] | None = find_jpeg_thumbnail(image_bytes)
+        if embedded_jpeg is not None:
+            offset, length = embedded_jpeg
+            try:
+                preview: Image = open_image(
+                    BytesIO(image_bytes.view[offset : offset + length]),
+                    "r",
+                    ("JPEG",),
+                )
+                # Large previews can also be decoded scaled down
+                preview.draft("RGB", dimensions)
+                preview.load()
+                return preview
+            except (UnidentifiedImageError, OSError):
+                pass  # corrupted, fall back to decoding the image itself
+
+        jpeg_result: CMemoryViewBufferDecoded = decode_scaled_jpeg(image_bytes, (1, 8))
+        return ImageResizer._get_image_from_decode_result(jpeg_result)
+
+    def get_webp_fit_to_screen(
+        self, image: Image, image_bytes: CMemoryViewBuffer
+    ) -> Image:
+        """Resizes a still WebP by having libwebp decode it at screen size.
+        Animations and WebPs smaller than the screen are resized with PIL"""
+        dimensions: tuple[int, int] = self.fit_dimensions_to_screen(*image.size)
+        if image_is_animated(image) or dimensions[0] >= image.width:
+            return self.get_image_fit_to_screen(image)
+
+        decode_result: CMemoryViewBufferDecoded = decode_scaled_webp(
+            image_bytes, dimensions
+        )
+        scaled_image: Image = self._get_image_from_decode_result(decode_result)
+        # Already at screen size, only blends transparency onto the background
+        if scaled_image.mode == "RGBA" and self.background_color is not None:
+            return flatten_alpha(scaled_image, self.background_color)
+        return self._convert_for_display(scaled_image)
+
+    def get_dds_fit_to_screen(
+        self, image: Image, image_bytes: CMemoryViewBuffer
+    ) -> Image:
+        """Resizes a DDS from its smallest mip level that still covers the screen
+        rather than decoding its full size level"""
+        dimensions: tuple[int, int] = self.fit_dimensions_to_screen(*image.size)
+        mip_level: Image | None = self._get_dds_mip_level(image_bytes, dimensions)
+        if mip_level is None:
+            return self.get_image_fit_to_screen(image)
+
+        interpolation: Resampling = self.get_resampling(*mip_level.size)
+        return self._convert_for_display(
+            resize(mip_level, dimensions, interpolation, self.background_color)
+        )
+
+    @staticmethod
+    def _get_dds_mip_level(
+        image_bytes: CMemoryViewBuffer, dimensions: tuple[int, int]
+    ) -> Image | None:
+        """Returns the smallest mip level of a DDS at least as large as dimensions
+        or None if it has no smaller level that is"""
+        found_level: tuple[int, int, int] | None = find_dds_mip_level(
+            image_bytes, *dimensions
+        )
+        if found_level is None:
+            return None
+
+        offset, width, height = found_level
+        # Opening only reads the header, which says how PIL decodes each level
+        with open_image(
+            BytesIO(image_bytes.view[:DDS_MAX_HEADER_SIZE]), "r", ("DDS",)
+        ) as header:
+            mode: str = header.mode
+            decoder_name, _, _, args = header.tile[0]
+
+        if decoder_name == "dds_rgb":
+            # PIL reads these a pixel at a time from a file, but when each
+            # channel is a whole byte its the same as a raw mode
+            rawmode: str | None = ImageResizer._get_dds_rawmode(*args)
+            if rawmode is None:
+                return None
+            decoder_name, args = "raw", rawmode
+        if decoder_name == "raw":
+            args = (args, 0, 1)
+        elif decoder_name != "bcn":
+            return None
+
+        try:
+            return frombuffer(
+                mode,
+                (width, height),
+                memoryview(image_bytes)[offset:],
+                decoder_name,
+                args,
+            )
+        except ValueError:
+            return None  # level is cut off
+
+    @staticmethod
+    def _get_dds_rawmode(bitcount: int, masks: tuple[int, ...]) -> str | None:
+        """Returns raw mode of uncompressed DDS pixels from their channel masks
+        or None if any channel is not a whole byte"""
+        channels: list[str] = ["X"] * (bitcount // 8)
+        byte_masks: dict[int, int] = {0xFF << (8 * i): i for i in range(len(channels))}
+        for band, mask in zip("RGBA", masks):
+            byte: int | None = byte_masks.get(mask)
+            if byte is None or channels[byte] != "X":
+                return None
+            channels[byte] = band
+
+        return "".join(channels)
+
     def get_image_fit_to_screen(self, image: Image) -> Image:
         """Resizes image to screen with PIL"""
         image_width, image_height = image.size
@@ -125,7 +337,19 @@ class ImageResizer:
             image_width, image_height
         )
 
-        return resize(image, dimensions, interpolation)
+        return self._convert_for_display(
+            resize(image, dimensions, interpolation, self.background_color)
+        )
+
+    def get_frame_fit_to_screen(self, frame: Image) -> Image:
+        """Resizes an animation frame to screen. Palette frames stay in P mode
+        when resizing them didn't add more colors than a palette holds"""
+        resized_frame: Image = self.get_image_fit_to_screen(frame)
+        return (
+            try_convert_to_palette(resized_frame)
+            if frame.mode == "P"
+            else resized_frame
+        )
 
     def fit_dimensions_to_screen(
         self, image_width: int, image_height: int
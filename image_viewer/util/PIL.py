@@ -2,6 +2,9 @@
 Functions for manipulating PIL and PIL's image objects
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil, floor
+from os import cpu_count
 from textwrap import wrap
 from typing import IO
 
@@ -13,6 +16,14 @@ from PIL.JpegImagePlugin import JpegImageFile
 
 from constants import TEXT_RGB
 
+# Reduce by whole factors until within this many times the target size
+# before resampling, at 2 the result is within a shade of not reducing
+REDUCING_GAP: float = 2.0
+# Images with more pixels than this are resized in strips across threads
+PARALLEL_RESIZE_MIN_PIXELS: int = 16_000_000
+# Source pixels past a pixel's center the widest filter, LANCZOS, reads
+MAX_FILTER_SUPPORT: int = 3
+
 
 def save_image(
     image: Image,
@@ -42,21 +53,86 @@ def _resize_new(
     image: Image,
     size: tuple[int, int],
     resample: Resampling,
-    box: tuple[int, int, int, int],
+    box: tuple[float, float, float, float],
 ) -> Image:
     """Performs image resize and returns the new image"""
     return image._new(image.im.resize(size, resample, box))
 
 
+def _resize_in_strips(
+    image: Image,
+    size: tuple[int, int],
+    resample: Resampling,
+    factor: tuple[int, int],
+    strip_count: int,
+) -> Image:
+    """Reduces and resizes horizontal strips of the new image in parallel and
+    joins them. Each strip reduces and reads source pixels past its box as far
+    as the widest filter reaches, so they match resizing the whole image at once
+    up to rounding"""
+    factor_x, factor_y = factor
+    # Partial blocks at the edges still count as a whole pixel
+    reduced_width: float = image.width / factor_x
+    reduced_height: float = image.height / factor_y
+    source_rows_per_row: float = reduced_height / size[1]
+    margin: int = ceil(MAX_FILTER_SUPPORT * max(source_rows_per_row, 1)) + 1
+    strip_bounds: list[int] = [
+        size[1] * strip // strip_count for strip in range(strip_count + 1)
+    ]
+
+    def resize_strip(strip_top: int, strip_bottom: int) -> Image:
+        top: float = strip_top * source_rows_per_row
+        bottom: float = strip_bottom * source_rows_per_row
+        band: Image = image
+        band_top: int = 0
+        if factor != (1, 1):
+            band_top = max(floor(top) - margin, 0)
+            band_bottom: int = min(ceil(bottom) + margin, ceil(reduced_height))
+            band = image.reduce(
+                factor,
+                (
+                    0,
+                    band_top * factor_y,
+                    image.width,
+                    min(band_bottom * factor_y, image.height),
+                ),
+            )
+
+        return _resize_new(
+            band,
+            (size[0], strip_bottom - strip_top),
+            resample,
+            (0, top - band_top, reduced_width, bottom - band_top),
+        )
+
+    # Reducing and resizing release the GIL so strips run at the same time
+    with ThreadPoolExecutor(strip_count) as executor:
+        strips: list[Image] = list(
+            executor.map(resize_strip, strip_bounds, strip_bounds[1:])
+        )
+
+    resized_image: Image = new(image.mode, size)
+    for strip_top, strip in zip(strip_bounds, strips):
+        resized_image.paste(strip, (0, strip_top))
+
+    return resized_image
+
+
 def resize(
-    image: Image, size: tuple[int, int], resample: Resampling = Resampling.LANCZOS
+    image: Image,
+    size: tuple[int, int],
+    resample: Resampling = Resampling.LANCZOS,
+    background_color: str | None = None,
 ) -> Image:
-    """Modified version of resize from PIL"""
+    """Modified version of resize from PIL. When background_color is given,
+    transparent images are blended onto it and returned as RGB"""
     image.load()
     if image.size == size:
+        if background_color is not None and image.mode in ("RGBA", "LA"):
+            return flatten_alpha(image, background_color)
         return image.copy()
 
-    box: tuple[int, int, int, int] = (0, 0) + image.size
+    box: tuple[float, float, float, float] = (0, 0) + image.size
     original_mode: str = image.mode
     modes_to_convert: dict[str, str] = {
         "RGBA": "RGBa",
@@ -69,15 +145,67 @@ def resize(
         new_mode: str = modes_to_convert[original_mode]
         image = image.convert(new_mode)
 
-    resized_image: Image = _resize_new(image, size, resample, box)
+    # Averaging blocks of pixels is much cheaper than wide filters
+    # on the full image and leaves the filter less to cover
+    factor: tuple[int, int] = (1, 1)
+    if resample != Resampling.NEAREST:
+        factor = (
+            int(image.width / size[0] / REDUCING_GAP) or 1,
+            int(image.height / size[1] / REDUCING_GAP) or 1,
+        )
+
+    # Checked on the full size since strips also split up reducing
+    strip_count: int = min(cpu_count() or 1, size[1])
+    resized_image: Image
+    if strip_count > 1 and image.width * image.height >= PARALLEL_RESIZE_MIN_PIXELS:
+        try:
+            resized_image = _resize_in_strips(
+                image, size, resample, factor, strip_count
+            )
+        except ValueError:  # 16 bit modes can't be reduced
+            resized_image = _resize_in_strips(
+                image, size, resample, (1, 1), strip_count
+            )
+    else:
+        if factor != (1, 1):
+            try:
+                reduced_image: Image = image.reduce(factor)
+                # Partial blocks at the edges still count as a whole pixel
+                box = (0, 0, image.width / factor[0], image.height / factor[1])
+                image = reduced_image
+            except ValueError:
+                pass  # 16 bit modes can't be reduced
+
+        resized_image = _resize_new(image, size, resample, box)
 
     # These mode were temporarily converted to pre-compute alpha and should be reverted
     if original_mode in ("RGBA", "LA"):
-        resized_image = resized_image.convert(original_mode)
+        # Blending works on pre-computed alpha, but PIL can't convert La to RGB
+        if background_color is None or original_mode == "LA":
+            resized_image = resized_image.convert(original_mode)
+        if background_color is not None:
+            resized_image = flatten_alpha(resized_image, background_color)
 
     return resized_image
 
 
+def flatten_alpha(image: Image, background_color: str) -> Image:
+    """Returns RGB image of image blended onto background_color.
+    Pre-computed alpha modes like RGBa are blended without converting back"""
+    flattened_image: Image = new("RGB", image.size, background_color)
+    flattened_image.paste(image, None, image)
+    return flattened_image
+
+
+def try_convert_to_palette(image: Image) -> Image:
+    """Returns image in P mode if its colors fit in a palette, otherwise image"""
+    if image.mode != "RGB" or image.getcolors(256) is None:
+        return image
+
+    # Median cut keeps every color exactly when there are no more than 256
+    return image.quantize()
+
+
 def _get_longest_line_dimensions(text: str) -> tuple[int, int]:
     """Returns width and height of longest string in a string with multiple lines"""
     longest_line: str = max(text.split("\n"), key=len)
@@ -0,0 +1,52 @@
+"""
+Tracking of memory used by images
+"""
+
+from threading import Lock
+
+from PIL.Image import Image
+
+
+def get_photo_image_byte_size(image: Image) -> int:
+    """Returns estimated bytes Tk uses to store a PhotoImage of image.
+    Tk stores photos as 4 bytes per pixel regardless of mode"""
+    return image.width * image.height * 4
+
+
+class MemoryBudget:
+    """Tracks bytes reserved against a limit, safe to use across threads"""
+
+    __slots__ = ("_lock", "max_bytes", "used_bytes")
+
+    def __init__(self, max_bytes: int) -> None:
+        self._lock = Lock()
+        self.max_bytes: int = max_bytes
+        self.used_bytes: int = 0
+
+    def try_reserve(self, byte_count: int) -> bool:
+        """Reserves byte_count and returns True if it fits within the limit"""
+        with self._lock:
+            if self.used_bytes + byte_count > self.max_bytes:
+                return False
+
+            self.used_bytes += byte_count
+            return True
+
+    def release(self, byte_count: int) -> None:
+        """Frees byte_count that was previously reserved"""
+        with self._lock:
+            self.used_bytes = max(self.used_bytes - byte_count, 0)
+
+    def reserve(self, byte_count: int) -> None:
+        """Reserves byte_count even if it goes over the limit"""
+        with self._lock:
+            self.used_bytes += byte_count
+
+    @property
+    def is_exceeded(self) -> bool:
+        return self.used_bytes > self.max_bytes
+
+    def reset(self) -> None:
+        """Frees everything that was reserved"""
+        with self._lock:
+            self.used_bytes = 0
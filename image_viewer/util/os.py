@@ -82,6 +82,32 @@ else:  # assume linux for now
                     yield entry.name
 
 
+def get_files_and_folders_in_folder(
+    directory_path: str,
+) -> tuple[list[str], list[str]]:
+    """Returns names of files and names of folders within a folder.
+    Symlinked folders are skipped to avoid cycles when searching recursively"""
+    files: list[str] = []
+    folders: list[str] = []
+
+    try:
+        with os.scandir(directory_path) as scandir_iter:
+            for entry in scandir_iter:
+                try:
+                    is_dir: bool = entry.is_dir()
+                    if is_dir and not entry.is_symlink():
+                        folders.append(entry.name)
+                except OSError:
+                    is_dir = False
+
+                if not is_dir:
+                    files.append(entry.name)
+    except OSError:
+        pass  # Treat unreadable folders as empty
+
+    return files, folders
+
+
 def show_info(hwnd: int, title: str, body: str) -> None:
     """If on Windows, shows info popup as child of parent
     Otherwise shows parent-less info popup"""
@@ -1,6 +1,5 @@
 import os
 from collections.abc import Callable
-from time import perf_counter
 from tkinter import Event, Tk
 from typing import NoReturn
 
@@ -8,10 +7,11 @@ from PIL.Image import Image
 from PIL.ImageTk import PhotoImage
 
 from animation.frame import Frame
+from animation.scheduler import FrameScheduler
 from config import Config
-from constants import ButtonName, Key, Rotation, TkTags, ZoomDirection
+from constants import ButtonName, Key, Rotation, SortMode, TkTags, ZoomDirection
 from files.file_manager import ImageFileManager
-from image.cache import ImageCache
+from image.cache import ImageCache, PhotoImageCache
 from image.loader import ImageLoader
 from ui.button import HoverableButtonUIElement, ToggleableButtonUIElement
 from ui.button_icon_factory import ButtonIconFactory
@@ -35,10 +35,15 @@ else:
 class ViewerApp:
     """Main UI class handling IO and on screen widgets"""
 
+    # How often to check if a preview's full quality image is ready
+    REFINE_POLL_MS: int = 10
+
     __slots__ = (
         "animation_id",
+        "animation_scheduler",
         "app",
         "app_id",
+        "background_merge_id",
         "canvas",
         "dropdown",
         "file_manager",
@@ -47,13 +52,19 @@ class ViewerApp:
         "image_load_id",
         "move_id",
         "need_to_redraw",
+        "photo_image_cache",
+        "refine_id",
         "rename_entry",
         "width_ratio",
     )
 
     def __init__(self, first_image_path: str, path_to_exe_folder: str) -> None:
         config = Config(path_to_exe_folder)
-        image_cache: ImageCache = ImageCache(config.max_items_in_cache)
+        image_cache: ImageCache = ImageCache(
+            config.max_items_in_cache,
+            config.cache_hash_size,
+            config.cache_animation_memory_mb * 1024 * 1024,
+        )
         self.file_manager: ImageFileManager = ImageFileManager(
             first_image_path, image_cache
         )
@@ -66,6 +77,9 @@ class ViewerApp:
         self.move_id: str = ""
         self.image_load_id: str = ""
         self.animation_id: str = ""
+        self.animation_scheduler = FrameScheduler()
+        self.background_merge_id: str = ""
+        self.refine_id: str = ""
 
         self.app: Tk = self._setup_tk_app(path_to_exe_folder)
         self.app_id: int = self.app.winfo_id()
@@ -76,6 +90,9 @@ class ViewerApp:
         self.height_ratio: float = screen_height / 1080
         self.width_ratio: float = screen_width / 1920
 
+        # Enough for the current image and the ones next to it at full screen
+        self.photo_image_cache = PhotoImageCache(screen_width * screen_height * 4 * 3)
+
         self._load_assets(
             self.canvas,
             config.font_file,
@@ -88,6 +105,9 @@ class ViewerApp:
             screen_height,
             image_cache,
             self.animation_loop,
+            config.animation_display_memory_mb * 1024 * 1024,
+            config.animation_frame_memory_mb * 1024 * 1024,
+            config.background_color,
         )
 
         init_PIL(config.font_file, self._scale_pixels_to_height(23))
@@ -137,6 +157,7 @@ class ViewerApp:
         app.bind("<FocusIn>", self.redraw)
         app.bind("<Escape>", self.handle_esc)
         app.bind("<KeyRelease>", self.handle_key_release)
+        app.bind(config.keybinds.change_sort_mode, self.change_sort_mode)
         app.bind(
             config.keybinds.copy_to_clipboard_as_base64,
             self.copy_to_clipboard_as_base64,
@@ -145,6 +166,7 @@ class ViewerApp:
         app.bind(config.keybinds.reload_image, lambda _: self.load_image_unblocking())
         app.bind(config.keybinds.rename, self.toggle_show_rename_window)
         app.bind(config.keybinds.show_details, self.show_details)
+        app.bind(config.keybinds.toggle_recursive, self.toggle_recursive)
         app.bind(config.keybinds.move_to_new_file, self.move_to_new_file)
         app.bind(config.keybinds.undo_most_recent_action, self.undo_most_recent_action)
         app.bind(
@@ -159,6 +181,30 @@ class ViewerApp:
                 e, self.load_zoomed_or_rotated_image_unblocking, ZoomDirection.OUT
             ),
         )
+        app.bind(
+            "<space>",
+            lambda e: self._only_for_this_window(e, self.toggle_animation),
+        )
+        app.bind(
+            "<comma>",
+            lambda e: self._only_for_this_window(e, self.seek_animation, -1, False),
+        )
+        app.bind(
+            "<period>",
+            lambda e: self._only_for_this_window(e, self.seek_animation, 1, False),
+        )
+        app.bind(
+            "<less>",
+            lambda e: self._only_for_this_window(
+                e, self.seek_animation, -self.image_loader.seek_step, True
+            ),
+        )
+        app.bind(
+            "<greater>",
+            lambda e: self._only_for_this_window(
+                e, self.seek_animation, self.image_loader.seek_step, True
+            ),
+        )
         app.bind("<Left>", self.handle_lr_arrow)
         app.bind("<Right>", self.handle_lr_arrow)
         app.bind("<Up>", self.handle_up_arrow)
@@ -284,9 +330,6 @@ class ViewerApp:
 
     def handle_rotate_image(self, event: Event) -> None:
         """Rotates image, saves it to disk, and updates the display"""
-        if self.currently_animating():
-            return
-
         match event.keysym_num:
             case Key.LEFT:
                 rotation = Rotation.LEFT
@@ -307,7 +350,7 @@ class ViewerApp:
             self.show_topbar()
 
     def _only_for_this_window(
-        self, event: Event, function_to_call: Callable[[], None], *args
+        self, event: Event, function_to_call: Callable[..., None], *args
     ) -> None:
         """Given a callable that accepts a tkinter Event,
         only call it if self.app is the target"""
@@ -391,6 +434,12 @@ class ViewerApp:
         )
 
         if details is not None:
+            if self.currently_animating():
+                scheduler: FrameScheduler = self.animation_scheduler
+                details += (
+                    f"Playback: {scheduler.fps:.1f} fps, "
+                    f"{scheduler.jitter_ms:.1f} ms jitter\n"
+                )
             show_info(self.app_id, "Image Details", details)
 
     def load_zoomed_or_rotated_image(
@@ -406,22 +455,53 @@ class ViewerApp:
         if zoomed_image is not None:
             self._update_existing_image_display(zoomed_image)
 
+        if (
+            self.image_loader.animation_frames
+            and not self.currently_animating()
+            and not self.image_loader.is_zoomed_or_rotated
+        ):
+            self._resume_animation()
+
         self._end_image_load()
 
     def load_zoomed_or_rotated_image_unblocking(
         self, direction: ZoomDirection | None = None, rotation: Rotation | None = None
     ) -> None:
         """Starts new thread for loading zoomed image"""
-        if self.currently_animating():
-            return
+        # Frames are only resized to fit screen, so pause on the current one
+        self.pause_animation()
+        self.image_loader.hold_current_frame()
 
         self._start_image_load(self.load_zoomed_or_rotated_image, direction, rotation)
 
+    def change_sort_mode(self, _: Event) -> None:
+        """Cycles to the next sort mode while staying on the current image"""
+        sort_modes: list[SortMode] = list(SortMode)
+        next_index: int = sort_modes.index(self.file_manager.sort_mode) + 1
+        self.file_manager.set_sort_mode(sort_modes[next_index % len(sort_modes)])
+        self.merge_background_results()
+        self.update_title()
+
+    def toggle_recursive(self, _: Event) -> None:
+        """Switches between showing images in the current folder
+        and showing images in all of its subfolders"""
+        try:
+            self.file_manager.toggle_recursive()
+        except IndexError:
+            self.exit()
+        self.merge_background_results()
+
+        # Name of current image is relative to the folder being viewed
+        self.update_title()
+        if self.canvas.is_widget_visible(TkTags.TOPBAR):
+            self.update_topbar()
+
     # End functions handling specific user input
 
     def move_to_new_file(self, _: Event) -> None:
         """Moves to a new image from file dialog"""
         if self.file_manager.move_to_new_file():
+            self.merge_background_results()
             self.load_image()
 
     def exit(self, exit_code: int = 0) -> NoReturn:
@@ -430,7 +510,7 @@ class ViewerApp:
             self.canvas.delete(self.canvas.file_name_text_id)
             self.app.quit()
             self.app.destroy()
-            self.image_loader.reset_and_setup()
+            self.image_loader.close()
         except AttributeError:
             pass
 
@@ -453,6 +533,7 @@ class ViewerApp:
             self.file_manager.refresh_image_list()
         except IndexError:
             self.exit()
+        self.merge_background_results()
         self.load_image_unblocking()
 
     def undo_most_recent_action(self, _: Event) -> None:
@@ -529,13 +610,28 @@ class ViewerApp:
     def _update_image_display(self, image: Image) -> None:
         """Updates display with PhotoImage version of provided Image.
         Use when a new image is replacing the previous and should be
-        re-centered"""
-        self.canvas.update_image_display(PhotoImage(image))
+        re-centered. Reuses the PhotoImage when this Image was shown before"""
+        self.photo_image_cache.remove_evicted(self.file_manager.image_cache)
+        photo_image: PhotoImage = self.photo_image_cache.get_photo_image(
+            self.file_manager.path_to_image, image
+        )
+        self.canvas.update_image_display(photo_image)
 
     def update_after_image_load(self, image: Image) -> None:
         """Updates app title and displayed image"""
         self._update_image_display(image)
-        self.app.title(self.file_manager.current_image.name)
+        self.update_title()
+        if self.image_loader.pending_refine is not None:
+            self.refine_id = self.app.after(
+                self.REFINE_POLL_MS, self.show_refined_image
+            )
+
+    def update_title(self) -> None:
+        """Sets app title to current image name and sort mode if not by name"""
+        title: str = self.file_manager.current_image.name
+        if self.file_manager.sort_mode != SortMode.NAME:
+            title += f" - sorted by {self.file_manager.sort_mode}"
+        self.app.title(title)
 
     def _load_image_at_current_path(self) -> Image | None:
         """Wraps ImageLoader's load call with path from FileManager"""
@@ -605,33 +701,142 @@ class ViewerApp:
         """Returns True when currently in an animation loop"""
         return self.animation_id != ""
 
-    def animation_loop(self, ms_until_next_frame: int, ms_backoff: int) -> None:
-        """Handles looping between animation frames"""
-        self.animation_id = self.app.after(
-            ms_until_next_frame, self._show_next_frame, ms_backoff
+    def pause_animation(self) -> None:
+        """Stops looping between animation frames on the current one"""
+        if self.currently_animating():
+            self.app.after_cancel(self.animation_id)
+            self.animation_id = ""
+
+    def toggle_animation(self) -> None:
+        """Pauses or resumes the current animation"""
+        if self.currently_animating():
+            self.pause_animation()
+        elif (
+            self.image_loader.animation_frames
+            and not self.image_loader.is_zoomed_or_rotated
+        ):
+            self._resume_animation()
+
+    def seek_animation(self, frame_count: int, keep_playing: bool) -> None:
+        """Moves frame_count frames from the current one. If keep_playing
+        is False, animation is paused on that frame"""
+        if (
+            not self.image_loader.animation_frames
+            or self.image_loader.is_zoomed_or_rotated
+        ):
+            return
+
+        keep_playing = keep_playing and self.currently_animating()
+        self.pause_animation()
+        frame: Frame | None = self.image_loader.seek_frame(
+            self.image_loader.frame_index + frame_count
         )
 
-    def _show_next_frame(self, ms_backoff: int) -> None:
-        """Displays a frame on screen and loops to next frame after a delay"""
-        start: float = perf_counter()
+        if frame is not None:
+            self._show_frame(frame)
+            if keep_playing:
+                self.animation_loop(frame.ms_until_next_frame)
+        elif keep_playing:  # Shown as the next frame once its loaded
+            self.animation_loop(FrameScheduler.WAIT_FOR_FRAME_MS)
+        else:
+            self._show_frame_when_loaded()
+
+    def _show_frame_when_loaded(self) -> None:
+        """Shows the frame that was seeked to once its loaded while paused"""
+        frame: Frame | None = self.image_loader.get_next_frame()
+        if frame is None:
+            self.animation_id = self.app.after(
+                FrameScheduler.WAIT_FOR_FRAME_MS, self._show_frame_when_loaded
+            )
+            return
+
+        self.animation_id = ""
+        self._show_frame(frame)
+
+    def _show_frame(self, frame: Frame) -> None:
+        """Displays an animation frame"""
+        self.canvas.update_existing_image_display(
+            frame.get_photo_image(self.image_loader.frame_display_budget)
+        )
+
+    def animation_loop(self, ms_until_next_frame: int) -> None:
+        """Starts looping between animation frames"""
+        self.animation_scheduler.start(ms_until_next_frame)
+        self.animation_id = self.app.after(ms_until_next_frame, self._show_next_frame)
+
+    def _resume_animation(self) -> None:
+        """Continues animation paused while zoomed or rotated"""
+        current_frame: Frame | None = self.image_loader.animation_frames[
+            self.image_loader.frame_index
+        ]
+        self.animation_loop(
+            current_frame.ms_until_next_frame
+            if current_frame is not None
+            else ImageLoader.DEFAULT_ANIMATION_SPEED
+        )
+
+    def _show_next_frame(self) -> None:
+        """Displays the frame due now and schedules the next on the timeline.
+        Skips frames that are already over and waits on ones not loaded yet"""
+        scheduler: FrameScheduler = self.animation_scheduler
         frame: Frame | None = self.image_loader.get_next_frame()
 
-        ms_until_next_frame: int
         if frame is None:  # trying to display frame before it is loaded
-            ms_until_next_frame = ms_backoff
-            ms_backoff = int(ms_backoff * 1.4)
-        else:
-            self._update_existing_image_display(frame.image)
-            elapsed: int = round((perf_counter() - start) * 1000)
-            ms_until_next_frame = max(frame.ms_until_next_frame - elapsed, 1)
+            scheduler.hold()
+            self.animation_id = self.app.after(
+                scheduler.WAIT_FOR_FRAME_MS, self._show_next_frame
+            )
+            return
+
+        while scheduler.is_over(frame.ms_until_next_frame):
+            next_frame: Frame | None = self.image_loader.get_next_frame()
+            if next_frame is None:
+                break
+            scheduler.skip(frame.ms_until_next_frame)
+            frame = next_frame
+
+        self._show_frame(frame)
+        self.animation_id = self.app.after(
+            scheduler.frame_shown(frame.ms_until_next_frame), self._show_next_frame
+        )
+
+    def merge_background_results(self) -> None:
+        """Adds images found while recursively scanning subfolders, sorts by
+        metadata collected in the background, and repeats until both are done"""
+        if self.background_merge_id != "":
+            self.app.after_cancel(self.background_merge_id)
+            self.background_merge_id = ""
 
-        self.animation_loop(ms_until_next_frame, ms_backoff)
+        still_scanning: bool = self.file_manager.merge_scanned_images()
+        still_collecting: bool = self.file_manager.sort_by_collected_metadata()
+
+        if still_scanning or still_collecting:
+            self.background_merge_id = self.app.after(
+                100, self.merge_background_results
+            )
+
+    def show_refined_image(self) -> None:
+        """Replaces a preview with the full quality image once its resized"""
+        refined_image: Image | None = self.image_loader.finish_refine()
+        if refined_image is None:
+            self.refine_id = (
+                self.app.after(self.REFINE_POLL_MS, self.show_refined_image)
+                if self.image_loader.pending_refine is not None
+                else ""
+            )
+            return
+
+        self.refine_id = ""
+        if not self.image_loader.is_zoomed_or_rotated:
+            self._update_image_display(refined_image)
+        self.update_details_dropdown()  # details are cached with the refined image
 
     def clear_image(self) -> None:
         """Clears all image data"""
-        if self.currently_animating():
-            self.app.after_cancel(self.animation_id)
-            self.animation_id = ""
+        if self.refine_id != "":
+            self.app.after_cancel(self.refine_id)
+            self.refine_id = ""
+        self.pause_animation()
         self.image_loader.reset_and_setup()
 
     def update_details_dropdown(self) -> None:
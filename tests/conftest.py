@@ -73,7 +73,7 @@ def image_resizer_fixture() -> ImageResizer:
 
 @pytest.fixture(name="image_loader")
 def image_loader_fixture(image_cache: ImageCache) -> ImageLoader:
-    image_loader = ImageLoader(1920, 1080, image_cache, lambda *_: None)
+    image_loader = ImageLoader(1920, 1080, image_cache, lambda *_: None, 1024, 1024)
     image_loader.PIL_image = MockImage()
     return image_loader
 
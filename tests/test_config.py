@@ -3,7 +3,11 @@ import os
 import pytest
 
 from image_viewer.config import (
+    DEFAULT_ANIMATION_DISPLAY_MEMORY_MB,
+    DEFAULT_ANIMATION_FRAME_MEMORY_MB,
     DEFAULT_BACKGROUND_COLOR,
+    DEFAULT_CACHE_ANIMATION_MEMORY_MB,
+    DEFAULT_CACHE_HASH_SIZE,
     DEFAULT_FONT,
     DEFAULT_MAX_ITEMS_IN_CACHE,
     Config,
@@ -23,6 +27,10 @@ def test_config_reader():
 
     assert config.font_file == "test"
     assert config.max_items_in_cache == 999
+    assert config.cache_hash_size == 4096
+    assert config.cache_animation_memory_mb == 256
+    assert config.animation_display_memory_mb == 64
+    assert config.animation_frame_memory_mb == 128
     assert config.background_color == "#ABCDEF"
 
     assert config.keybinds.move_to_new_file == "<F6>"
@@ -36,8 +44,13 @@ def test_config_reader_defaults():
 
     assert config.font_file == DEFAULT_FONT
     assert config.max_items_in_cache == DEFAULT_MAX_ITEMS_IN_CACHE
+    assert config.cache_hash_size == DEFAULT_CACHE_HASH_SIZE
+    assert config.cache_animation_memory_mb == DEFAULT_CACHE_ANIMATION_MEMORY_MB
+    assert config.animation_display_memory_mb == DEFAULT_ANIMATION_DISPLAY_MEMORY_MB
+    assert config.animation_frame_memory_mb == DEFAULT_ANIMATION_FRAME_MEMORY_MB
     assert config.background_color == DEFAULT_BACKGROUND_COLOR
 
+    assert config.keybinds.change_sort_mode == DefaultKeybinds.CHANGE_SORT_MODE
     assert (
         config.keybinds.copy_to_clipboard_as_base64
         == DefaultKeybinds.COPY_TO_CLIPBOARD_AS_BASE64
@@ -47,6 +60,7 @@ def test_config_reader_defaults():
     assert config.keybinds.reload_image == DefaultKeybinds.RELOAD_IMAGE
     assert config.keybinds.rename == DefaultKeybinds.RENAME
     assert config.keybinds.show_details == DefaultKeybinds.SHOW_DETAILS
+    assert config.keybinds.toggle_recursive == DefaultKeybinds.TOGGLE_RECURSIVE
     assert (
         config.keybinds.undo_most_recent_action
         == DefaultKeybinds.UNDO_MOST_RECENT_ACTION
@@ -59,6 +73,10 @@ def test_config_reader_int_fallback():
 
     assert config.font_file == DEFAULT_FONT
     assert config.max_items_in_cache == DEFAULT_MAX_ITEMS_IN_CACHE
+    assert config.cache_hash_size == DEFAULT_CACHE_HASH_SIZE
+    assert config.cache_animation_memory_mb == DEFAULT_CACHE_ANIMATION_MEMORY_MB
+    assert config.animation_display_memory_mb == DEFAULT_ANIMATION_DISPLAY_MEMORY_MB
+    assert config.animation_frame_memory_mb == DEFAULT_ANIMATION_FRAME_MEMORY_MB
     assert config.background_color == DEFAULT_BACKGROUND_COLOR
     assert config.keybinds.move_to_new_file == DefaultKeybinds.MOVE_TO_NEW_FILE
 
@@ -5,13 +5,13 @@ from unittest.mock import patch
 import pytest
 
 from image_viewer.actions.undoer import ActionUndoer, UndoResponse
-from image_viewer.constants import ImageFormats
+from image_viewer.constants import ImageFormats, SortMode
 from image_viewer.files.file_dialog_asker import FileDialogAsker
 from image_viewer.files.file_manager import ImageFileManager, _ShouldPreserveIndex
-from image_viewer.image.cache import ImageCache, ImageCacheEntry
+from image_viewer.image.cache import FileStats, ImageCache, ImageCacheEntry
 from tests.conftest import EXAMPLE_IMG_PATH, IMG_DIR
 from tests.test_util.exception import safe_wrapper
-from tests.test_util.mocks import MockImage, MockStatResult
+from tests.test_util.mocks import MockImage
 
 
 def test_image_file_manager(file_manager: ImageFileManager):
@@ -159,16 +159,25 @@ def test_undo(file_manager: ImageFileManager):
 def test_get_and_show_details(file_manager: ImageFileManager):
     """Should return a string containing details on current cached image and show it"""
 
-    # Will exit if no details in cache
+    # Will exit if no details in cache and header can't be read
     PIL_image = MockImage()
     PIL_image.info["comment"] = b"test"
 
-    details = file_manager.get_image_details(PIL_image)
+    with patch("image_viewer.files.file_manager.probe_image", return_value=None):
+        details = file_manager.get_image_details(PIL_image)
     assert details is None
 
+    # Falls back to reading image header when not in cache
+    details = file_manager.get_image_details(PIL_image)
+    assert details is not None
+    assert "Pixels: 2x2" in details
+    assert ImageFormats.PNG in details
+    assert "24 bpp RGB" in details
+    assert "Created" in details
+
     for mode in ("P", "L", "1", "ANYTHING_ELSE"):
         file_manager.image_cache[file_manager.path_to_image] = ImageCacheEntry(
-            PIL_image, (100, 100), "100kb", 9999, mode, ImageFormats.PNG
+            PIL_image, (100, 100), "100kb", FileStats(9999, 0, 0, 0, 0), mode, "PNG"
         )
         readable_mode = {"P": "Palette", "L": "Grayscale", "1": "Black And White"}.get(
             mode, mode
@@ -182,13 +191,16 @@ def test_get_and_show_details(file_manager: ImageFileManager):
         assert " bpp " + readable_mode not in metadata
         assert ImageFormats.PNG not in metadata
 
-    with patch.object(os, "stat", return_value=MockStatResult(0)):
+    # Stats captured when reading the image are reused
+    with patch.object(os, "stat") as mock_stat:
         details = file_manager.get_image_details(PIL_image)
         assert details is not None
         assert "Created" in details
         assert "Comment" in details
+        mock_stat.assert_not_called()
 
     # Will not fail getting file metadata
+    file_manager.image_cache.clear()
     with patch.object(os, "stat", side_effect=OSError):
         details = file_manager.get_image_details(PIL_image)
         assert details is not None
@@ -254,3 +266,78 @@ def test_current_image_cache_still_fresh(file_manager: ImageFileManager):
         file_manager.current_image_cache_still_fresh()
 
         mock_image_cache_still_fresh.assert_called_once_with(file_manager.path_to_image)
+
+
+def test_set_sort_mode(file_manager: ImageFileManager):
+    """Should sort by new mode and stay on the same image"""
+    file_manager.find_all_images()
+
+    file_manager.set_sort_mode(SortMode.LARGEST_FILE)
+
+    # Sorts by name until metadata is collected in the background
+    assert file_manager._files[0].name == "a.png"
+    while file_manager.sort_by_collected_metadata():
+        pass
+
+    # b.jpe and d.jpg are the same size so they are ordered by name
+    assert [image.name for image in file_manager._files] == [
+        "b.jpe",
+        "d.jpg",
+        "a.png",
+        "c.webp",
+    ]
+    assert file_manager.current_image.name == "a.png"
+    assert file_manager._files.get_index_of_image("c.webp") == (3, True)
+
+    # Sort key is kept when images are found again
+    file_manager.find_all_images()
+    assert file_manager._files[0].name == "b.jpe"
+
+    file_manager.set_sort_mode(SortMode.NAME)
+    assert file_manager._files[0].name == "a.png"
+    assert file_manager.current_image.name == "a.png"
+
+
+def test_recursive(file_manager: ImageFileManager):
+    """Should add images in subfolders with paths relative to image directory"""
+    nested_image: str = os.path.join("sub_folder.png", "large.jpg")
+
+    file_manager.toggle_recursive()
+    while file_manager.merge_scanned_images():
+        pass
+
+    assert len(file_manager._files) == 6
+    assert file_manager.current_image.name == "a.png"
+
+    file_manager._files.move_index_to_image(nested_image)
+    file_manager._update_after_move_or_edit()
+    assert file_manager.path_to_image == os.path.join(IMG_DIR, nested_image)
+
+    # Leaving recursive mode moves into current image's folder
+    file_manager.toggle_recursive()
+    assert file_manager.image_directory == os.path.join(IMG_DIR, "sub_folder.png")
+    assert file_manager.current_image.name == "large.jpg"
+    assert len(file_manager._files) == 2
+    assert not file_manager.merge_scanned_images()
+
+
+def test_recursive_rename(file_manager: ImageFileManager):
+    """Renaming an image in a subfolder should keep it in that subfolder"""
+    nested_image: str = os.path.join("sub_folder.png", "large.jpg")
+    renamed_image: str = os.path.join("sub_folder.png", "renamed.jpg")
+
+    file_manager.recursive = True
+    file_manager.add_new_image(nested_image)
+    file_manager._files.move_index_to_image(nested_image)
+    file_manager._update_after_move_or_edit()
+
+    with (
+        patch("os.rename") as mock_rename,
+        patch("image_viewer.files.file_manager.askyesno", lambda *_: True),
+    ):
+        file_manager.rename_or_convert_current_image("renamed.jpg")
+        mock_rename.assert_called_once_with(
+            os.path.join(IMG_DIR, nested_image), os.path.join(IMG_DIR, renamed_image)
+        )
+
+    assert file_manager.current_image.name == renamed_image
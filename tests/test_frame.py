@@ -1,6 +1,10 @@
+from unittest.mock import MagicMock, patch
+
 from PIL.Image import Image
+from PIL.Image import new as new_image
 
 from image_viewer.animation.frame import DEFAULT_ANIMATION_SPEED_MS, Frame
+from image_viewer.util.memory import MemoryBudget
 
 
 def test_get_ms_until_next_frame():
@@ -11,3 +15,37 @@ def test_get_ms_until_next_frame():
 
     example_image.info = {"duration": 67}
     assert frame.get_ms_until_next_frame(example_image) == 67
+
+
+@patch("image_viewer.animation.frame.PhotoImage", lambda _: MagicMock())
+def test_get_photo_image():
+    """Should keep PhotoImages only while they fit in the memory budget"""
+    memory_budget = MemoryBudget(10 * 10 * 4)
+    frame = Frame(new_image("RGB", (10, 10)))
+    other_frame = Frame(new_image("RGB", (10, 10)))
+
+    photo_image = frame.get_photo_image(memory_budget)
+    assert frame.get_photo_image(memory_budget) is photo_image
+    assert memory_budget.used_bytes == frame.byte_size
+
+    # Over budget, so converted again each time
+    assert other_frame.get_photo_image(memory_budget) is not (
+        other_frame.get_photo_image(memory_budget)
+    )
+    assert other_frame.photo_image is None
+
+    memory_budget.reset()
+    assert memory_budget.try_reserve(other_frame.byte_size)
+
+
+def test_try_fold():
+    """Identical frames should be folded into one with their durations added"""
+    frame = Frame(new_image("RGB", (10, 10)))
+    same_frame = Frame(new_image("RGB", (10, 10)), 1)
+    different_frame = Frame(new_image("RGB", (10, 10), "red"), 2)
+
+    assert frame.try_fold(same_frame)
+    assert frame.ms_until_next_frame == DEFAULT_ANIMATION_SPEED_MS * 2
+
+    assert not frame.try_fold(different_frame)
+    assert frame.ms_until_next_frame == DEFAULT_ANIMATION_SPEED_MS * 2
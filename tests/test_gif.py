@@ -0,0 +1,104 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL.Image import Image
+from PIL.Image import new as new_image
+from PIL.Image import open as open_image
+from PIL.ImageDraw import Draw
+
+from image_viewer.animation.gif import GifDecoder, read_gif_frames
+
+
+def _get_gif_bytes(frame_count: int, disposal: list[int]) -> bytes:
+    """Returns a GIF of a square moving over a background, so frames after the
+    first only cover part of the canvas"""
+    frames: list[Image] = []
+    for index in range(frame_count):
+        frame: Image = new_image("RGB", (40, 30), (10, 100, 10))
+        Draw(frame).rectangle(
+            (index % 30, index % 20, index % 30 + 6, index % 20 + 5),
+            (200, index * 7, 50),
+        )
+        frames.append(frame)
+
+    gif_bytes = BytesIO()
+    frames[0].save(
+        gif_bytes,
+        "GIF",
+        save_all=True,
+        append_images=frames[1:],
+        disposal=disposal,
+        duration=[index * 10 + 10 for index in range(frame_count)],
+        transparency=0,
+    )
+    return gif_bytes.getvalue()
+
+
+def _get_gif_decoder(gif_bytes: bytes, max_snapshot_bytes: int) -> GifDecoder:
+    """Returns a GifDecoder that decoded every frame once"""
+    decoder = GifDecoder(
+        open_image(BytesIO(gif_bytes)), memoryview(gif_bytes), max_snapshot_bytes
+    )
+    with pytest.raises(EOFError):
+        index: int = 0
+        while True:
+            decoder.seek(index)
+            decoder.copy()
+            index += 1
+
+    return decoder
+
+
+def test_read_gif_frames():
+    """Should find each frame's area and timing without decoding them"""
+    gif_bytes: bytes = _get_gif_bytes(4, [1, 2, 3, 2])
+    frames = read_gif_frames(memoryview(gif_bytes))
+
+    assert frames is not None
+    assert [frame.disposal for frame in frames] == [1, 2, 3, 2]
+    assert [frame.duration for frame in frames] == [10, 20, 30, 40]
+    assert frames[0].box == (0, 0, 40, 30)
+    assert frames[1].box != frames[0].box
+
+    assert read_gif_frames(memoryview(b"not a gif")) is None
+    assert read_gif_frames(memoryview(gif_bytes[:-20])) is None
+
+
+@pytest.mark.parametrize("disposal", [0, 1, 2, 3])
+def test_gif_decoder_matches_pil(disposal: int):
+    """Frames drawn from snapshots should look the same as PIL's"""
+    frame_count: int = 20
+    gif_bytes: bytes = _get_gif_bytes(frame_count, [disposal, 2, 3] * 7)
+    decoder: GifDecoder = _get_gif_decoder(gif_bytes, 10**9)
+    assert decoder.snapshots
+
+    with open_image(BytesIO(gif_bytes)) as expected_frames:
+        for index in reversed(range(frame_count)):
+            decoder.seek(index)
+            expected_frames.seek(index)
+            frame: Image = decoder.copy()
+            assert frame.mode == expected_frames.mode
+            assert frame.info.get("duration") == expected_frames.info.get("duration")
+            assert frame.tobytes() == expected_frames.tobytes()
+
+
+def test_gif_decoder_seek():
+    """Seeking back should only decode frames after the closest snapshot"""
+    frame_count: int = 40
+    gif_bytes: bytes = _get_gif_bytes(frame_count, [1] * frame_count)
+    decoder: GifDecoder = _get_gif_decoder(gif_bytes, 10**9)
+
+    with patch.object(
+        GifDecoder, "_decode_frame", side_effect=GifDecoder._decode_frame
+    ) as mock_decode_frame:
+        for index in (37, 12, 20, 9):
+            mock_decode_frame.reset_mock()
+            decoder.seek(index)
+            assert decoder.tell() == index
+            assert mock_decode_frame.call_count == index % GifDecoder.SNAPSHOT_INTERVAL
+
+    # Snapshots are thinned out to fit in memory
+    decoder = _get_gif_decoder(gif_bytes, 40 * 30 * 4 * 2)
+    assert list(decoder.snapshots) == [16, 32]
+    assert decoder.snapshot_interval == GifDecoder.SNAPSHOT_INTERVAL * 2
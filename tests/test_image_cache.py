@@ -1,10 +1,21 @@
 """Tests for the ImageCache class."""
 
-from unittest.mock import patch
+import os
+from unittest.mock import MagicMock, patch
 
 from PIL.Image import Image
-
-from image_viewer.image.cache import ImageCache, ImageCacheEntry
+from PIL.Image import new as new_image
+
+from image_viewer.animation.frame import Frame
+from image_viewer.image._read import CMemoryViewBuffer, read_image_into_buffer
+from image_viewer.image.cache import (
+    FileStats,
+    ImageCache,
+    ImageCacheEntry,
+    PhotoImageCache,
+)
+from image_viewer.util.memory import get_photo_image_byte_size
+from tests.conftest import EXAMPLE_IMG_PATH
 from tests.test_util.mocks import MockStatResult
 
 
@@ -55,16 +66,24 @@ def test_update_key():
 
 
 def test_image_cache_fresh(image_cache: ImageCache):
-    """Should say image cache is fresh if cached byte size
-    is the same as size on disk."""
+    """Should say image cache is fresh if cached byte size, modified time,
+    and file id are the same as on disk."""
 
     image = Image()
     byte_size = 99
-    entry = ImageCacheEntry(image, (10, 10), "", byte_size, "", "")
+    mock_stat_result = MockStatResult(byte_size)
+    file_stats = FileStats(
+        byte_size,
+        mock_stat_result.st_mtime_ns,
+        mock_stat_result.st_ctime_ns,
+        mock_stat_result.st_ino,
+        mock_stat_result.st_dev,
+    )
+    entry = ImageCacheEntry(image, (10, 10), "", file_stats, "", "")
 
     path = "some/path"
 
-    with patch("image_viewer.image.cache.stat", return_value=MockStatResult(byte_size)):
+    with patch("image_viewer.image.cache.stat", return_value=mock_stat_result):
         # Empty
         assert not image_cache.image_cache_still_fresh(path)
 
@@ -76,6 +95,131 @@ def test_image_cache_fresh(image_cache: ImageCache):
             assert not image_cache.image_cache_still_fresh(path)
 
 
+def test_image_cache_fresh_same_size_edit(tmp_path):
+    """Should notice edits that keep the same byte size, using a hash of the
+    file's start when modified time can't tell them apart"""
+    path: str = os.path.join(tmp_path, "image.jpg")
+    with open(path, "wb") as fp:
+        fp.write(b"abcd")
+
+    image_cache = ImageCache(10, hash_size=2)
+    image_stats: os.stat_result = os.stat(path)
+    with open(path, "rb") as fp:
+        content_hash: int = image_cache.get_content_hash(fp.read())
+    file_stats = FileStats(
+        image_stats.st_size,
+        image_stats.st_mtime_ns,
+        image_stats.st_ctime_ns,
+        image_stats.st_ino,
+        image_stats.st_dev,
+        content_hash,
+    )
+    image_cache[path] = ImageCacheEntry(Image(), (0, 0), "", file_stats, "", "")
+    assert image_cache.image_cache_still_fresh(path)
+
+    os.utime(path, ns=(image_stats.st_atime_ns, image_stats.st_mtime_ns + 1))
+    assert not image_cache.image_cache_still_fresh(path)
+
+    # Same size and modified time, only the hash can catch it
+    with open(path, "wb") as fp:
+        fp.write(b"zzcd")
+    os.utime(path, ns=(image_stats.st_atime_ns, image_stats.st_mtime_ns))
+    assert not image_cache.image_cache_still_fresh(path)
+
+    image_cache.hash_size = 0
+    image_cache[path].file_stats.content_hash = 0
+    assert image_cache.image_cache_still_fresh(path)
+
+
+@patch("image_viewer.image.cache.PhotoImage", lambda _: MagicMock())
+def test_photo_image_cache():
+    """Should reuse PhotoImages made from the same Image and stay under byte limit"""
+    image_byte_size: int = get_photo_image_byte_size(new_image("RGB", (10, 10)))
+    photo_image_cache = PhotoImageCache(image_byte_size * 2)
+    image_a: Image = new_image("RGB", (10, 10))
+    image_b: Image = new_image("RGB", (10, 10))
+
+    photo_image_a = photo_image_cache.get_photo_image("a", image_a)
+    assert photo_image_cache.get_photo_image("a", image_a) is photo_image_a
+    assert photo_image_cache.memory_budget.used_bytes == image_byte_size
+
+    # Different Image at the same path means it was reloaded
+    photo_image_b = photo_image_cache.get_photo_image("a", image_b)
+    assert photo_image_b is not photo_image_a
+    assert photo_image_cache.memory_budget.used_bytes == image_byte_size
+
+    photo_image_cache.get_photo_image("b", image_a)
+    photo_image_cache.get_photo_image("a", image_b)  # a is now most recently used
+    photo_image_cache.get_photo_image("c", image_a)
+    assert list(photo_image_cache) == ["a", "c"]
+    assert photo_image_cache.memory_budget.used_bytes == image_byte_size * 2
+
+    # Always keeps the newest even if over the limit
+    photo_image_cache.get_photo_image("big", new_image("RGB", (100, 100)))
+    assert list(photo_image_cache) == ["big"]
+
+
+@patch("image_viewer.image.cache.PhotoImage", lambda _: MagicMock())
+def test_photo_image_cache_remove_evicted(image_cache: ImageCache):
+    """Should remove PhotoImages no longer matching an ImageCache entry"""
+    photo_image_cache = PhotoImageCache(999999)
+    image_cache["a"] = _get_empty_cache_entry()
+    image_cache["b"] = _get_empty_cache_entry()
+
+    for image_path in ("a", "b", "c"):
+        photo_image_cache.get_photo_image(image_path, image_cache["a"].image)
+
+    photo_image_cache.remove_evicted(image_cache)
+
+    assert list(photo_image_cache) == ["a"]
+    assert photo_image_cache.memory_budget.used_bytes == 0
+
+
+def test_set_animation_frames():
+    """Should keep animation frames within budget, dropping the least recently
+    used ones first and freeing them when their entry leaves the cache"""
+    frames: list[Frame] = [Frame(new_image("RGB", (2, 2))) for _ in range(2)]
+    frames_byte_size: int = sum(frame.byte_size for frame in frames)
+    cache = ImageCache(3, animation_memory=frames_byte_size * 2)
+    for image_path in ("a", "b", "c"):
+        cache[image_path] = _get_empty_cache_entry()
+
+    assert not cache.set_animation_frames("missing", frames)
+    assert not cache.set_animation_frames("a", frames * 3)  # larger than budget
+
+    assert cache.set_animation_frames("a", frames)
+    assert cache.set_animation_frames("b", frames)
+    assert cache.set_animation_frames("c", frames)
+    assert cache["a"].animation_frames is None
+    assert cache["c"].animation_frames == frames
+    assert cache.animation_budget.used_bytes == frames_byte_size * 2
+
+    cache.update_key("b", "d")
+    assert cache.animation_budget.used_bytes == frames_byte_size * 2
+
+    cache.pop_safe("c")
+    assert cache.animation_budget.used_bytes == frames_byte_size
+
+    cache["d"] = _get_empty_cache_entry()  # replaced by a reload
+    assert cache.animation_budget.used_bytes == 0
+
+    cache.set_animation_frames("d", frames)
+    cache.clear()
+    assert cache.animation_budget.used_bytes == 0
+
+
 def _get_empty_cache_entry() -> ImageCacheEntry:
     """Returns an ImageCacheEntry with placeholder values"""
-    return ImageCacheEntry(Image(), (0, 0), "", 0, "", "")
+    return ImageCacheEntry(Image(), (0, 0), "", FileStats(0, 0, 0, 0, 0), "", "")
+
+
+def test_read_image_into_buffer_stats():
+    """Stats read with an image should match os.stat for cache freshness checks"""
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(EXAMPLE_IMG_PATH)
+    assert image_buffer is not None
+
+    image_stats: os.stat_result = os.stat(EXAMPLE_IMG_PATH)
+    assert image_buffer.st_size == image_stats.st_size
+    assert image_buffer.st_mtime_ns == image_stats.st_mtime_ns
+    assert image_buffer.st_ino == image_stats.st_ino
+    assert image_buffer.st_dev == image_stats.st_dev
@@ -1,7 +1,7 @@
 import pytest
 
 from image_viewer.constants import ImageFormats
-from image_viewer.image.file import magic_number_guess
+from image_viewer.image.file import ImageName, ImageNameList, magic_number_guess
 
 
 @pytest.mark.parametrize(
@@ -19,3 +19,20 @@ from image_viewer.image.file import magic_number_guess
 def test_magic_number_guess(magic_bytes: bytes, expected_format: ImageFormats):
     """Ensure correct image type guessed"""
     assert magic_number_guess(magic_bytes) == expected_format
+
+
+def test_get_index_of_image_with_sort_key():
+    """Binary search should follow sort key, falling back to name on ties"""
+    sort_keys: dict[str, int] = {"a.png": 3, "b.png": 1, "c.png": 1, "d.png": 2}
+    image_names = ImageNameList(map(ImageName, sort_keys), sort_keys.__getitem__)
+
+    image_names.sort_and_preserve_index("a.png")
+
+    assert [image.name for image in image_names] == ["b.png", "c.png", "d.png", "a.png"]
+    assert image_names.display_index == 3
+
+    for index, image in enumerate(image_names):
+        assert image_names.get_index_of_image(image.name) == (index, True)
+
+    sort_keys["bb.png"] = 1
+    assert image_names.get_index_of_image("bb.png") == (1, False)
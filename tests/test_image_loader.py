@@ -1,14 +1,21 @@
 """Tests for the ImageLoader class."""
 
+from collections import deque
+from concurrent.futures import Future
+from io import BytesIO
+from threading import Thread
+from time import sleep
 from unittest.mock import MagicMock, mock_open, patch
 
+import pytest
 from PIL import UnidentifiedImageError
 from PIL.Image import Image
+from PIL.Image import new as new_image
+from PIL.Image import open as open_image
 
 from image_viewer.animation.frame import Frame
-from image_viewer.image.cache import ImageCacheEntry
-from image_viewer.image.loader import ImageLoader, ReadImageResponse
-from tests.test_util.mocks import MockStatResult
+from image_viewer.image.cache import FileStats, ImageCacheEntry
+from image_viewer.image.loader import ImageLoader, PendingRefine, ReadImageResponse
 
 _MODULE_PATH: str = "image_viewer.image.loader"
 
@@ -18,6 +25,7 @@ def test_next_frame(image_loader: ImageLoader):
 
     frame1, frame2, frame3 = Frame(Image()), Frame(Image()), Frame(Image())
     image_loader.animation_frames = [frame1, frame2, frame3]
+    image_loader.all_frames_found = True
 
     example_frame: Frame | None = image_loader.get_next_frame()
     assert example_frame is frame2
@@ -33,10 +41,18 @@ def test_next_frame(image_loader: ImageLoader):
     assert example_frame is None
     assert image_loader.frame_index == 1
 
+    # should wait at the end when there may be more frames to find
+    image_loader.animation_frames[2] = frame3
+    image_loader.all_frames_found = False
+    assert image_loader.get_next_frame() is frame3
+    assert image_loader.get_next_frame() is None
+    assert image_loader.frame_index == 2
+
     # reset should set all animation variables to defaults
     image_loader.reset_and_setup()
     assert len(image_loader.animation_frames) == 0
     assert image_loader.frame_index == 0
+    assert not image_loader.all_frames_found
 
     # program may try to get a frame when the animation frame list is empty
     example_frame = image_loader.get_next_frame()
@@ -62,19 +78,25 @@ def test_load_image_in_cache(image_loader: ImageLoader):
     image_byte_size: int = 10
     cached_image = Image()
     cached_data = ImageCacheEntry(
-        cached_image, (10, 10), "10kb", image_byte_size, image_format, "PNG"
+        cached_image,
+        (10, 10),
+        "10kb",
+        FileStats(image_byte_size, 0, 0, 0, 0),
+        image_format,
+        "PNG",
     )
     image_loader.image_cache["some/path"] = cached_data
 
-    mock_os_stat = MockStatResult(image_byte_size)
+    image_buffer = MagicMock(
+        st_size=image_byte_size, st_mtime_ns=0, st_ctime_ns=0, st_ino=0, st_dev=0
+    )
     with (
         patch.object(
             ImageLoader,
             "read_image",
-            lambda *_: ReadImageResponse(MagicMock(), Image(), image_format),
+            lambda *_: ReadImageResponse(image_buffer, Image(), image_format),
         ),
         patch(f"{_MODULE_PATH}.open_image", lambda *_: Image()),
-        patch(f"{_MODULE_PATH}.stat", lambda _: mock_os_stat),
     ):
         assert image_loader.load_image("some/path") is cached_image
 
@@ -87,5 +109,265 @@ def test_load_image_resize_error(image_loader: ImageLoader):
         with patch(
             f"{_MODULE_PATH}.get_placeholder_for_errored_image"
         ) as mock_get_placeholder:
-            image_loader._resize_or_get_placeholder()
+            image_loader._resize_or_get_placeholder(Image(), MagicMock())
             mock_get_placeholder.assert_called_once()
+
+
+def test_load_image_preview(image_loader: ImageLoader):
+    """Large images should show a preview first and only be cached
+    once the full quality image replaces it"""
+    image: Image = new_image("RGB", (4000, 4000))
+    png_bytes = BytesIO()
+    image.save(png_bytes, "PNG")
+    image_buffer = MagicMock(
+        view=memoryview(png_bytes.getvalue()),
+        st_size=0,
+        st_mtime_ns=0,
+        st_ctime_ns=0,
+        st_ino=0,
+        st_dev=0,
+    )
+    with patch.object(
+        ImageLoader,
+        "read_image",
+        lambda *_: ReadImageResponse(image_buffer, image, "PNG"),
+    ):
+        preview: Image | None = image_loader.load_image("some/path")
+
+    assert preview is not None
+    assert image_loader.pending_refine is not None
+    assert "some/path" not in image_loader.image_cache
+
+    image_loader.pending_refine.refined_image.result(timeout=5)
+    refined_image: Image | None = image_loader.finish_refine()
+
+    assert refined_image is not None
+    assert refined_image is not preview
+    assert refined_image.size == preview.size
+    assert image_loader.pending_refine is None
+    assert image_loader.image_cache["some/path"].image is refined_image
+    assert image_loader.zoomed_image_cache == [refined_image]
+
+
+def test_refine_skipped_after_moving_on(image_loader: ImageLoader):
+    """Should not refine an image that is no longer the one being shown"""
+    assert image_loader._get_refined_image(MagicMock(), -1) is None
+    assert image_loader.finish_refine() is None
+
+
+def test_refine_failed(image_loader: ImageLoader):
+    """Should keep showing the preview when refining fails"""
+    image_buffer = MagicMock(view=memoryview(b"not an image"))
+    assert (
+        image_loader._get_refined_image(image_buffer, image_loader.current_load_id)
+        is None
+    )
+
+    refined_image: Future[Image | None] = Future()
+    refined_image.set_exception(MemoryError())
+    image_loader.pending_refine = PendingRefine("", MagicMock(), refined_image)
+    assert image_loader.finish_refine() is None
+    assert image_loader.pending_refine is None
+
+
+def test_close(image_loader: ImageLoader):
+    """Should stop the refine worker so no refines start after closing"""
+    image_loader.close()
+    with pytest.raises(RuntimeError):
+        image_loader.refine_executor.submit(print)
+
+
+def test_get_image_to_zoom(image_loader: ImageLoader):
+    """Should decode large JPEGs for zooming once, otherwise zoom PIL_image"""
+    image_loader.image_buffer = MagicMock()
+    full_jpeg: Image = new_image("RGB", (10, 10))
+    with patch(
+        f"{_MODULE_PATH}.ImageResizer.get_full_jpeg", return_value=full_jpeg
+    ) as mock_get_full_jpeg:
+        assert image_loader._get_image_to_zoom() is full_jpeg
+        assert image_loader._get_image_to_zoom() is full_jpeg
+        mock_get_full_jpeg.assert_called_once()
+
+    image_loader.reset_and_setup()
+    with patch(f"{_MODULE_PATH}.ImageResizer.get_full_jpeg", return_value=None):
+        assert image_loader._get_image_to_zoom() is image_loader.PIL_image
+
+
+def test_load_remaining_frames_streaming(image_loader: ImageLoader):
+    """Animations that don't fit in memory should only keep a few frames loaded
+    and rewind to the start after the last frame"""
+    frame_count: int = 6
+    frames: list[Image] = [
+        new_image("L", (4, 4), color) for color in range(0, 240, 240 // frame_count)
+    ]
+    gif_bytes = BytesIO()
+    frames[0].save(gif_bytes, "GIF", save_all=True, append_images=frames[1:])
+    image_loader.image_buffer = MagicMock(view=memoryview(gif_bytes.getvalue()))
+
+    first_image: Image = new_image("RGB", (4, 4))
+    max_frames_loaded: int = 3
+    image_loader.frame_memory_limit = Frame(first_image).byte_size * max_frames_loaded
+
+    with patch(f"{_MODULE_PATH}.Thread") as mock_thread:
+        image_loader.begin_animation(first_image)
+
+    stream_thread = Thread(
+        target=mock_thread.call_args.kwargs["target"],
+        args=mock_thread.call_args.kwargs["args"],
+        daemon=True,
+    )
+    stream_thread.start()
+
+    try:
+        frames_shown: int = 0
+        while frames_shown < frame_count * 2:
+            if image_loader.get_next_frame() is not None:
+                frames_shown += 1
+            loaded_frames: int = sum(
+                frame is not None for frame in image_loader.animation_frames
+            )
+            assert loaded_frames <= max_frames_loaded
+            sleep(0.001)
+    finally:
+        image_loader.current_load_id += 1
+        stream_thread.join(timeout=5)
+
+    assert image_loader.all_frames_found
+    assert len(image_loader.animation_frames) == frame_count
+
+
+def test_load_remaining_frames(image_loader: ImageLoader):
+    """Animations that fit in memory should have every frame kept"""
+    frame_count: int = 8
+    frames: list[Image] = [
+        new_image("L", (4, 4), color) for color in range(0, 240, 240 // frame_count)
+    ]
+    gif_bytes = BytesIO()
+    frames[0].save(gif_bytes, "GIF", save_all=True, append_images=frames[1:])
+    image_loader.image_buffer = MagicMock(view=memoryview(gif_bytes.getvalue()))
+
+    with patch(f"{_MODULE_PATH}.Thread") as mock_thread:
+        image_loader.begin_animation(new_image("RGB", (4, 4)))
+    assert len(image_loader.animation_frames) == 1
+    assert image_loader.get_next_frame() is None
+
+    mock_thread.call_args.kwargs["target"](*mock_thread.call_args.kwargs["args"])
+
+    assert image_loader.all_frames_found
+    assert None not in image_loader.animation_frames
+    assert len(image_loader.animation_frames) == frame_count
+
+    # Frames resized in parallel are still added in order
+    colors: list[int] = [
+        frame.image.getpixel((0, 0))[0]  # type: ignore
+        for frame in image_loader.animation_frames[1:]
+    ]
+    assert colors == sorted(colors)
+
+
+def test_cache_animation_frames(image_loader: ImageLoader):
+    """Should cache frames once all are loaded and play them from the cache"""
+    frames: list[Frame] = [Frame(new_image("RGB", (4, 4)), index) for index in (0, 2)]
+    image_loader.image_cache["a"] = ImageCacheEntry(
+        frames[0].image, (4, 4), "", FileStats(0, 0, 0, 0, 0), "RGB", "GIF"
+    )
+    image_loader.image_cache.animation_budget.max_bytes = 999999
+    image_loader.animation_path = "a"
+
+    image_loader.animation_frames = [frames[0], None]
+    image_loader.all_frames_found = True
+    image_loader.reset_and_setup()
+    assert image_loader.image_cache["a"].animation_frames is None  # was streamed
+
+    frames[1].photo_image = MagicMock()
+    image_loader.animation_frames = [*frames]
+    image_loader.all_frames_found = True
+    image_loader.reset_and_setup()
+    assert image_loader.image_cache["a"].animation_frames == frames
+    assert frames[1].photo_image is None
+
+    image_loader.begin_cached_animation(frames)
+    assert image_loader.all_frames_found
+    assert image_loader.frame_source_indexes == [0, 2]
+    assert image_loader.get_next_frame() is frames[1]
+
+
+def test_drop_frame(image_loader: ImageLoader):
+    """Dropping a frame should give back the PhotoImage bytes it reserved"""
+    frame = Frame(new_image("RGB", (4, 4)))
+    frame.photo_image = MagicMock()
+    image_loader.animation_frames = [frame]
+    assert image_loader.frame_display_budget.try_reserve(frame.byte_size)
+
+    image_loader._drop_frame(0)
+
+    assert image_loader.animation_frames == [None]
+    assert image_loader.frame_display_budget.used_bytes == 0
+
+
+def test_hold_current_frame(image_loader: ImageLoader):
+    """Zooming an animation should apply to the displayed frame"""
+    frames: list[Image] = [new_image("L", (4, 4), color) for color in (0, 80, 160)]
+    gif_bytes = BytesIO()
+    frames[0].save(gif_bytes, "GIF", save_all=True, append_images=frames[1:])
+    image_loader.PIL_image = open_image(gif_bytes)
+    image_loader.image_buffer = MagicMock(view=memoryview(gif_bytes.getvalue()))
+
+    image_loader.animation_frames = [
+        Frame(frame, index) for index, frame in enumerate(frames)
+    ]
+    image_loader.frame_index = 2
+    image_loader.hold_current_frame()
+
+    # Held frame is decoded separately, PIL_image stays on the first frame
+    assert image_loader.PIL_image.tell() == 0
+    assert image_loader._get_image_to_zoom().convert("L").getpixel((0, 0)) == 160
+    assert image_loader.zoomed_image_cache == [frames[2]]
+    assert not image_loader.is_zoomed_or_rotated
+
+    image_loader._zoom_state.level = 1
+    assert image_loader.is_zoomed_or_rotated
+
+
+def test_add_resized_frames_folds_duplicates(image_loader: ImageLoader):
+    """Identical frames should extend the one before instead of being stored"""
+    images: list[Image] = [new_image("RGB", (4, 4), color) for color in (0, 0, 9, 9)]
+    image_loader.animation_frames = [Frame(images[0])]
+    resizing_frames: deque[tuple[int, Future[Image]]] = deque()
+    for index, image in enumerate(images[1:], 1):
+        resized_image: Future[Image] = Future()
+        resized_image.set_result(image)
+        resizing_frames.append((index, resized_image))
+
+    image_loader._add_resized_frames(
+        resizing_frames, deque([0]), None, image_loader.current_load_id
+    )
+
+    frames: list[Frame] = [
+        frame for frame in image_loader.animation_frames if frame is not None
+    ]
+    assert [frame.index for frame in frames] == [0, 2]
+    assert [frame.ms_until_next_frame for frame in frames] == [
+        ImageLoader.DEFAULT_ANIMATION_SPEED * 2
+    ] * 2
+
+
+def test_seek_frame(image_loader: ImageLoader):
+    """Should jump to loaded frames and ask for streamed ones to be loaded"""
+    frames: list[Frame] = [Frame(new_image("RGB", (4, 4)), index) for index in (0, 2)]
+    image_loader.animation_frames = [frames[0], frames[1], None]
+    image_loader.frame_source_indexes = [0, 2, 5]
+
+    assert image_loader.seek_frame(-2) is frames[1]
+    assert image_loader.frame_index == 1
+    assert image_loader.requested_position == -1
+
+    assert image_loader.seek_frame(2) is None
+    assert image_loader.frame_index == 1
+    assert image_loader.requested_position == 2
+
+    loaded_indexes: deque[int] = deque([0, 1])
+    assert image_loader._restart_at_requested_frame(deque(), loaded_indexes) == 5
+    assert image_loader.animation_frames == [None, None, None]
+    assert loaded_indexes == deque([1])
+    assert image_loader.requested_position == -1
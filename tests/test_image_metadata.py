@@ -0,0 +1,123 @@
+"""Tests for the ImageMetadataIndex class."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+from PIL import Image, features
+
+from image_viewer.constants import SortMode
+from image_viewer.image.metadata import ImageFileMetadata, ImageMetadataIndex
+from tests.conftest import EXAMPLE_IMG_PATH, IMG_DIR
+
+_MODULE_PATH: str = "image_viewer.image.metadata"
+
+
+@pytest.mark.parametrize(
+    "sort_mode,expected_key",
+    [
+        (SortMode.NAME, 0),
+        (SortMode.NEWEST, -20),
+        (SortMode.LARGEST_FILE, -10),
+        (SortMode.MOST_PIXELS, -12),
+    ],
+)
+def test_get_sort_key(sort_mode: SortMode, expected_key: int):
+    """Larger values should be sorted first"""
+    metadata = ImageFileMetadata(10, 20)
+    metadata.width, metadata.height = 3, 4
+
+    assert metadata.get_sort_key(sort_mode) == expected_key
+
+
+def test_collect():
+    """Should only read dimensions when needed and never read an image twice"""
+    index = ImageMetadataIndex()
+    paths: list[str] = [
+        os.path.join(IMG_DIR, name) for name in ("a.png", "c.webp", "d.jpg")
+    ]
+
+    index.collect(paths, SortMode.NAME)
+    assert len(index) == 0
+
+    index.collect(paths, SortMode.NEWEST)
+    assert len(index) == 3
+    assert not any(metadata.has_dimensions for metadata in index.values())
+    assert index[paths[0]].byte_size == os.stat(paths[0]).st_size
+
+    index.collect(paths, SortMode.MOST_PIXELS)
+    assert all(metadata.has_dimensions for metadata in index.values())
+
+    with (
+        patch(f"{_MODULE_PATH}.stat") as mock_stat,
+        patch(f"{_MODULE_PATH}._read_dimensions") as mock_read_dimensions,
+    ):
+        for sort_mode in SortMode:
+            index.collect(paths, sort_mode)
+        mock_stat.assert_not_called()
+        mock_read_dimensions.assert_not_called()
+
+
+def test_get_sort_key_not_collected():
+    """Should read metadata of paths that were never collected"""
+    index = ImageMetadataIndex()
+
+    sort_key: int = index.get_sort_key(EXAMPLE_IMG_PATH, SortMode.LARGEST_FILE)
+
+    assert sort_key == -os.stat(EXAMPLE_IMG_PATH).st_size
+    assert EXAMPLE_IMG_PATH in index
+    assert index.pop_safe(EXAMPLE_IMG_PATH) is not None
+    assert index.pop_safe(EXAMPLE_IMG_PATH) is None
+
+
+def test_collect_missing_file():
+    """Should not fail on files that can't be read"""
+    index = ImageMetadataIndex()
+    path: str = os.path.join(IMG_DIR, "does_not_exist.png")
+
+    index.collect([path], SortMode.MOST_PIXELS)
+
+    assert index[path].byte_size == 0
+    assert index[path].get_sort_key(SortMode.MOST_PIXELS) == 0
+
+
+def test_collect_reads_header_dimensions():
+    """Should read dimensions from headers of example images"""
+    index = ImageMetadataIndex()
+    paths: list[str] = [
+        os.path.join(IMG_DIR, name) for name in ("a.png", "b.jpe", "c.webp")
+    ]
+
+    index.collect(paths, SortMode.MOST_PIXELS)
+
+    assert [(index[path].width, index[path].height) for path in paths] == [
+        (2, 2),
+        (2, 2),
+        (2, 2),
+    ]
+
+
+@pytest.mark.parametrize(
+    "file_name,save_kwargs",
+    [
+        ("image.gif", {}),
+        ("image.dds", {}),
+        ("image.avif", {}),
+        ("lossless.webp", {"lossless": True}),  # VP8L
+        ("lossy_alpha.webp", {}),  # VP8X
+    ],
+)
+def test_collect_reads_written_header_dimensions(
+    tmp_path, file_name: str, save_kwargs: dict
+):
+    """Should read dimensions from headers of formats without example images"""
+    if file_name.endswith(".avif") and not features.check("avif"):
+        pytest.skip("Pillow was built without AVIF support")
+
+    path: str = os.path.join(tmp_path, file_name)
+    Image.new("RGBA", (3, 5), (255, 0, 0, 128)).save(path, **save_kwargs)
+    index = ImageMetadataIndex()
+
+    index.collect([path], SortMode.MOST_PIXELS)
+
+    assert (index[path].width, index[path].height) == (3, 5)
@@ -1,9 +1,22 @@
+import gc
+import os
+import struct
+from io import BytesIO
 from unittest.mock import MagicMock, patch
 
 import pytest
-from PIL.Image import Image, Resampling
+from PIL.Image import Image, Resampling, effect_noise
+from PIL.Image import merge as merge_images
 from PIL.Image import new as new_image
+from PIL.Image import open as open_image
 
+from image_viewer.image._read import (
+    CMemoryViewBuffer,
+    decode_scaled_jpeg,
+    find_dds_mip_level,
+    find_jpeg_thumbnail,
+    read_image_into_buffer,
+)
 from image_viewer.image.loader import ImageLoader, ReadImageResponse
 from image_viewer.image.resizer import ImageResizer
 from tests.conftest import IMG_DIR
@@ -75,6 +88,311 @@ def test_jpeg_fit_to_screen_large_image(
     assert scaled_image.height == 1080
 
 
+@pytest.mark.parametrize("mode", ["L", "RGB", "CMYK"])
+def test_jpeg_fit_to_screen_keeps_mode(tmp_path, mode: str):
+    """Grayscale JPEGs should stay single channel and CMYK should be shown as RGB"""
+    path: str = os.path.join(tmp_path, "large.jpg")
+    new_image(mode, (400, 300), 200).save(path, "JPEG")
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+
+    image_resizer = ImageResizer(100, 75)
+    with open_image(path) as image:
+        scaled_image: Image = image_resizer.get_jpeg_fit_to_screen(image, image_buffer)
+
+    assert scaled_image.size == (100, 75)
+    assert scaled_image.mode == ("L" if mode == "L" else "RGB")
+    expected_color = new_image(mode, (1, 1), 200).convert(scaled_image.mode)
+    for band in range(len(scaled_image.getbands())):
+        assert (
+            abs(
+                scaled_image.getchannel(band).getpixel((50, 40))  # type: ignore
+                - expected_color.getchannel(band).getpixel((0, 0))  # type: ignore
+            )
+            <= 2
+        )
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "CMYK"])
+def test_image_from_jpeg_result_shares_buffer(tmp_path, mode: str):
+    """Decoded JPEGs should be used without a copy and stay valid after the
+    result they came from is no longer referenced"""
+    path: str = os.path.join(tmp_path, "large.jpg")
+    new_image(mode, (400, 300), 200).save(path, "JPEG")
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+
+    image: Image = ImageResizer._get_image_from_decode_result(
+        decode_scaled_jpeg(image_buffer, (1, 2))
+    )
+    gc.collect()
+
+    assert image.readonly
+    assert image.size == (200, 150)
+    expected_color = new_image(mode, (1, 1), 200).convert(image.mode)
+    for band in range(len(image.getbands())):
+        assert (
+            abs(
+                image.getchannel(band).getpixel((100, 75))  # type: ignore
+                - expected_color.getchannel(band).getpixel((0, 0))  # type: ignore
+            )
+            <= 2
+        )
+
+
+@pytest.mark.parametrize("scale_factor", [(1, 1), (1, 2)])
+def test_decode_jpeg_in_bands(tmp_path, scale_factor: tuple[int, int]):
+    """Decoding in bands on several threads should match decoding all at once"""
+    path: str = os.path.join(tmp_path, "large.jpg")
+    noise: list[Image] = [effect_noise((640, 480), sigma) for sigma in (40, 60, 80)]
+    merge_images("RGB", noise).save(path, "JPEG", quality=90)
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+
+    expected_bytes: memoryview = decode_scaled_jpeg(image_buffer, scale_factor, 1).view
+    for band_count in (2, 5):
+        result = decode_scaled_jpeg(image_buffer, scale_factor, band_count)
+        assert result.dimensions == (640 // scale_factor[1], 480 // scale_factor[1])
+        assert len(result.view) == len(expected_bytes)
+        assert max(abs(a - b) for a, b in zip(result.view, expected_bytes)) <= 2
+
+
+def test_get_full_jpeg(tmp_path):
+    """Should decode only large JPEGs at full size"""
+    path: str = os.path.join(tmp_path, "large.jpg")
+    new_image("RGB", (64, 48), (200, 100, 50)).save(path, "JPEG")
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+
+    with open_image(path) as image:
+        assert ImageResizer.get_full_jpeg(image, image_buffer) is None
+
+        with patch(f"{_MODULE_PATH}.FULL_JPEG_DECODE_MIN_PIXELS", 0):
+            full_jpeg: Image | None = ImageResizer.get_full_jpeg(image, image_buffer)
+            assert ImageResizer.get_full_jpeg(image.copy(), image_buffer) is None
+
+    assert full_jpeg is not None
+    assert full_jpeg.size == (64, 48)
+    red, green, blue = full_jpeg.convert("RGB").getpixel((32, 24))  # type: ignore
+    assert abs(red - 200) <= 2 and abs(green - 100) <= 2 and abs(blue - 50) <= 2
+
+
+@pytest.mark.parametrize(
+    "mode,background_color,expected_color",
+    [
+        ("RGB", None, (200, 100, 50)),
+        ("RGBA", None, (200, 100, 50, 128)),
+        ("RGBA", "#000000", (100, 50, 25)),
+    ],
+)
+def test_get_webp_fit_to_screen(
+    tmp_path, mode: str, background_color: str | None, expected_color: tuple
+):
+    """Should decode large still WebPs at screen size, blending transparency"""
+    path: str = os.path.join(tmp_path, "large.webp")
+    new_image(mode, (400, 300), (200, 100, 50, 128)[: len(mode)]).save(
+        path, "WEBP", lossless=True
+    )
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+
+    image_resizer = ImageResizer(100, 75, background_color)
+    with (
+        open_image(path) as image,
+        patch.object(ImageResizer, "get_image_fit_to_screen") as mock_fit_to_screen,
+        patch(f"{_MODULE_PATH}.resize") as mock_resize,
+    ):
+        scaled_image: Image = image_resizer.get_webp_fit_to_screen(image, image_buffer)
+        mock_fit_to_screen.assert_not_called()
+        mock_resize.assert_not_called()  # already at screen size
+
+    assert scaled_image.size == (100, 75)
+    assert scaled_image.mode == ("RGBA" if len(expected_color) == 4 else "RGB")
+    actual_color = scaled_image.getpixel((50, 40))
+    for actual, expected in zip(actual_color, expected_color):  # type: ignore
+        assert abs(actual - expected) <= 1
+
+
+def test_get_webp_fit_to_screen_small_image(tmp_path):
+    """Should resize WebPs smaller than the screen with PIL"""
+    path: str = os.path.join(tmp_path, "small.webp")
+    new_image("RGB", (50, 50)).save(path, "WEBP")
+
+    image_resizer = ImageResizer(100, 75)
+    with (
+        open_image(path) as image,
+        patch(f"{_MODULE_PATH}.decode_scaled_webp") as mock_decode_scaled_webp,
+    ):
+        assert image_resizer.get_webp_fit_to_screen(image, MagicMock()).size == (75, 75)
+        mock_decode_scaled_webp.assert_not_called()
+
+
+def _get_dds_bytes(mode: str, colors: list, pixel_format: str | None) -> bytes:
+    """Returns a 1024x512 DDS with a mip level of a different color for each
+    color given, each level half the size of the last"""
+    levels: list[bytes] = []
+    for level, color in enumerate(colors):
+        level_bytes = BytesIO()
+        new_image(mode, (1024 >> level, 512 >> level), color).save(
+            level_bytes,
+            "DDS",
+            **({} if pixel_format is None else {"pixel_format": pixel_format}),
+        )
+        levels.append(level_bytes.getvalue())
+
+    header_size: int = 148 if levels[0][84:88] == b"DX10" else 128
+    header = bytearray(levels[0][:header_size])
+    struct.pack_into("<I", header, 28, len(levels))
+    return bytes(header) + b"".join(level[header_size:] for level in levels)
+
+
+@pytest.mark.parametrize(
+    "mode,colors,pixel_format",
+    [
+        ("RGBA", [(255, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255)], None),
+        ("RGB", [(255, 0, 0), (0, 255, 0), (0, 0, 255)], "DXT1"),
+        ("RGB", [(255, 0, 0), (0, 255, 0), (0, 0, 255)], "BC5"),
+        ("L", [50, 150, 250], None),
+    ],
+)
+def test_get_dds_fit_to_screen(tmp_path, mode: str, colors: list, pixel_format):
+    """Should resize DDS from the smallest mip level that covers the screen"""
+    path: str = os.path.join(tmp_path, "texture.dds")
+    with open(path, "wb") as fp:
+        fp.write(_get_dds_bytes(mode, colors, pixel_format))
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+
+    assert find_dds_mip_level(image_buffer, 1024, 512) is None
+    assert find_dds_mip_level(image_buffer, 1, 1) is not None
+    _, width, height = find_dds_mip_level(image_buffer, 300, 150)  # type: ignore
+    assert (width, height) == (512, 256)
+
+    image_resizer = ImageResizer(300, 150)
+    with open_image(path) as image:
+        scaled_image: Image = image_resizer.get_dds_fit_to_screen(image, image_buffer)
+        preview: Image = image_resizer.get_preview_fit_to_screen(image, image_buffer)
+        assert image.size == (1024, 512)
+
+    expected_image: Image = new_image(mode, (1, 1), colors[1])
+    if pixel_format == "BC5":  # only stores red and green
+        expected_image.putpixel((0, 0), (0, 255, 0))
+    expected_color = expected_image.convert(scaled_image.mode).getpixel((0, 0))
+    assert scaled_image.size == preview.size == (300, 150)
+    assert scaled_image.getpixel((150, 75)) == expected_color
+    assert preview.getpixel((150, 75)) == expected_color
+
+
+def test_find_dds_mip_level_none(tmp_path):
+    """Should not find levels in files that aren't DDS with mip levels"""
+    path: str = os.path.join(tmp_path, "texture.dds")
+    with open(path, "wb") as fp:
+        fp.write(_get_dds_bytes("RGB", [(255, 0, 0)], None))
+
+    for image_path in (path, IMG_DIR + "/sub_folder.png/large.jpg"):
+        image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(image_path)
+        assert image_buffer is not None
+        assert find_dds_mip_level(image_buffer, 1, 1) is None
+
+
+def test_get_dds_rawmode():
+    """Should only read DDS channel masks of whole bytes as a raw mode"""
+    rgba_masks = (0xFF0000, 0xFF00, 0xFF, 0xFF000000)
+    assert ImageResizer._get_dds_rawmode(32, rgba_masks) == "BGRA"
+    assert ImageResizer._get_dds_rawmode(32, (0xFF, 0xFF00, 0xFF0000)) == "RGBX"
+    assert ImageResizer._get_dds_rawmode(16, (0xF800, 0x7E0, 0x1F)) is None
+    assert ImageResizer._get_dds_rawmode(24, (0xFF, 0xFF, 0xFF0000)) is None
+
+
+def test_get_preview_fit_to_screen(image_resizer: ImageResizer):
+    """Should only preview large images, sampling them straight to screen size"""
+    assert not image_resizer.should_preview(2000, 2000)
+    assert image_resizer.should_preview(4000, 1000)
+
+    image: Image = new_image("RGB", (4000, 4000))
+    with patch(f"{_MODULE_PATH}.decode_scaled_jpeg") as mock_decode_scaled_jpeg:
+        preview: Image = image_resizer.get_preview_fit_to_screen(image, MagicMock())
+        mock_decode_scaled_jpeg.assert_not_called()
+
+    assert preview.size == (1080, 1080)
+
+
+def test_get_jpeg_preview_embedded(tmp_path, image_resizer: ImageResizer):
+    """Should find the largest preview embedded in a JPEG and show it"""
+    main_jpeg: bytes = _get_jpeg_bytes((64, 48), "red")
+    exif_thumbnail: bytes = _get_jpeg_bytes((16, 12), "blue")
+    mpf_preview: bytes = _get_jpeg_bytes((32, 24), "lime")
+
+    # EXIF: IFD0 with no entries, then IFD1 with thumbnail offset and length
+    exif_tiff: bytes = (
+        b"II*\0"
+        + struct.pack("<IHI", 8, 0, 14)
+        + struct.pack(
+            "<HHHIIHHII", 2, 0x201, 4, 1, 44, 0x202, 4, 1, len(exif_thumbnail)
+        )
+        + struct.pack("<I", 0)
+        + exif_thumbnail
+    )
+    app1: bytes = _get_app_segment(0xE1, b"Exif\0\0" + exif_tiff)
+
+    # MPF: index IFD with entries for the main image and a preview after it
+    mpf_tiff_offset: int = 2 + len(app1) + 4 + 4
+    mpf_preview_offset: int = mpf_tiff_offset + 82 + len(main_jpeg) - 2
+    mpf_tiff: bytes = (
+        b"MM\0*"
+        + struct.pack(">IH", 8, 3)
+        + struct.pack(">HHI4s", 0xB000, 7, 4, b"0100")
+        + struct.pack(">HHII", 0xB001, 4, 1, 2)
+        + struct.pack(">HHII", 0xB002, 7, 32, 50)
+        + struct.pack(">I", 0)
+        + struct.pack(">IIIHH", 0x030000, len(main_jpeg), 0, 0, 0)
+        + struct.pack(
+            ">IIIHH",
+            0x010001,
+            len(mpf_preview),
+            mpf_preview_offset - mpf_tiff_offset,
+            0,
+            0,
+        )
+    )
+    app2: bytes = _get_app_segment(0xE2, b"MPF\0" + mpf_tiff)
+
+    path: str = os.path.join(tmp_path, "camera.jpg")
+    with open(path, "wb") as fp:
+        fp.write(main_jpeg[:2] + app1 + app2 + main_jpeg[2:] + mpf_preview)
+
+    image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+    assert image_buffer is not None
+    assert find_jpeg_thumbnail(image_buffer) == (mpf_preview_offset, len(mpf_preview))
+
+    preview: Image = image_resizer._get_jpeg_preview(image_buffer, (64, 48))
+    assert preview.size == (32, 24)
+    assert preview.getpixel((0, 0))[1] > 200  # type: ignore
+
+
+def test_find_jpeg_thumbnail_none(tmp_path):
+    """Should find nothing in JPEGs without embedded previews and other files"""
+    for image_format in ("JPEG", "PNG"):
+        path: str = os.path.join(tmp_path, f"image.{image_format}")
+        new_image("RGB", (8, 8)).save(path, image_format)
+
+        image_buffer: CMemoryViewBuffer | None = read_image_into_buffer(path)
+        assert image_buffer is not None
+        assert find_jpeg_thumbnail(image_buffer) is None
+
+
+def _get_jpeg_bytes(size: tuple[int, int], color: str) -> bytes:
+    """Returns bytes of a JPEG of a single color"""
+    jpeg_bytes = BytesIO()
+    new_image("RGB", size, color).save(jpeg_bytes, "JPEG")
+    return jpeg_bytes.getvalue()
+
+
+def _get_app_segment(marker: int, data: bytes) -> bytes:
+    """Returns a JPEG APPn segment containing data"""
+    return struct.pack(">HH", 0xFF00 | marker, len(data) + 2) + data
+
+
 def test_get_image_fit_to_screen(image_resizer: ImageResizer):
     """Should resize and return PIL image"""
     image: Image = new_image("RGB", (10, 10))
@@ -84,6 +402,14 @@ def test_get_image_fit_to_screen(image_resizer: ImageResizer):
         mock_resize.assert_called_once()
 
 
+def test_get_image_fit_to_screen_background():
+    """Transparent images should only be flattened when a background is set"""
+    image: Image = new_image("RGBA", (10, 10))
+
+    assert ImageResizer(20, 20).get_image_fit_to_screen(image).mode == "RGBA"
+    assert ImageResizer(20, 20, "#000000").get_image_fit_to_screen(image).mode == "RGB"
+
+
 def test_scale_dimensions(image_resizer: ImageResizer):
     """Should scale a tuple of width height by provided ratio"""
     assert image_resizer._scale_dimensions((1920, 1080), 1.5) == (2880, 1620)
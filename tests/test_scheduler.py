@@ -0,0 +1,43 @@
+"""Tests for the FrameScheduler class."""
+
+from unittest.mock import patch
+
+from image_viewer.animation.scheduler import FrameScheduler
+
+_MODULE_PATH: str = "image_viewer.animation.scheduler"
+
+
+def test_frame_timeline():
+    """Delays showing a frame should be made up on the next one"""
+    scheduler = FrameScheduler()
+
+    with patch(f"{_MODULE_PATH}.perf_counter", return_value=0.0):
+        scheduler.start(100)
+
+    # Shown 20ms late, so the next frame comes 20ms sooner
+    with patch(f"{_MODULE_PATH}.perf_counter", return_value=0.12):
+        assert not scheduler.is_over(100)
+        assert scheduler.frame_shown(100) == 80
+
+    # Far enough behind that the frame due should be skipped
+    with patch(f"{_MODULE_PATH}.perf_counter", return_value=0.35):
+        assert scheduler.is_over(100)
+        scheduler.skip(100)
+        assert not scheduler.is_over(100)
+        assert scheduler.frame_shown(100) == 50
+
+    assert round(scheduler.fps, 2) == round(1 / 0.23, 2)
+    assert round(scheduler.jitter_ms) == 35
+
+
+def test_hold():
+    """Should restart the timeline after waiting on a frame to load"""
+    scheduler = FrameScheduler()
+
+    with patch(f"{_MODULE_PATH}.perf_counter", return_value=0.0):
+        scheduler.start(100)
+
+    with patch(f"{_MODULE_PATH}.perf_counter", return_value=1.0):
+        scheduler.hold()
+        assert not scheduler.is_over(100)
+        assert scheduler.frame_shown(100) == 100
@@ -18,6 +18,10 @@ class MockStatResult:
     st_birthtime: int = 1649709119
     st_ctime: int = 1649709119
     st_mtime: int = 1649709119
+    st_ctime_ns: int = 1649709119000000000
+    st_mtime_ns: int = 1649709119000000000
+    st_ino: int = 1
+    st_dev: int = 1
 
     def __init__(self, st_size: int) -> None:
         self.st_size: int = st_size
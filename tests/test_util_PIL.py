@@ -1,16 +1,19 @@
 from unittest.mock import MagicMock, patch
 
-from PIL.Image import Image, new
+import pytest
+from PIL.Image import Image, Resampling, effect_noise, new
 
 from image_viewer.config import DEFAULT_FONT
 from image_viewer.constants import ImageFormats
 from image_viewer.image.file import ImageName
 from image_viewer.util.PIL import (
     _preinit,
+    _resize_in_strips,
     create_dropdown_image,
     get_placeholder_for_errored_image,
     init_PIL,
     resize,
+    try_convert_to_palette,
 )
 
 
@@ -71,6 +74,110 @@ def test_resize():
     assert new_image.size == (15, 15)
 
 
+def test_resize_reduces_first():
+    """Should reduce by whole factors before large downscales
+    without visibly changing the result"""
+    image: Image = new("RGB", (1001, 1001))
+    image.paste((255, 0, 0), (0, 0, 500, 1001))
+
+    with patch.object(Image, "reduce", wraps=image.reduce) as mock_reduce:
+        resized_image: Image = resize(image, (100, 100), Resampling.HAMMING)
+        mock_reduce.assert_called_once_with((5, 5))
+
+    assert resized_image.size == (100, 100)
+    assert resized_image.getpixel((10, 50)) == (255, 0, 0)
+    assert resized_image.getpixel((90, 50)) == (0, 0, 0)
+
+    # Modes that can't be reduced are still resized
+    assert resize(new("I;16", (1000, 1000)), (100, 100)).size == (100, 100)
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "LA"])
+@pytest.mark.parametrize("size", [(10, 10), (5, 5)])
+def test_resize_onto_background(mode: str, size: tuple[int, int]):
+    """Should blend transparent images onto the background color as RGB"""
+    image: Image = new("RGBA", (10, 10), (255, 255, 255, 0))
+    image.paste((255, 255, 255, 255), (0, 0, 10, 5))
+    image = image.convert(mode)
+
+    resized_image: Image = resize(image, size, Resampling.BOX, "#0000ff")
+
+    assert resized_image.mode == "RGB"
+    assert resized_image.size == size
+    assert resized_image.getpixel((0, 0)) == (255, 255, 255)
+    assert resized_image.getpixel((0, size[1] - 1)) == (0, 0, 255)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_resize_in_strips(mode: str):
+    """Resizing large images in strips should match resizing all at once"""
+    image: Image = effect_noise((300, 200), 80).convert(mode)
+
+    expected_image: Image = resize(image, (70, 45), Resampling.HAMMING)
+    with (
+        patch("image_viewer.util.PIL.cpu_count", return_value=4),
+        patch("image_viewer.util.PIL.PARALLEL_RESIZE_MIN_PIXELS", 0),
+        patch(
+            "image_viewer.util.PIL._resize_in_strips", wraps=_resize_in_strips
+        ) as mock_resize_in_strips,
+    ):
+        resized_image: Image = resize(image, (70, 45), Resampling.HAMMING)
+        mock_resize_in_strips.assert_called_once()
+
+    # Strip boxes are computed separately, so values can round differently
+    assert resized_image.mode == mode
+    assert (
+        max(
+            abs(a - b)
+            for a, b in zip(resized_image.tobytes(), expected_image.tobytes())
+        )
+        <= 1
+    )
+
+
+def test_resize_large_image_in_strips():
+    """Photos past the pixel limit should be reduced and resized in strips
+    when fit to a screen"""
+    image: Image = effect_noise((8000, 4500), 80)
+    image.paste(255, (0, 0, 4000, 4500))
+
+    with patch("image_viewer.util.PIL.cpu_count", return_value=1):
+        expected_image: Image = resize(image, (1920, 1080))
+    with (
+        patch("image_viewer.util.PIL.cpu_count", return_value=4),
+        patch(
+            "image_viewer.util.PIL._resize_in_strips", wraps=_resize_in_strips
+        ) as mock_resize_in_strips,
+    ):
+        resized_image: Image = resize(image, (1920, 1080))
+        mock_resize_in_strips.assert_called_once()
+        assert mock_resize_in_strips.call_args.args[3] == (2, 2)
+
+    assert resized_image.size == (1920, 1080)
+    assert (
+        max(
+            abs(a - b)
+            for a, b in zip(resized_image.tobytes(), expected_image.tobytes())
+        )
+        <= 1
+    )
+
+
+def test_try_convert_to_palette():
+    """Should only use a palette when no colors would be lost"""
+    few_colors: Image = new("RGB", (16, 16), (10, 20, 30))
+    few_colors.paste((200, 100, 0), (0, 0, 8, 8))
+
+    palette_image: Image = try_convert_to_palette(few_colors)
+    assert palette_image.mode == "P"
+    assert palette_image.convert("RGB").tobytes() == few_colors.tobytes()
+
+    many_colors: Image = new("RGB", (32, 32))
+    many_colors.putdata([(i, i // 4, 0) for i in range(256)] * 4)
+    many_colors.putpixel((0, 0), (0, 0, 255))
+    assert try_convert_to_palette(many_colors) is many_colors
+
+
 def test_preinit():
     """Should import supported formats and set PIL as initialized"""
 
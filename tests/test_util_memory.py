@@ -0,0 +1,24 @@
+from PIL.Image import new as new_image
+
+from image_viewer.util.memory import MemoryBudget, get_photo_image_byte_size
+
+
+def test_memory_budget():
+    """Should only exceed the limit when reserving unconditionally"""
+    memory_budget = MemoryBudget(10)
+
+    assert memory_budget.try_reserve(6)
+    assert not memory_budget.try_reserve(6)
+    assert not memory_budget.is_exceeded
+
+    memory_budget.reserve(6)
+    assert memory_budget.is_exceeded
+
+    memory_budget.release(6)
+    assert memory_budget.used_bytes == 6
+
+
+def test_get_photo_image_byte_size():
+    """Should estimate 4 bytes per pixel regardless of mode"""
+    assert get_photo_image_byte_size(new_image("L", (3, 5))) == 60
+    assert get_photo_image_byte_size(new_image("RGBA", (3, 5))) == 60
@@ -5,6 +5,7 @@ import pytest
 
 from image_viewer.util.os import (
     get_byte_display,
+    get_files_and_folders_in_folder,
     get_files_in_folder,
     maybe_truncate_long_name,
     show_info,
@@ -81,3 +82,13 @@ def test_get_files_in_folder():
 
     files = list(get_files_in_folder(IMG_DIR))
     assert len(files) == 5
+
+
+def test_get_files_and_folders_in_folder():
+    """Should split files and folders and treat missing folders as empty"""
+
+    files, folders = get_files_and_folders_in_folder(IMG_DIR)
+    assert len(files) == 5
+    assert folders == ["sub_folder.png"]
+
+    assert get_files_and_folders_in_folder("does/not/exist") == ([], [])